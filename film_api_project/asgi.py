@@ -1,7 +1,8 @@
 """
 ASGI config for film_api_project project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``,
+configured by default with the ASGI deployment profile (film_api_project.settings_asgi).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -11,6 +12,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'film_api_project.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'film_api_project.settings_asgi')
 
 application = get_asgi_application()
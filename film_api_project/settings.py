@@ -41,7 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'films.instrumentation.InstrumentationMiddleware',
+    'films.throttling.ThrottlingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'films.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +85,17 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'film-api',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -122,3 +136,30 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Films API
+
+# Cache (alias of CACHES) and timeout in seconds of the responses of the read endpoints
+FILMS_CACHE_ALIAS = 'default'
+FILMS_CACHE_TIMEOUT = 300
+
+# Number of rows read from the database at a time when streaming whole lists
+FILMS_STREAM_CHUNK_SIZE = 500
+
+# Number of rows inserted or updated per query by the bulk endpoints
+FILMS_BULK_BATCH_SIZE = 500
+
+# The minimum size in bytes of the compressed responses, by content type, can be changed with
+# FILMS_COMPRESSION_POLICY (see DEFAULT_COMPRESSION_POLICY in films.compression)
+
+# Largest page size of the film lists
+FILMS_MAX_PAGE_SIZE = 1000
+
+# The rate limits per client of the route classes, as (tokens per second, burst), and the number of
+# expensive requests (film lists and batches) served at a time can be changed with FILMS_RATE_LIMITS and
+# FILMS_MAX_EXPENSIVE_REQUESTS (see DEFAULT_RATE_LIMITS and DEFAULT_MAX_EXPENSIVE_REQUESTS in
+# films.throttling)
+
+# Largest number of sub-requests of a batch (/api/batch/)
+FILMS_MAX_BATCH_REQUESTS = 20
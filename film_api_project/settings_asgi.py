@@ -0,0 +1,14 @@
+"""
+ASGI deployment profile of the film_api_project project.
+
+Serves the read endpoints with the async views of films.views.async_views, which query the database with
+the async ORM API. Run it with an ASGI server, e.g.:
+
+    uvicorn film_api_project.asgi:application --workers 4
+"""
+
+from film_api_project.settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'film_api_project.urls_async'
+
+ASGI_APPLICATION = 'film_api_project.asgi.application'
@@ -0,0 +1,78 @@
+"""
+Production deployment profile of the film_api_project project.
+
+Tunes SQLite for concurrent reads and writes (see films.database): WAL journaling, relaxed
+synchronization, memory-mapped I/O and a larger page cache, persistent connections, and the GET
+requests read from a read-only connection. Use it with:
+
+    DJANGO_SETTINGS_MODULE=film_api_project.settings_production gunicorn film_api_project.wsgi
+"""
+import os
+
+from film_api_project.settings import *  # noqa: F401,F403
+from film_api_project.settings import BASE_DIR, MIDDLEWARE, SECRET_KEY
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+DATABASE_SETTINGS = {
+    # The SQLite backend, starting the transactions with BEGIN IMMEDIATE (see films.backends.sqlite3)
+    'ENGINE': 'films.backends.sqlite3',
+    'NAME': os.environ.get('FILMS_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+    # Reuse the connections across requests, checking them before reuse
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # Seconds a connection waits for a lock before failing with "database is locked"
+        'timeout': 20,
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_SETTINGS,
+    # Read-only connection to the same database, for the GET requests
+    'replica': {**DATABASE_SETTINGS, 'TEST': {'MIRROR': 'default'}},
+}
+
+DATABASE_ROUTERS = ['films.database.ReadReplicaRouter']
+
+MIDDLEWARE = ['films.database.ReadReplicaMiddleware'] + MIDDLEWARE
+
+# PRAGMA statements run on every new SQLite connection
+FILMS_SQLITE_PRAGMAS = {
+    # Readers do not block the writer and the writer does not block readers
+    'journal_mode': 'WAL',
+    # Durable across application crashes, and as safe as FULL against corruption in WAL mode
+    'synchronous': 'NORMAL',
+    # Read the database through memory-mapped I/O, up to 256 MiB
+    'mmap_size': 268435456,
+    # Page cache of 64 MiB per connection (negative values are in KiB)
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+# Aliases of DATABASES whose connections are read-only
+FILMS_READ_ONLY_DATABASES = ('replica',)
+
+# Alias of DATABASES the reads of the GET requests go to
+FILMS_READ_DATABASE = 'replica'
+
+# Start the transactions of the writable connections with BEGIN IMMEDIATE (films.backends.sqlite3 backend)
+FILMS_SQLITE_IMMEDIATE_TRANSACTIONS = True
+
+# SQLite file shared by the worker processes holding the state of the rate limits, on a RAM disk
+FILMS_THROTTLING_DATABASE = os.environ.get('FILMS_THROTTLING_DATABASE', '/dev/shm/films-throttling.sqlite3')
+
+# Number of reverse proxies in front of the application appending to X-Forwarded-For: the rate limits
+# identify the clients by the address the outermost one received the request from. None unless set,
+# as with a proxy counted that is not there every client could pick its own address.
+FILMS_TRUSTED_PROXIES = int(os.environ.get('FILMS_TRUSTED_PROXIES', '0'))
+
+# Addresses or networks (comma separated) of the Prometheus scrapers allowed to read /api/_metrics:
+# none unless set
+FILMS_METRICS_ALLOWED_ADDRESSES = [
+    address.strip() for address in os.environ.get('FILMS_METRICS_ALLOWED_ADDRESSES', '').split(',') if address.strip()
+]
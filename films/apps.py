@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class FilmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'films'
+
+    def ready(self):
+        # Connect the signal handlers
+        from films import signals  # noqa: F401
+
+        # Register the models only used by the management commands
+        from films.models import ImportCheckpoint  # noqa: F401
+
+        # Tune the database connections, as configured by the settings
+        from films.database import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='films.database')
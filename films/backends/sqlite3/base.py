@@ -0,0 +1,28 @@
+"""
+SQLite database backend of the production settings profile (film_api_project.settings_production).
+
+It is the SQLite backend of Django, whose writable connections start their transactions with
+BEGIN IMMEDIATE when FILMS_SQLITE_IMMEDIATE_TRANSACTIONS is set, so that a transaction reading before
+writing waits for the write lock rather than failing with "database is locked" when it upgrades.
+Django 5.1 offers the same with the transaction_mode option of the SQLite backend.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def immediate_transactions(self):
+        """
+        Return whether the transactions of this connection take the write lock when they start.
+        """
+        return (getattr(settings, 'FILMS_SQLITE_IMMEDIATE_TRANSACTIONS', False)
+                and self.alias not in getattr(settings, 'FILMS_READ_ONLY_DATABASES', ()))
+
+    def _start_transaction_under_autocommit(self):
+        # Called by transaction.atomic() to open a transaction, since Django runs SQLite in autocommit mode
+        if self.immediate_transactions():
+            # Take the write lock when the transaction starts, waiting for it up to the busy timeout
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,195 @@
+"""
+Micro-benchmark of the API endpoints.
+
+Every route of films.urls is driven through the Django test client by one or more scenarios, and the
+latency percentiles, throughput and number of SQL queries per request are reported as a dict ready to
+be dumped as JSON. The benchmark_api management command runs it against a seeded test database.
+"""
+import json
+import random
+import time
+from urllib.parse import urlencode
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from films import urls
+from films.cache import get_cache
+from films.models.Category import Category
+from films.models.Film import Film
+
+
+class Scenario:
+    """
+    A kind of request to a route, e.g. the second page of the film list in XML.
+
+    make_request is called with the index of the request and returns its method, path, JSON body (or
+    query parameters for a GET) and headers; any setup it does (e.g. creating the film a DELETE request
+    deletes) is not timed.
+    """
+
+    def __init__(self, name, route, make_request):
+        self.name = name
+        self.route = route
+        self.make_request = make_request
+
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+def fake_film_data(rng, category_ids):
+    return {
+        "name": f"Benchmark film {rng.randrange(10 ** 9)}",
+        "description": "A film created by the benchmark",
+        "publication_date": "2024-04-23",
+        "note": rng.randint(0, 5),
+        "categories": rng.sample(category_ids, min(2, len(category_ids))),
+    }
+
+
+def create_film(rng, category_ids):
+    film = Film.objects.create(name="Benchmark film", description="To be deleted", publication_date="2024-04-23")
+    film.categories.set(rng.sample(category_ids, min(2, len(category_ids))))
+    return film
+
+
+def build_scenarios(rng):
+    """
+    Build the scenarios of every route of films.urls, for the films and categories of the database.
+    """
+    film_ids = list(Film.objects.order_by('?').values_list('id', flat=True)[:1000])
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    last_page = max(1, Film.objects.count() // 10)
+    search_words = [name.split()[0] for name in Film.objects.filter(id__in=film_ids[:50]).values_list('name', flat=True)]
+
+    def get(path, params=None, **headers):
+        return 'GET', path, params or {}, headers
+
+    def send(method, path, body):
+        return method, path, body, {}
+
+    def film_path(name):
+        return lambda index: get(reverse(name, kwargs={'film_id': rng.choice(film_ids)}))
+
+    return [
+        Scenario('films: first page', 'film-list', lambda index: get(reverse('film-list'))),
+        Scenario('films: last page', 'film-list', lambda index: get(reverse('film-list'), {'page': last_page})),
+        Scenario('films: page of 100', 'film-list', lambda index: get(reverse('film-list'), {'page_size': 100})),
+        Scenario('films: cursor', 'film-list', lambda index: get(reverse('film-list'), {'cursor': '', 'ordering': '-publication_date'})),
+        Scenario('films: search', 'film-list', lambda index: get(reverse('film-list'), {'title': rng.choice(search_words)})),
+        Scenario('films: xml', 'film-list', lambda index: get(reverse('film-list'), Accept='application/xml')),
+        Scenario('films: msgpack', 'film-list', lambda index: get(reverse('film-list'), Accept='application/msgpack')),
+        Scenario('films: 20 ids', 'film-list',
+                 lambda index: get(reverse('film-list'), {'ids': ','.join(map(str, rng.sample(film_ids, min(20, len(film_ids)))))})),
+        Scenario('film', 'get_film', film_path('get_film')),
+        Scenario('film categories', 'get_categories_of_film', film_path('get_categories_of_film')),
+        Scenario('categories', 'category-list', lambda index: get(reverse('category-list'))),
+        Scenario('category films', 'category-films',
+                 lambda index: get(reverse('category-films', args=[rng.choice(category_ids)]))),
+        Scenario('stats', 'stats', lambda index: get(reverse('stats'))),
+        Scenario('category stats', 'category-stats', lambda index: get(reverse('category-stats'))),
+        Scenario('year stats', 'year-stats', lambda index: get(reverse('year-stats'))),
+        Scenario('metrics', 'metrics', lambda index: get(reverse('metrics'))),
+        Scenario('batch of 5 films and their categories', 'batch',
+                 lambda index: send('POST', reverse('batch'), {"requests": [
+                     {"path": reverse(name, kwargs={'film_id': film_id})}
+                     for film_id in rng.sample(film_ids, min(5, len(film_ids)))
+                     for name in ('get_film', 'get_categories_of_film')
+                 ]})),
+        Scenario('create film', 'create_film',
+                 lambda index: send('POST', reverse('create_film'), fake_film_data(rng, category_ids))),
+        Scenario('update film', 'update_film',
+                 lambda index: send('PUT', reverse('update_film', kwargs={'film_id': rng.choice(film_ids)}),
+                                    fake_film_data(rng, category_ids))),
+        Scenario('patch film', 'update_film',
+                 lambda index: send('PATCH', reverse('update_film', kwargs={'film_id': rng.choice(film_ids)}),
+                                    {"note": rng.randint(0, 5)})),
+        Scenario('delete film', 'delete_film',
+                 lambda index: send('DELETE', reverse('delete_film', kwargs={'film_id': create_film(rng, category_ids).id}), {})),
+        Scenario('bulk create 100 films', 'bulk_create_films',
+                 lambda index: send('POST', reverse('bulk_create_films'), [fake_film_data(rng, category_ids) for _ in range(100)])),
+        Scenario('bulk update 100 films', 'bulk_update_films',
+                 lambda index: send('PUT', reverse('bulk_update_films'),
+                                    [{"id": film_id, "note": rng.randint(0, 5)} for film_id in rng.sample(film_ids, min(100, len(film_ids)))])),
+        Scenario('bulk delete 100 films', 'bulk_delete_films',
+                 lambda index: send('DELETE', reverse('bulk_delete_films'),
+                                    [create_film(rng, category_ids).id for _ in range(100)])),
+    ]
+
+
+def missing_routes(scenarios):
+    """
+    Return the names of the routes of films.urls that no scenario covers.
+    """
+    covered = {scenario.route for scenario in scenarios}
+    return [pattern.name for pattern in urls.urlpatterns if pattern.name not in covered]
+
+
+def run_scenario(client, scenario, requests, warm_cache=False):
+    """
+    Send requests requests of a scenario one after the other and return their statistics.
+    """
+    latencies, query_counts, sizes, statuses = [], [], [], {}
+    for index in range(requests):
+        method, path, data, headers = scenario.make_request(index)
+        if not warm_cache:
+            get_cache().clear()
+        # The query log is bounded: empty it so that the count of the request is exact
+        connection.queries_log.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            if method == 'GET':
+                response = client.get(f"{path}?{urlencode(data)}" if data else path, headers=headers)
+            else:
+                response = client.generic(method, path, json.dumps(data), content_type='application/json', headers=headers)
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+            latencies.append(time.perf_counter() - start)
+
+        query_counts.append(len(queries.captured_queries))
+        sizes.append(len(content))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    return {
+        "name": scenario.name,
+        "route": scenario.route,
+        "requests": requests,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        },
+        "throughput_rps": round(len(latencies) / sum(latencies), 1),
+        "queries": {"min": min(query_counts), "p50": percentile(query_counts, 0.50), "max": max(query_counts)},
+        "response_bytes": {"p50": percentile(sizes, 0.50), "max": max(sizes)},
+    }
+
+
+def run_benchmark(requests=100, warm_cache=False, seed=0, only=None):
+    """
+    Run the scenarios of every route (or of the routes named in only) against the current database.
+    """
+    rng = random.Random(seed)
+    scenarios = build_scenarios(rng)
+    if only:
+        scenarios = [scenario for scenario in scenarios if scenario.route in only]
+
+    client = Client()
+    # The scenarios measure the endpoints, not the rate limits their requests would soon exceed
+    with override_settings(FILMS_RATE_LIMITS=None, FILMS_MAX_EXPENSIVE_REQUESTS=None):
+        results = [run_scenario(client, scenario, requests, warm_cache) for scenario in scenarios]
+    return {
+        "films": Film.objects.count(),
+        "categories": Category.objects.count(),
+        "requests_per_scenario": requests,
+        "warm_cache": warm_cache,
+        "scenarios": results,
+    }
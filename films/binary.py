@@ -0,0 +1,263 @@
+"""
+Pure-Python MessagePack (https://msgpack.org/) and CBOR (RFC 8949) codecs, for the compact response
+formats of films.renderers when the msgpack and cbor2 packages are not installed.
+
+They cover the types of the API representations: None, booleans, integers, floats, strings, bytes,
+lists, tuples and dicts. Any other object is first converted by the default function, if given.
+"""
+import struct
+
+
+def _encoder(encode_head, codes, default):
+    """
+    Build an encoding function from the format specific parts of MessagePack and CBOR, which share
+    the same data model.
+    """
+    none, false, true, float64 = codes
+
+    def encode(value, out):
+        if value is None:
+            out += none
+        elif value is True:
+            out += true
+        elif value is False:
+            out += false
+        elif isinstance(value, int):
+            encode_head('int', value, out)
+        elif isinstance(value, float):
+            out += float64
+            out += struct.pack('>d', value)
+        elif isinstance(value, str):
+            data = value.encode()
+            encode_head('str', len(data), out)
+            out += data
+        elif isinstance(value, (bytes, bytearray)):
+            encode_head('bytes', len(value), out)
+            out += value
+        elif isinstance(value, (list, tuple)):
+            encode_head('array', len(value), out)
+            for item in value:
+                encode(item, out)
+        elif isinstance(value, dict):
+            encode_head('map', len(value), out)
+            for key, item in value.items():
+                encode(key, out)
+                encode(item, out)
+        elif default is not None:
+            encode(default(value), out)
+        else:
+            raise TypeError(f"Cannot serialize object of type {type(value).__name__}")
+
+    return encode
+
+
+# MessagePack
+
+# Formats of the lengths of strings, bytes, arrays and maps: (maximum, first byte, struct format)
+_MSGPACK_LENGTHS = {
+    'str': ((31, 0xa0, None), (0xff, 0xd9, '>B'), (0xffff, 0xda, '>H'), (0xffffffff, 0xdb, '>I')),
+    'bytes': ((0xff, 0xc4, '>B'), (0xffff, 0xc5, '>H'), (0xffffffff, 0xc6, '>I')),
+    'array': ((15, 0x90, None), (0xffff, 0xdc, '>H'), (0xffffffff, 0xdd, '>I')),
+    'map': ((15, 0x80, None), (0xffff, 0xde, '>H'), (0xffffffff, 0xdf, '>I')),
+}
+
+
+def _msgpack_head(kind, value, out):
+    if kind == 'int':
+        if 0 <= value <= 0x7f or -32 <= value < 0:
+            out += struct.pack('>b' if value < 0 else '>B', value)
+        elif value > 0:
+            for maximum, first_byte, fmt in ((0xff, 0xcc, '>B'), (0xffff, 0xcd, '>H'),
+                                             (0xffffffff, 0xce, '>I'), (0xffffffffffffffff, 0xcf, '>Q')):
+                if value <= maximum:
+                    out.append(first_byte)
+                    out += struct.pack(fmt, value)
+                    return
+            raise OverflowError("Integer out of the range of MessagePack")
+        else:
+            for minimum, first_byte, fmt in ((-0x80, 0xd0, '>b'), (-0x8000, 0xd1, '>h'),
+                                             (-0x80000000, 0xd2, '>i'), (-0x8000000000000000, 0xd3, '>q')):
+                if value >= minimum:
+                    out.append(first_byte)
+                    out += struct.pack(fmt, value)
+                    return
+            raise OverflowError("Integer out of the range of MessagePack")
+        return
+
+    for maximum, first_byte, fmt in _MSGPACK_LENGTHS[kind]:
+        if value <= maximum:
+            if fmt is None:
+                out.append(first_byte | value)
+            else:
+                out.append(first_byte)
+                out += struct.pack(fmt, value)
+            return
+    raise OverflowError(f"{kind} too long for MessagePack")
+
+
+def packb(value, default=None):
+    """
+    Encode a value to MessagePack, as msgpack.packb() does.
+    """
+    out = bytearray()
+    _encoder(_msgpack_head, (b'\xc0', b'\xc2', b'\xc3', b'\xcb'), default)(value, out)
+    return bytes(out)
+
+
+def unpackb(data):
+    """
+    Decode a MessagePack value, as msgpack.unpackb() does.
+    """
+    value, end = _unpack(memoryview(data), 0)
+    if end != len(data):
+        raise ValueError("Extra data after the MessagePack value")
+    return value
+
+
+def _unpack(data, position):
+    first_byte = data[position]
+    position += 1
+    if first_byte <= 0x7f:
+        return first_byte, position
+    if first_byte >= 0xe0:
+        return first_byte - 0x100, position
+    if 0xa0 <= first_byte <= 0xbf:
+        return _unpack_str(data, position, first_byte & 0x1f)
+    if 0x90 <= first_byte <= 0x9f:
+        return _unpack_array(data, position, first_byte & 0x0f)
+    if 0x80 <= first_byte <= 0x8f:
+        return _unpack_map(data, position, first_byte & 0x0f)
+    if first_byte in (0xc0, 0xc2, 0xc3):
+        return {0xc0: None, 0xc2: False, 0xc3: True}[first_byte], position
+    if first_byte == 0xcb:
+        return struct.unpack_from('>d', data, position)[0], position + 8
+
+    fmt, decode = {
+        0xcc: ('>B', None), 0xcd: ('>H', None), 0xce: ('>I', None), 0xcf: ('>Q', None),
+        0xd0: ('>b', None), 0xd1: ('>h', None), 0xd2: ('>i', None), 0xd3: ('>q', None),
+        0xd9: ('>B', _unpack_str), 0xda: ('>H', _unpack_str), 0xdb: ('>I', _unpack_str),
+        0xc4: ('>B', _unpack_bytes), 0xc5: ('>H', _unpack_bytes), 0xc6: ('>I', _unpack_bytes),
+        0xdc: ('>H', _unpack_array), 0xdd: ('>I', _unpack_array),
+        0xde: ('>H', _unpack_map), 0xdf: ('>I', _unpack_map),
+    }.get(first_byte, (None, None))
+    if fmt is None:
+        raise ValueError(f"Unsupported MessagePack type: {first_byte:#x}")
+    value = struct.unpack_from(fmt, data, position)[0]
+    position += struct.calcsize(fmt)
+    return (value, position) if decode is None else decode(data, position, value)
+
+
+def _unpack_str(data, position, length):
+    return bytes(data[position:position + length]).decode(), position + length
+
+
+def _unpack_bytes(data, position, length):
+    return bytes(data[position:position + length]), position + length
+
+
+def _unpack_array(data, position, length):
+    items = []
+    for _ in range(length):
+        item, position = _unpack(data, position)
+        items.append(item)
+    return items, position
+
+
+def _unpack_map(data, position, length):
+    items = {}
+    for _ in range(length):
+        key, position = _unpack(data, position)
+        items[key], position = _unpack(data, position)
+    return items, position
+
+
+# CBOR
+
+_CBOR_MAJOR_TYPES = {'str': 3, 'bytes': 2, 'array': 4, 'map': 5}
+
+
+def _cbor_head(kind, value, out):
+    if kind == 'int':
+        major_type = 0 if value >= 0 else 1
+        value = value if value >= 0 else -1 - value
+    else:
+        major_type = _CBOR_MAJOR_TYPES[kind]
+
+    major_type <<= 5
+    if value < 24:
+        out.append(major_type | value)
+    elif value <= 0xff:
+        out.append(major_type | 24)
+        out.append(value)
+    elif value <= 0xffff:
+        out.append(major_type | 25)
+        out += struct.pack('>H', value)
+    elif value <= 0xffffffff:
+        out.append(major_type | 26)
+        out += struct.pack('>I', value)
+    elif value <= 0xffffffffffffffff:
+        out.append(major_type | 27)
+        out += struct.pack('>Q', value)
+    else:
+        raise OverflowError("Integer out of the range of CBOR")
+
+
+def cbor_dumps(value, default=None):
+    """
+    Encode a value to CBOR, as cbor2.dumps() does.
+    """
+    out = bytearray()
+    _encoder(_cbor_head, (b'\xf6', b'\xf4', b'\xf5', b'\xfb'), default)(value, out)
+    return bytes(out)
+
+
+def cbor_loads(data):
+    """
+    Decode a CBOR value, as cbor2.loads() does, for the types cbor_dumps() writes.
+    """
+    value, end = _cbor_load(memoryview(data), 0)
+    if end != len(data):
+        raise ValueError("Extra data after the CBOR value")
+    return value
+
+
+def _cbor_load(data, position):
+    first_byte = data[position]
+    position += 1
+    major_type, argument = first_byte >> 5, first_byte & 0x1f
+
+    if major_type == 7:
+        if argument == 27:
+            return struct.unpack_from('>d', data, position)[0], position + 8
+        if argument in (20, 21, 22):
+            return {20: False, 21: True, 22: None}[argument], position
+        raise ValueError(f"Unsupported CBOR simple value: {argument}")
+
+    if argument >= 24:
+        if argument > 27:
+            raise ValueError("Indefinite lengths are not supported")
+        fmt = {24: '>B', 25: '>H', 26: '>I', 27: '>Q'}[argument]
+        argument = struct.unpack_from(fmt, data, position)[0]
+        position += struct.calcsize(fmt)
+
+    if major_type == 0:
+        return argument, position
+    if major_type == 1:
+        return -1 - argument, position
+    if major_type == 2:
+        return _unpack_bytes(data, position, argument)
+    if major_type == 3:
+        return _unpack_str(data, position, argument)
+    if major_type == 4:
+        items = []
+        for _ in range(argument):
+            item, position = _cbor_load(data, position)
+            items.append(item)
+        return items, position
+    if major_type == 5:
+        items = {}
+        for _ in range(argument):
+            key, position = _cbor_load(data, position)
+            items[key], position = _cbor_load(data, position)
+        return items, position
+    raise ValueError("CBOR tags are not supported")
@@ -0,0 +1,58 @@
+"""
+Writes of many films at once, shared by the bulk endpoints of the API and the import of films.transfer.
+
+The films are written in batches of FILMS_BULK_BATCH_SIZE rows, and the derived data (search index,
+statistics, documents, cache) is refreshed once per batch by the films_bulk_saved and
+films_bulk_deleted signals rather than once per film.
+"""
+from django.conf import settings
+from django.db import connection
+from films.models.Film import Film
+from films.models.FilmDocument import FilmDocument
+from films.signals import films_bulk_deleted
+
+FILM_FIELDS = ('name', 'description', 'publication_date', 'note')
+
+# Number of rows inserted or updated per query, unless overridden by the FILMS_BULK_BATCH_SIZE setting
+DEFAULT_BULK_BATCH_SIZE = 500
+
+
+def bulk_batch_size():
+    return getattr(settings, 'FILMS_BULK_BATCH_SIZE', DEFAULT_BULK_BATCH_SIZE)
+
+
+def link_categories(links):
+    """
+    Insert (film_id, category_id) pairs into the categories through table.
+    """
+    Through = Film.categories.through
+    Through.objects.bulk_create(
+        [Through(film_id=film_id, category_id=category_id) for film_id, category_id in links],
+        batch_size=bulk_batch_size(),
+        ignore_conflicts=True
+    )
+
+
+def delete_films(film_ids):
+    """
+    Delete the films with the given ids, with their category links and documents, in batches.
+
+    QuerySet.delete() would collect the related rows and send post_delete, and so refresh the search
+    index, the statistics and the cache, once per film: the rows are deleted with plain DELETE queries
+    and films_bulk_deleted is sent once for all of them instead.
+    """
+    film_ids = list(film_ids)
+    tables = [
+        (model._meta.db_table, model._meta.get_field(field).column)
+        for model, field in ((Film.categories.through, 'film'), (FilmDocument, 'film'), (Film, 'id'))
+    ]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for start in range(0, len(film_ids), bulk_batch_size()):
+            batch = film_ids[start:start + bulk_batch_size()]
+            placeholders = ", ".join(["%s"] * len(batch))
+            for table, column in tables:
+                cursor.execute(f"DELETE FROM {quote_name(table)} WHERE {quote_name(column)} IN ({placeholders})",
+                               batch)
+    if film_ids:
+        films_bulk_deleted.send(sender=Film, film_ids=film_ids)
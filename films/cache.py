@@ -0,0 +1,155 @@
+"""
+Response cache of the read endpoints.
+
+Responses are cached per path, query parameters, Accept header and content coding, under keys
+embedding the versions of the data they depend on: the film list, a single film or the categories.
+The signal handlers of films.signals replace these versions when a film or a category changes, which
+makes the affected entries unreachable without flushing the rest of the cache.
+
+Responses are stored already compressed (see films.compression), so that hits cost no compression.
+"""
+from functools import wraps
+from hashlib import md5
+from urllib.parse import urlencode
+from uuid import uuid4
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from films.compression import compress_response, negotiate_encoding
+
+FILM_LIST_VERSION = 'films:version:list'
+CATEGORIES_VERSION = 'films:version:categories'
+
+
+def film_version(film_id):
+    """
+    Return the key of the version of a single film.
+    """
+    return f'films:version:film:{film_id}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'FILMS_CACHE_ALIAS', 'default')]
+
+
+def get_versions(keys):
+    """
+    Return the current versions of the given keys, creating the missing ones.
+
+    Versions are random tokens rather than counters, so a version evicted from the cache is never
+    recreated with a value some stale entry was stored under.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(keys):
+    """
+    Async counterpart of get_versions().
+    """
+    cache = get_cache()
+    versions = await cache.aget_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _replace_versions(keys):
+    get_cache().set_many({key: uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate(*keys):
+    """
+    Replace the versions of the given keys, making the cached responses depending on them unreachable.
+    """
+    _replace_versions(keys)
+
+    # Replace them again once the transaction is committed, in case a concurrent request cached the
+    # data it read before the commit under the new versions
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _replace_versions(keys))
+
+
+def response_key(request, versions):
+    """
+    Build the cache key of the response to a request, for the given versions of its data.
+    """
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    accept = request.headers.get('Accept', '')
+    encoding = negotiate_encoding(request)
+    coding = encoding.name if encoding else 'identity'
+    digest = md5(f"{request.path}?{query}|{accept}|{coding}|{':'.join(versions)}".encode(), usedforsecurity=False)
+    return f'films:response:{digest.hexdigest()}'
+
+
+def cached_response(request, response):
+    """
+    Return a response found in the cache, or a 304 response if it matches the validators of the request.
+    """
+    response['X-Cache'] = 'HIT'
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
+
+
+def cache_response(dependencies):
+    """
+    Decorator caching the successful responses of a read view.
+
+    dependencies is called with the arguments of the view and returns the keys of the versions the
+    response depends on. Cached responses keep their ETag and Last-Modified headers, so conditional
+    requests hitting the cache are answered with a 304 response without touching the database.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                cache = get_cache()
+                key = response_key(request, await aget_versions(dependencies(*args, **kwargs)))
+                response = await cache.aget(key)
+                if response is not None:
+                    return cached_response(request, response)
+
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    compress_response(request, response)
+                    await cache.aset(key, response, getattr(settings, 'FILMS_CACHE_TIMEOUT', 300))
+                response['X-Cache'] = 'MISS'
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = response_key(request, get_versions(dependencies(*args, **kwargs)))
+            response = cache.get(key)
+            if response is not None:
+                return cached_response(request, response)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                compress_response(request, response)
+                cache.set(key, response, getattr(settings, 'FILMS_CACHE_TIMEOUT', 300))
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,117 @@
+"""
+In-process registry of the categories, shared by all the views.
+
+There are only a few categories, read on almost every request: each worker keeps them in memory,
+with maps from id to name and from name to id, and the views resolve, validate and render categories
+from it without querying the Category table.
+
+A change of the categories replaces the token of the CategoryVersion row (see films.signals). The
+worker making the change drops its registry at once; the others compare their token with the
+database at most every FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL seconds, with a single-row query, and
+reload the categories when it differs.
+"""
+import time
+from types import MappingProxyType
+from uuid import uuid4
+from django.conf import settings
+from films.models.Category import Category
+from films.models.CategoryVersion import CategoryVersion
+
+# Seconds between two checks of the version of the categories, unless overridden by the
+# FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL setting
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class CategoryRegistry:
+    """
+    Immutable snapshot of the categories.
+    """
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = tuple(sorted(categories, key=lambda category: category.id))
+        self.by_id = MappingProxyType({category.id: category for category in self.categories})
+        self.names = MappingProxyType({category.id: category.name for category in self.categories})
+        self.ids = MappingProxyType({category.name: category.id for category in self.categories})
+        self.count = len(self.categories)
+        self.last_modified = max((category.updated_at for category in self.categories), default=None)
+
+    def __contains__(self, category_id):
+        return category_id in self.by_id
+
+    def missing(self, category_ids):
+        """
+        Return the sorted ids of category_ids that are not ids of categories.
+        """
+        return sorted(set(category_ids) - self.by_id.keys())
+
+    def get(self, category_ids):
+        """
+        Return the categories of the given ids, in that order, skipping unknown ids.
+        """
+        return [self.by_id[category_id] for category_id in category_ids if category_id in self.by_id]
+
+
+_registry = None
+_checked_at = 0.0
+
+
+def _is_current(now):
+    interval = getattr(settings, 'FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    return _registry is not None and now - _checked_at < interval
+
+
+def _keep(registry, now):
+    global _registry, _checked_at
+    _registry, _checked_at = registry, now
+    return registry
+
+
+def get_registry(check=False):
+    """
+    Return the registry of the categories, loading it again if they changed.
+
+    The database is only checked for changes once per FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL, unless
+    check is set: writes of data derived from the categories set it, so as not to store the names
+    of categories renamed by another worker.
+    """
+    now = time.monotonic()
+    if not check and _is_current(now):
+        return _registry
+
+    version = CategoryVersion.objects.values_list('token', flat=True).first() or ''
+    if _registry is not None and _registry.version == version:
+        return _keep(_registry, now)
+    # The token is read before the categories: a change in between makes the next check reload them
+    return _keep(CategoryRegistry(version, Category.objects.all()), now)
+
+
+async def aget_registry():
+    """
+    Async counterpart of get_registry().
+    """
+    now = time.monotonic()
+    if _is_current(now):
+        return _registry
+
+    version = await CategoryVersion.objects.values_list('token', flat=True).afirst() or ''
+    if _registry is not None and _registry.version == version:
+        return _keep(_registry, now)
+    return _keep(CategoryRegistry(version, [category async for category in Category.objects.all()]), now)
+
+
+def reset_registry():
+    """
+    Drop the registry of this worker, loaded again on next use.
+    """
+    _keep(None, 0.0)
+
+
+def bump_version():
+    """
+    Record a change of the categories, for the registries of all the workers.
+    """
+    updated = CategoryVersion.objects.update(token=uuid4().hex)
+    if not updated:
+        CategoryVersion.objects.create(token=uuid4().hex)
+    reset_registry()
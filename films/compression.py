@@ -0,0 +1,261 @@
+"""
+Compression of the API responses, negotiated from the Accept-Encoding header of the requests.
+
+gzip is always available; brotli and zstd are used when the brotli and zstandard packages are
+installed. Only the content types of FILMS_COMPRESSION_POLICY are compressed, and only above their
+size threshold, so that small bodies such as errors are not worth the CPU. Streaming responses are
+compressed chunk by chunk as they are sent.
+
+The response cache stores the compressed responses (see films.cache), so that a hit is served
+without being compressed again.
+"""
+import gzip
+import zlib
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Minimum size in bytes of the compressed responses, by content type (a type ending with / stands for
+# all its subtypes), unless overridden by the FILMS_COMPRESSION_POLICY setting. Streamed responses
+# have no known size and are compressed whenever their content type is listed.
+DEFAULT_COMPRESSION_POLICY = {
+    'application/json': 1024,
+    'application/xml': 1024,
+    'application/x-ndjson': 1024,
+    'application/msgpack': 1024,
+    'application/cbor': 1024,
+    'text/': 1024,
+}
+
+
+class Encoding:
+    """
+    A content coding: its name in the Accept-Encoding and Content-Encoding headers, and how to compress
+    a whole body or a stream of chunks.
+    """
+    name = None
+
+    def compress(self, data):
+        raise NotImplementedError
+
+    def compressor(self):
+        """
+        Return an object compressing a stream: compress(chunk) returns the compressed bytes available so
+        far, flushed so that clients can decode them at once, and finish() the end of the stream.
+        """
+        raise NotImplementedError
+
+
+class _GzipStream:
+    def __init__(self):
+        # wbits 16 + MAX_WBITS writes the gzip header and trailer
+        self.compressobj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        return self.compressobj.compress(chunk) + self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressobj.flush(zlib.Z_FINISH)
+
+
+class GzipEncoding(Encoding):
+    name = 'gzip'
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    def compressor(self):
+        return _GzipStream()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self.compressobj = brotli.Compressor(quality=5)
+
+    def compress(self, chunk):
+        return self.compressobj.process(chunk) + self.compressobj.flush()
+
+    def finish(self):
+        return self.compressobj.finish()
+
+
+class BrotliEncoding(Encoding):
+    name = 'br'
+
+    def compress(self, data):
+        return brotli.compress(data, quality=5)
+
+    def compressor(self):
+        return _BrotliStream()
+
+
+class _ZstdStream:
+    def __init__(self):
+        self.compressobj = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, chunk):
+        return self.compressobj.compress(chunk) + self.compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressobj.flush()
+
+
+class ZstdEncoding(Encoding):
+    name = 'zstd'
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    def compressor(self):
+        return _ZstdStream()
+
+
+# Available encodings, by order of preference
+ENCODINGS = [encoding for encoding, available in [
+    (ZstdEncoding(), zstandard is not None),
+    (BrotliEncoding(), brotli is not None),
+    (GzipEncoding(), True),
+] if available]
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into a dict of the qualities of the codings it lists, e.g.
+    'gzip, br;q=0.5' into {'gzip': 1.0, 'br': 0.5}.
+    """
+    qualities = {}
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def negotiate_encoding(request):
+    """
+    Return the encoding the Accept-Encoding header of a request prefers, or None to send the response
+    uncompressed: the one with the highest quality, the preferred one of ENCODINGS among equals.
+    """
+    qualities = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding.name, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def minimum_size(response):
+    """
+    Return the minimum size from which a response is compressed, according to its content type, or
+    None if its content type is not compressed.
+    """
+    policy = getattr(settings, 'FILMS_COMPRESSION_POLICY', DEFAULT_COMPRESSION_POLICY)
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    for media_type, size in policy.items():
+        if content_type == media_type or (media_type.endswith('/') and content_type.startswith(media_type)):
+            return size
+    return None
+
+
+def _weaken_etag(response):
+    # The compressed body is not byte for byte the representation the strong ETag identifies
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+def compress_response(request, response):
+    """
+    Compress a response in the encoding the request prefers, if its content type and size allow it.
+    The response is returned, compressed in place.
+    """
+    if response.has_header('Content-Encoding') or response.status_code == 304:
+        return response
+    size = minimum_size(response)
+    if size is None:
+        return response
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if not response.streaming and len(response.content) < size:
+        return response
+
+    encoding = negotiate_encoding(request)
+    if encoding is None:
+        return response
+
+    if not response.streaming:
+        compressed = encoding.compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+    else:
+        if response.is_async:
+            response.streaming_content = _acompress_stream(encoding, response.streaming_content)
+        else:
+            response.streaming_content = _compress_stream(encoding, response.streaming_content)
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+
+    response['Content-Encoding'] = encoding.name
+    _weaken_etag(response)
+    return response
+
+
+def _compress_stream(encoding, chunks):
+    compressor = encoding.compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _acompress_stream(encoding, chunks):
+    compressor = encoding.compressor()
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress the responses according to the Accept-Encoding header of the requests, with
+    compress_response().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request))
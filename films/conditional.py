@@ -0,0 +1,124 @@
+"""
+Conditional GET support (ETag, Last-Modified and 304 responses) for the read endpoints.
+
+The validators of a response are computed from the modification dates of the films and categories it
+shows before anything is serialized: the date of the film for a single film, and for the film lists the
+FilmListVersion row that the signal handlers of films.signals replace on every change of the films, so
+that no list is ever aggregated to validate it.
+"""
+from functools import wraps
+from hashlib import sha1
+from urllib.parse import urlencode
+from uuid import uuid4
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils import timezone
+from django.views.decorators.http import condition
+from films.categories import get_registry
+from films.models.Film import Film
+from films.models.FilmListVersion import FilmListVersion
+
+
+def make_etag(request, *state):
+    """
+    Build a strong ETag from the representation asked for by the request and the state of its data.
+    """
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    accept = request.headers.get('Accept', '')
+    parts = [request.path, query, accept] + [str(part) for part in state]
+    return '"%s"' % sha1("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def latest(*dates):
+    """
+    Return the most recent of the given dates, ignoring the missing ones.
+    """
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def categories_state():
+    """
+    Return the last modification date and the number of the categories.
+
+    The number catches deletions, which leave no modification date behind.
+    """
+    registry = get_registry()
+    return registry.last_modified, registry.count
+
+
+def category_list_state(request):
+    """
+    Return the ETag and last modification date of the list of the categories.
+    """
+    last_modified, count = categories_state()
+    return make_etag(request, last_modified, count), last_modified
+
+
+def bump_film_list_version():
+    """
+    Record a change of the films, for the validators of the film lists.
+    """
+    now = timezone.now()
+    updated = FilmListVersion.objects.update(token=uuid4().hex, updated_at=now)
+    if not updated:
+        FilmListVersion.objects.create(token=uuid4().hex, updated_at=now)
+
+
+def film_list_state(request):
+    """
+    Return the ETag and last modification date of a list of films, from the version of the films and
+    the state of the categories, whatever the films it shows.
+    """
+    token, last_modified = FilmListVersion.objects.values_list('token', 'updated_at').first() or (None, None)
+    categories_last_modified, categories_count = categories_state()
+    return (
+        make_etag(request, token, categories_last_modified, categories_count),
+        latest(last_modified, categories_last_modified),
+    )
+
+
+def film_state(request, film_id):
+    """
+    Return the ETag and last modification date of a single film, or None if it does not exist.
+    """
+    last_modified = Film.objects.filter(id=film_id).values_list('updated_at', flat=True).first()
+    if last_modified is None:
+        return None
+    categories_last_modified, categories_count = categories_state()
+    return (
+        make_etag(request, last_modified, categories_last_modified, categories_count),
+        latest(last_modified, categories_last_modified),
+    )
+
+
+def conditional(state):
+    """
+    Decorator answering conditional GET requests of a read view with a 304 response when possible.
+
+    state is called with the arguments of the view and returns the ETag and last modification date of the
+    response, or None if the resource does not exist.
+    """
+    def request_state(request, *args, **kwargs):
+        # Computed once for both validators
+        if not hasattr(request, '_films_state'):
+            request._films_state = state(request, *args, **kwargs) or (None, None)
+        return request._films_state
+
+    check = condition(
+        etag_func=lambda request, *args, **kwargs: request_state(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: request_state(request, *args, **kwargs)[1],
+    )
+
+    def decorator(view):
+        if not iscoroutinefunction(view):
+            return check(view)
+
+        checked_view = check(view)
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # condition() calls the validator functions synchronously: compute the state beforehand
+            await sync_to_async(request_state)(request, *args, **kwargs)
+            return await checked_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
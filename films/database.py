@@ -0,0 +1,106 @@
+"""
+SQLite tuning and read/write split, enabled by the production settings profile
+(film_api_project.settings_production).
+
+configure_connection() runs on every new connection and applies the FILMS_SQLITE_PRAGMAS: WAL
+journaling lets readers and the writer work concurrently instead of failing with "database is
+locked". The aliases of FILMS_READ_ONLY_DATABASES are made read-only, and with the films.backends.sqlite3
+backend the others start their transactions with BEGIN IMMEDIATE when FILMS_SQLITE_IMMEDIATE_TRANSACTIONS
+is set.
+
+ReadReplicaMiddleware and ReadReplicaRouter send the queries of the GET and HEAD requests to the
+FILMS_READ_DATABASE alias, a read-only connection to the same database.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+# Alias of the database the reads of the GET and HEAD requests go to, unless overridden by the
+# FILMS_READ_DATABASE setting
+DEFAULT_READ_DATABASE = 'replica'
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    connection_created signal handler tuning the new SQLite connections.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = dict(getattr(settings, 'FILMS_SQLITE_PRAGMAS', {}))
+    read_only = connection.alias in getattr(settings, 'FILMS_READ_ONLY_DATABASES', ())
+    if read_only:
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+_read_only_request = ContextVar('films_read_only_request', default=False)
+
+
+@contextmanager
+def read_only_queries():
+    """
+    Send the reads of the block to FILMS_READ_DATABASE, as those of a GET request (e.g. the read
+    sub-requests of a POST batch).
+    """
+    token = _read_only_request.set(True)
+    try:
+        yield
+    finally:
+        _read_only_request.reset(token)
+
+
+class ReadReplicaMiddleware:
+    """
+    Mark the GET and HEAD requests as read-only for ReadReplicaRouter.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _read_only_request.set(request.method in ('GET', 'HEAD'))
+        try:
+            return self.get_response(request)
+        finally:
+            _read_only_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _read_only_request.set(request.method in ('GET', 'HEAD'))
+        try:
+            return await self.get_response(request)
+        finally:
+            _read_only_request.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Route the reads of the read-only requests to the FILMS_READ_DATABASE alias, when it is configured,
+    and everything else to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _read_only_request.get():
+            return None
+        alias = getattr(settings, 'FILMS_READ_DATABASE', DEFAULT_READ_DATABASE)
+        return alias if alias in connections.settings else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are connections to the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,243 @@
+"""
+Materialized JSON documents of the films.
+
+Every film has a FilmDocument holding its representation (serialize_film() with all its fields and
+its categories) already encoded to JSON. The signal handlers of films.signals render it again when
+the film, its categories or the name of one of them change, within the transaction of the change.
+
+The list and detail views read the documents with the films, in the same query, and splice them
+into the response as they are (see RawJSON in films.renderers), only appending the hypermedia links:
+a page costs no per-film serialization and no query for the categories.
+"""
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from films.categories import get_registry
+from films.links import link, url_template
+from films.models.Category import Category
+from films.models.Film import Film
+from films.models.FilmDocument import FilmDocument
+from films.renderers import RawJSON, select_renderer
+from films.serializers import FILM_LIST_FIELDS
+
+# Number of documents rendered at a time
+REFRESH_CHUNK_SIZE = 2000
+
+
+def uses_documents(request, fieldset):
+    """
+    Return whether a response can be built from the documents: the fieldset asks for all the fields
+    and the categories, and the format is not XML, whose serialization reads the models.
+    """
+    return (fieldset.fields == FILM_LIST_FIELDS and 'categories' in fieldset.include
+            and select_renderer(request).media_type != 'application/xml')
+
+
+def render_documents(films, category_ids):
+    """
+    Return the JSON documents of the given films, by film id, given the ids of their categories.
+    """
+    # The documents are stored: check the categories are those of the database
+    registry = get_registry(check=True)
+    documents = {}
+    for film in films:
+        data = {field: getattr(film, field) for field in FILM_LIST_FIELDS}
+        data['publication_date'] = film.publication_date.strftime("%Y-%m-%d")
+        data['categories'] = [{"id": category.id, "name": category.name}
+                              for category in registry.get(category_ids[film.id])]
+        documents[film.id] = json.dumps(data, cls=DjangoJSONEncoder)
+    return documents
+
+
+def film_documents(film_ids):
+    """
+    Render the JSON documents of the films among film_ids, by film id.
+    """
+    category_ids = defaultdict(list)
+    links = Film.categories.through.objects.filter(film_id__in=film_ids).order_by('film_id', 'category_id')
+    for film_id, category_id in links.values_list('film_id', 'category_id'):
+        category_ids[film_id].append(category_id)
+    return render_documents(Film.objects.filter(id__in=film_ids).only(*FILM_LIST_FIELDS), category_ids)
+
+
+def _refresh_chunk(film_ids):
+    documents = film_documents(film_ids)
+    with transaction.atomic():
+        FilmDocument.objects.bulk_create(
+            [FilmDocument(film_id=film_id, document=document) for film_id, document in documents.items()],
+            update_conflicts=True, unique_fields=['film'], update_fields=['document'],
+        )
+
+
+# Ids of the films whose documents are to be rendered at the end of the deferred_refresh() block
+_deferred_film_ids = ContextVar('films_deferred_documents', default=None)
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Render the documents asked for to refresh_films() within the block once, when it ends, however
+    many times the block changes the same films (e.g. their fields, then their categories).
+    """
+    if _deferred_film_ids.get() is not None:
+        # Rendered at the end of the outer block
+        yield
+        return
+    film_ids = set()
+    token = _deferred_film_ids.set(film_ids)
+    try:
+        yield
+    finally:
+        _deferred_film_ids.reset(token)
+    refresh_films(film_ids)
+
+
+def refresh_films(film_ids):
+    """
+    Render the documents of the given films again. Deleted films lose theirs with them.
+    """
+    deferred = _deferred_film_ids.get()
+    if deferred is not None:
+        deferred.update(film_ids)
+        return
+    film_ids = sorted(set(film_ids))
+    for start in range(0, len(film_ids), REFRESH_CHUNK_SIZE):
+        _refresh_chunk(film_ids[start:start + REFRESH_CHUNK_SIZE])
+
+
+def _render_range_sql():
+    # The documents of a range of films rendered by SQLite, as render_documents() does, with the names
+    # of the categories read from their table
+    film, document = Film._meta.db_table, FilmDocument._meta.db_table
+    links, category = Film.categories.through._meta.db_table, Category._meta.db_table
+    return (
+        f"INSERT INTO {document} (film_id, document) "
+        f"SELECT film.id, json_object("
+        f"'id', film.id, 'name', film.name, 'description', film.description, "
+        f"'publication_date', film.publication_date, 'note', film.note, 'categories', ("
+        f"SELECT json_group_array(json_object('id', categories.id, 'name', categories.name)) FROM ("
+        f"SELECT category.id, category.name FROM {links} link "
+        f"JOIN {category} category ON category.id = link.category_id "
+        f"WHERE link.film_id = film.id ORDER BY category.id) categories)) "
+        f"FROM {film} film WHERE film.id BETWEEN %s AND %s"
+    )
+
+
+def refresh_film_range(first_id, last_id):
+    """
+    Render the documents of the films whose id is between first_id and last_id, which have none yet
+    (e.g. seeded films).
+
+    On SQLite, they are rendered by the database in a single INSERT ... SELECT: in compact JSON, but
+    the same documents for the views, which splice them as they are.
+    """
+    if connection.vendor != 'sqlite':
+        for start in range(first_id, last_id + 1, REFRESH_CHUNK_SIZE):
+            refresh_films(range(start, min(start + REFRESH_CHUNK_SIZE, last_id + 1)))
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(_render_range_sql(), [first_id, last_id])
+
+
+def rebuild_documents():
+    """
+    Render the documents of all the films from scratch, and return the number of films.
+    """
+    with transaction.atomic():
+        FilmDocument.objects.all().delete()
+
+        count, last_id = 0, 0
+        while True:
+            film_ids = list(Film.objects.filter(id__gt=last_id).values_list('id', flat=True)[:REFRESH_CHUNK_SIZE])
+            if not film_ids:
+                return count
+            refresh_films(film_ids)
+            count += len(film_ids)
+            last_id = film_ids[-1]
+
+
+def with_documents(films):
+    """
+    Read the documents of the films of a queryset in the same query.
+    """
+    return films.select_related('document')
+
+
+def _links_template():
+    # JSON of the links of a film, as a format string with a film_id field: the URL templates are
+    # encoded once, and the braces of the JSON doubled around them
+    film_href = json.dumps(url_template('get_film', 'film_id'))
+    categories_href = json.dumps(url_template('get_categories_of_film', 'film_id'))
+    return (', "links": {{"film_link": {{"href": ' + film_href + '}}, '
+            '"categories_link": {{"href": ' + categories_href + '}}}}}}')
+
+
+def _splice_documents(films, fieldset, rendered):
+    links = _links_template() if 'links' in fieldset.include else '}}'
+    results = []
+    for film in films:
+        document = getattr(film, 'document', None)
+        encoded = rendered[film.id] if document is None else document.document
+        results.append(RawJSON(encoded[:-1] + links.format(film_id=film.id)))
+    return results
+
+
+def _missing(films):
+    # Films without a document yet (e.g. inserted by raw SQL and not refreshed), rendered on the spot
+    return [film.id for film in films if getattr(film, 'document', None) is None]
+
+
+def film_list_documents(films, fieldset):
+    """
+    Return the representations of a list of films read with with_documents(), as serialize_film_list()
+    does, spliced from their documents.
+    """
+    missing = _missing(films)
+    return _splice_documents(films, fieldset, film_documents(missing) if missing else {})
+
+
+async def afilm_list_documents(films, fieldset):
+    """
+    Async counterpart of film_list_documents().
+    """
+    missing = _missing(films)
+    return _splice_documents(films, fieldset, await sync_to_async(film_documents)(missing) if missing else {})
+
+
+def film_detail_document(film_id):
+    """
+    Return the representation of the detail page of a film, as film_detail_data() does, spliced from
+    its document, or None if it has none.
+    """
+    document = FilmDocument.objects.filter(film_id=film_id).values_list('document', flat=True).first()
+    if document is None:
+        return None
+    return RawJSON(document[:-1] + ', ' + json.dumps(detail_links(film_id))[1:])
+
+
+async def afilm_detail_document(film_id):
+    """
+    Async counterpart of film_detail_document().
+    """
+    document = await FilmDocument.objects.filter(film_id=film_id).values_list('document', flat=True).afirst()
+    if document is None:
+        return None
+    return RawJSON(document[:-1] + ', ' + json.dumps(detail_links(film_id))[1:])
+
+
+def detail_links(film_id):
+    """
+    Return the hypermedia links of the detail page of a film.
+    """
+    return {
+        "links": {
+            "categories_link": {"href": link('get_categories_of_film', film_id=film_id)}
+        },
+        "pagination": {
+            "current_page": link('get_film', film_id=film_id),
+        }
+    }
@@ -0,0 +1,102 @@
+"""
+Filters and ordering of the film list, from the query parameters of a request.
+
+Every filter is a condition on an indexed column, and the category filters are subqueries on the
+(category_id, film_id) index of the categories table, so that any combination compiles to a single
+query, without duplicate films, that the pagination can slice.
+"""
+import datetime
+from films.models.Film import Film
+from films.pagination import FILM_ORDERINGS, max_page_size, order_expressions
+
+
+class InvalidFilter(ValueError):
+    """
+    Raised when a filter or ordering query parameter of a request is invalid.
+    """
+
+
+def _parse(params, name, parse):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        raise InvalidFilter(f"Invalid {name}: {value}")
+
+
+def films_in_categories(category_ids):
+    """
+    Return the ids of the films of any of the given categories, as a subquery.
+    """
+    return Film.categories.through.objects.filter(category_id__in=category_ids).values('film_id')
+
+
+def parse_ids(params):
+    """
+    Return the film ids of the ids query parameter of params, a comma separated list, in the order
+    given and without duplicates, or None if there is none.
+    """
+    value = params.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(film_id) for film_id in value.split(',') if film_id.strip()))
+    except ValueError:
+        raise InvalidFilter(f"Invalid ids: {value}")
+    if len(ids) > max_page_size():
+        raise InvalidFilter(f"Too many ids (at most {max_page_size()})")
+    return ids
+
+
+def filter_film_list(films, params):
+    """
+    Filter a films queryset by the query parameters params (e.g. request.GET):
+    ids, note_min and note_max, published_after and published_before (inclusive, ISO 8601 dates), and
+    category, repeatable, with category_mode=any (default) or all.
+    """
+    ids = parse_ids(params)
+    if ids is not None:
+        films = films.filter(id__in=ids)
+
+    note_min = _parse(params, 'note_min', int)
+    note_max = _parse(params, 'note_max', int)
+    published_after = _parse(params, 'published_after', datetime.date.fromisoformat)
+    published_before = _parse(params, 'published_before', datetime.date.fromisoformat)
+
+    if note_min is not None:
+        films = films.filter(note__gte=note_min)
+    if note_max is not None:
+        films = films.filter(note__lte=note_max)
+    if published_after is not None:
+        films = films.filter(publication_date__gte=published_after)
+    if published_before is not None:
+        films = films.filter(publication_date__lte=published_before)
+
+    try:
+        category_ids = [int(category_id) for category_id in params.getlist('category') if category_id]
+    except ValueError:
+        raise InvalidFilter("Invalid category")
+    category_mode = params.get('category_mode', 'any')
+    if category_mode not in ('any', 'all'):
+        raise InvalidFilter(f"Invalid category_mode: {category_mode} (expected: any or all)")
+
+    if category_ids and category_mode == 'any':
+        films = films.filter(id__in=films_in_categories(category_ids))
+    elif category_ids:
+        for category_id in set(category_ids):
+            films = films.filter(id__in=films_in_categories([category_id]))
+    return films
+
+
+def order_film_list(films, params):
+    """
+    Order a films queryset by the ordering query parameter of params, if any, among FILM_ORDERINGS.
+    """
+    ordering = params.get('ordering')
+    if not ordering:
+        return films
+    if ordering not in FILM_ORDERINGS:
+        raise InvalidFilter(f"Unsupported ordering: {ordering} (expected: {', '.join(FILM_ORDERINGS)})")
+    return films.order_by(*order_expressions(films.model, FILM_ORDERINGS[ordering]))
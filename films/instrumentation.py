@@ -0,0 +1,274 @@
+"""
+Per request performance instrumentation: wall time, database time and queries, repeated queries,
+serialization time and response size, recorded per view (the route names of films.urls).
+
+InstrumentationMiddleware measures every request and sends the measures of the request back in a
+Server-Timing header; the totals since the process started are exposed in the Prometheus text format
+by the /api/_metrics endpoint.
+
+The queries are timed by a database execute wrapper rather than by the DEBUG query log, and the
+measures of a request are kept in a context variable, so the cost is a few clock reads and counter
+updates per query, low enough to leave on in production. The metrics are per process: with several
+workers, each one reports its own.
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Upper bounds in seconds of the buckets of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Number of executions of the same SQL in a request from which it is reported as repeated (typically
+# a query run in a loop, one per object: an N+1 pattern), unless overridden by the
+# FILMS_REPEATED_QUERY_THRESHOLD setting
+DEFAULT_REPEATED_QUERY_THRESHOLD = 5
+
+
+class RequestMetrics:
+    """
+    The measures of a request in progress.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.serialization_time = 0.0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def repeated_queries(self):
+        """
+        Return the number of executions of the queries run more often than the threshold.
+        """
+        threshold = getattr(settings, 'FILMS_REPEATED_QUERY_THRESHOLD', DEFAULT_REPEATED_QUERY_THRESHOLD)
+        return sum(count for count in self.queries.values() if count >= threshold)
+
+
+_current = ContextVar('films_request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the time of the queries to the metrics of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries[sql] += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Add the time spent in the block to the serialization time of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_time += time.perf_counter() - start
+
+
+class _ViewMetrics:
+    def __init__(self):
+        self.requests = Counter()
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.repeated_queries = 0
+        self.serialization_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """
+    The totals of the measures of the requests, per view.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.views = defaultdict(_ViewMetrics)
+
+    def record(self, view, method, status, duration, metrics, response_bytes):
+        with self.lock:
+            view_metrics = self.views[view]
+            view_metrics.requests[method, status] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    view_metrics.duration_buckets[index] += 1
+            view_metrics.duration_sum += duration
+            view_metrics.db_time += metrics.db_time
+            view_metrics.queries += metrics.query_count
+            view_metrics.repeated_queries += metrics.repeated_queries()
+            view_metrics.serialization_time += metrics.serialization_time
+            view_metrics.response_bytes += response_bytes
+
+    def add_response_bytes(self, view, response_bytes):
+        with self.lock:
+            self.views[view].response_bytes += response_bytes
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def prometheus_text(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for suffix, labels, value in samples:
+                    label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                    lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+            metric('films_requests_total', 'counter', "Number of requests.", [
+                ('', [('view', view), ('method', method), ('status', status)], count)
+                for view, view_metrics in views for (method, status), count in sorted(view_metrics.requests.items())
+            ])
+
+            duration_samples = []
+            for view, view_metrics in views:
+                for bound, count in zip(DURATION_BUCKETS, view_metrics.duration_buckets):
+                    duration_samples.append(('_bucket', [('view', view), ('le', bound)], count))
+                count = sum(view_metrics.requests.values())
+                duration_samples.append(('_bucket', [('view', view), ('le', '+Inf')], count))
+                duration_samples.append(('_sum', [('view', view)], view_metrics.duration_sum))
+                duration_samples.append(('_count', [('view', view)], count))
+            metric('films_request_duration_seconds', 'histogram', "Wall time of the requests.", duration_samples)
+
+            for name, attribute, help_text in [
+                ('films_db_duration_seconds_total', 'db_time', "Time spent running database queries."),
+                ('films_db_queries_total', 'queries', "Number of database queries."),
+                ('films_repeated_queries_total', 'repeated_queries',
+                 "Number of executions of queries repeated in a request (N+1 patterns)."),
+                ('films_serialization_seconds_total', 'serialization_time', "Time spent rendering the responses."),
+                ('films_response_bytes_total', 'response_bytes', "Size of the response bodies."),
+            ]:
+                metric(name, 'counter', help_text,
+                       [('', [('view', view)], getattr(view_metrics, attribute)) for view, view_metrics in views])
+            return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = MetricsRegistry()
+
+
+def view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'unmatched'
+    return resolver_match.url_name or resolver_match.view_name
+
+
+def server_timing(duration, metrics):
+    """
+    Return the Server-Timing header of a request.
+    """
+    entries = [
+        f'app;dur={duration * 1000:.2f}',
+        f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.query_count} queries"',
+        f'serialize;dur={metrics.serialization_time * 1000:.2f}',
+    ]
+    repeated_queries = metrics.repeated_queries()
+    if repeated_queries:
+        entries.append(f'repeated-queries;desc="{repeated_queries} repeated queries"')
+    return ", ".join(entries)
+
+
+def _count_stream(view, chunks):
+    for chunk in chunks:
+        REGISTRY.add_response_bytes(view, len(chunk))
+        yield chunk
+
+
+async def _acount_stream(view, chunks):
+    async for chunk in chunks:
+        REGISTRY.add_response_bytes(view, len(chunk))
+        yield chunk
+
+
+class InstrumentationMiddleware:
+    """
+    Measure the requests, add their Server-Timing header and record them in REGISTRY.
+
+    Streamed responses are measured until their first byte, and their size as they are sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_recorder, dispatch_uid='films.instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.start
+        view = view_name(request)
+        response['Server-Timing'] = server_timing(duration, metrics)
+
+        if response.streaming:
+            response_bytes = 0
+            if response.is_async:
+                response.streaming_content = _acount_stream(view, response.streaming_content)
+            else:
+                response.streaming_content = _count_stream(view, response.streaming_content)
+        else:
+            response_bytes = len(response.content)
+        REGISTRY.record(view, request.method, response.status_code, duration, metrics, response_bytes)
+        return response
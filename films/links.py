@@ -0,0 +1,50 @@
+"""
+Hypermedia links of the API resources.
+
+reverse() walks the URLconf on every call, which adds up when the links of every film of a page are
+built. Each route is reversed once instead, with placeholder arguments, into a template the ids are
+then formatted into.
+"""
+from functools import lru_cache
+from django.conf import settings
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+# Reversed in place of the arguments of a route, then replaced by format fields
+PLACEHOLDER = 9876543210
+
+
+@lru_cache(maxsize=None)
+def _url_template(name, arguments, script_prefix, urlconf):
+    placeholders = {argument: PLACEHOLDER + index for index, argument in enumerate(arguments)}
+    template = reverse(name, kwargs=placeholders or None, urlconf=urlconf).replace('{', '{{').replace('}', '}}')
+    for argument, placeholder in placeholders.items():
+        template = template.replace(str(placeholder), '{%s}' % argument)
+    return template
+
+
+def url_template(name, *arguments):
+    """
+    Return the URL of a route as a format string with a field per argument, e.g. '/api/films/{film_id}/'.
+
+    Templates are cached per script prefix and URLconf, as reverse() results depend on both.
+    """
+    return _url_template(name, arguments, get_script_prefix(), get_urlconf() or settings.ROOT_URLCONF)
+
+
+def link(name, **kwargs):
+    """
+    Return the URL of a route, as reverse(name, kwargs=kwargs) does for integer arguments such as ids.
+    """
+    return url_template(name, *sorted(kwargs)).format_map(kwargs)
+
+
+def query_link(path, params, **changes):
+    """
+    Return the URL of a path with the query parameters of params (e.g. request.GET), some of them
+    replaced by changes, URL-encoded.
+    """
+    params = params.copy()
+    for name, value in changes.items():
+        params[name] = value
+    query = params.urlencode()
+    return f"{path}?{query}" if query else path
@@ -0,0 +1,49 @@
+import json
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from films.benchmark import build_scenarios, missing_routes, run_benchmark
+from films.models.Film import Film
+from films.seeding import seed_films
+
+
+class Command(BaseCommand):
+    help = ("Benchmark every API endpoint against a test database seeded with a catalogue of the given size, "
+            "and report latency percentiles, throughput and SQL queries per request as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--films', type=int, default=10000, help="Number of films of the catalogue (default: 10000).")
+        parser.add_argument('--requests', type=int, default=100, help="Number of requests per scenario (default: 100).")
+        parser.add_argument('--warm-cache', action='store_true', help="Keep the response cache between requests.")
+        parser.add_argument('--route', action='append', dest='routes', help="Only benchmark this route (repeatable).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random choices of the scenarios.")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database, and its films, between runs.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of the standard output.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Fail before seeding if a route has no scenario
+            missing = missing_routes(build_scenarios(random.Random(options['seed'])))
+            if missing:
+                raise CommandError(f"No benchmark scenario for the routes: {', '.join(missing)}")
+
+            missing_films = options['films'] - Film.objects.count()
+            if missing_films > 0:
+                self.stderr.write(f"Seeding {missing_films} films...")
+                seed_films(missing_films, seed=options['seed'])
+
+            report = run_benchmark(options['requests'], options['warm_cache'], options['seed'], options['routes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
@@ -0,0 +1,36 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from films.transfer import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, export_films
+
+
+class Command(BaseCommand):
+    help = ("Export all the films with their categories as JSON Lines or CSV, reading them by chunks so that "
+            "the memory used does not depend on the size of the catalogue.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to write, - for the standard output.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Format of the file (default: csv for a .csv file, jsonl otherwise).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Number of films read per query (default: {DEFAULT_CHUNK_SIZE}).")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("The chunk size must be at least 1.")
+        path = options['path']
+        format = options['format'] or detect_format(path)
+        # The messages go to the standard error when the films go to the standard output
+        messages = self.stderr if path == '-' else self.stdout
+        start = time.perf_counter()
+
+        def progress(count):
+            if options['verbosity'] >= 2:
+                messages.write(f"{count} films exported")
+
+        if path == '-':
+            count = export_films(sys.stdout, format, options['chunk_size'], progress)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as out:
+                count = export_films(out, format, options['chunk_size'], progress)
+        messages.write(self.style.SUCCESS(f"Exported {count} films in {time.perf_counter() - start:.1f}s."))
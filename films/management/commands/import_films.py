@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from films.transfer import DEFAULT_CHUNK_SIZE, FORMATS, import_films
+
+
+class Command(BaseCommand):
+    help = ("Import films from a JSON Lines or CSV file, as written by export_films, creating or updating "
+            "them by name and publication date. Every chunk is committed on its own: an interrupted "
+            "import of the same file resumes after the last committed chunk.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Format of the file (default: csv for a .csv file, jsonl otherwise).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Number of films written per transaction (default: {DEFAULT_CHUNK_SIZE}).")
+        parser.add_argument('--restart', action='store_true',
+                            help="Import the whole file, even if a previous import of it was interrupted.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("The chunk size must be at least 1.")
+        start = time.perf_counter()
+
+        def progress(position, counts):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{position} records read: {self.summary(counts)}")
+
+        def on_error(number, error):
+            self.stderr.write(f"Line {number}: {error}")
+
+        try:
+            counts = import_films(options['path'], options['format'], options['chunk_size'],
+                                  resume=not options['restart'], progress=progress, on_error=on_error)
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {options['path']} in {time.perf_counter() - start:.1f}s: {self.summary(counts)}."))
+
+    @staticmethod
+    def summary(counts):
+        return ", ".join(f"{counts[key]} {key}" for key in ('created', 'updated', 'unchanged', 'invalid', 'skipped'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from films import documents
+
+
+class Command(BaseCommand):
+    help = "Render the JSON documents of all the films again."
+
+    def handle(self, *args, **options):
+        count = documents.rebuild_documents()
+        self.stdout.write(self.style.SUCCESS(f"Rendered {count} documents."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from films import search
+from films.models.Film import Film
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of the films."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write("The full-text search index is only available on SQLite, nothing to do.")
+            return
+
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Film.objects.count()} films."))
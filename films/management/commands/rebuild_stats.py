@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from films import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalogue statistics from the films."
+
+    def handle(self, *args, **options):
+        count = stats.rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f"Counted {count} films."))
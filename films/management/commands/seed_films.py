@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from films.seeding import DEFAULT_BATCH_SIZE, seed_films
+
+
+class Command(BaseCommand):
+    help = ("Create fake films with random categories, with bulk inserts in a single transaction. "
+            "The same --seed always produces the same films.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help="Number of films to create.")
+        parser.add_argument('--seed', type=int, help="Seed of the random generators, for a reproducible catalogue.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Number of rows per insert (default: {DEFAULT_BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 0 or options['batch_size'] < 1:
+            raise CommandError("The number of films must be positive and the batch size at least 1.")
+
+        start = time.perf_counter()
+
+        def progress(created):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{created}/{count} films created")
+
+        created = seed_films(count, batch_size=options['batch_size'], seed=options['seed'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} films in {time.perf_counter() - start:.1f}s."))
@@ -1,7 +1,5 @@
 from django.db import migrations, models
 import random
-from films.models.Film import Film
-from films.models.Category import Category
 
 
 def populate_categories(apps, schema_editor):
@@ -21,17 +19,18 @@ def populate_categories(apps, schema_editor):
 
 
 def assign_categories_to_films(apps, schema_editor):
-    # Retrieve all films
-    films = Film.objects.all()
+    Film = apps.get_model('films', 'Film')
+    Category = apps.get_model('films', 'Category')
 
-    # Retrieve a random category
-    categories = Category.objects.all()
+    Through = Film.categories.through
+    category_ids = list(Category.objects.values_list('id', flat=True))
 
-    # Assign random categories to each film
-    for film in films:
-        num_categories = random.randint(1, 4)  # Choose a random number of categories between 1 and 3
-        random_categories = random.sample(list(categories), num_categories)  # Select random categories
-        film.categories.add(*random_categories)  # Assign categories to the film
+    # Assign 1 to 4 random categories to each film, in a single insert
+    Through.objects.bulk_create([
+        Through(film_id=film_id, category_id=category_id)
+        for film_id in Film.objects.values_list('id', flat=True)
+        for category_id in random.sample(category_ids, min(random.randint(1, 4), len(category_ids)))
+    ])
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# The DDL of the full-text index as of this migration, independent of later changes to films.search
+CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS films_film_fts "
+    "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')",
+    "DELETE FROM films_film_fts",
+    "INSERT INTO films_film_fts(rowid, name, description) SELECT id, name, description FROM films_film",
+]
+DROP_INDEX = ["DROP TABLE IF EXISTS films_film_fts"]
+
+
+def run_on_sqlite(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0003_auto_assign_categories'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_INDEX), reverse_code=run_on_sqlite(DROP_INDEX)),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0004_film_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Date and time of the last modification of the film'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='film',
+            options={'ordering': ['id']},
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['publication_date', 'id'], name='films_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['note'], name='films_note_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['name'], name='films_name_idx'),
+        ),
+        # The films of a category, in the order of their ids, read from the index alone. The through
+        # table of Film.categories is auto-created, hence raw SQL rather than Meta.indexes.
+        migrations.RunSQL(
+            'CREATE INDEX films_film_categories_category_film_idx ON films_film_categories (category_id, film_id)',
+            reverse_sql='DROP INDEX films_film_categories_category_film_idx',
+        ),
+    ]
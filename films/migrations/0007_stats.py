@@ -0,0 +1,75 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Film = apps.get_model('films', 'Film')
+    CategoryStats = apps.get_model('films', 'CategoryStats')
+    FilmStatsEntry = apps.get_model('films', 'FilmStatsEntry')
+    YearStats = apps.get_model('films', 'YearStats')
+
+    categories = defaultdict(list)
+    links = Film.categories.through.objects.order_by('film_id', 'category_id')
+    for film_id, category_id in links.values_list('film_id', 'category_id'):
+        categories[film_id].append(category_id)
+
+    entries = []
+    counts = {CategoryStats: defaultdict(lambda: [0, 0, 0]), YearStats: defaultdict(lambda: [0, 0, 0])}
+    for film_id, publication_date, note in Film.objects.values_list('id', 'publication_date', 'note').iterator():
+        entries.append(FilmStatsEntry(film_id=film_id, year=publication_date.year, note=note,
+                                      category_ids=",".join(map(str, categories[film_id]))))
+        keys = [(YearStats, publication_date.year)] + [(CategoryStats, category_id) for category_id in categories[film_id]]
+        for model, pk in keys:
+            row = counts[model][pk]
+            row[0] += 1
+            if note is not None:
+                row[1] += 1
+                row[2] += note
+
+    FilmStatsEntry.objects.bulk_create(entries, batch_size=1000)
+    for model, rows in counts.items():
+        model.objects.bulk_create([
+            model(pk=pk, film_count=film_count, note_count=note_count, note_sum=note_sum)
+            for pk, (film_count, note_count, note_sum) in rows.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0006_film_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='films.category')),
+                ('film_count', models.PositiveIntegerField(default=0, help_text='Number of films of the category')),
+                ('note_count', models.PositiveIntegerField(default=0, help_text='Number of films of the category with a note')),
+                ('note_sum', models.BigIntegerField(default=0, help_text='Sum of the notes of the films of the category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FilmStatsEntry',
+            fields=[
+                ('film_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('year', models.PositiveIntegerField()),
+                ('note', models.IntegerField(null=True)),
+                ('category_ids', models.CharField(blank=True, help_text='Comma-separated ids of the categories', max_length=1024)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='YearStats',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('film_count', models.PositiveIntegerField(default=0, help_text='Number of films published in the year')),
+                ('note_count', models.PositiveIntegerField(default=0, help_text='Number of films published in the year with a note')),
+                ('note_sum', models.BigIntegerField(default=0, help_text='Sum of the notes of the films published in the year')),
+            ],
+        ),
+        migrations.RunPython(populate_stats, reverse_code=migrations.RunPython.noop),
+    ]
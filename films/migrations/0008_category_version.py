@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:19
+
+from uuid import uuid4
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    CategoryVersion = apps.get_model('films', 'CategoryVersion')
+    CategoryVersion.objects.create(token=uuid4().hex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0007_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(help_text='Random token replaced on every change of the categories', max_length=32)),
+            ],
+        ),
+        migrations.RunPython(create_version, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:26
+
+import django.db.models.deletion
+import json
+from collections import defaultdict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+
+def populate_documents(apps, schema_editor):
+    Category = apps.get_model('films', 'Category')
+    Film = apps.get_model('films', 'Film')
+    FilmDocument = apps.get_model('films', 'FilmDocument')
+
+    names = dict(Category.objects.values_list('id', 'name'))
+    categories = defaultdict(list)
+    links = Film.categories.through.objects.order_by('film_id', 'category_id')
+    for film_id, category_id in links.values_list('film_id', 'category_id'):
+        categories[film_id].append({"id": category_id, "name": names[category_id]})
+
+    documents = []
+    for film in Film.objects.only('id', 'name', 'description', 'publication_date', 'note').iterator():
+        documents.append(FilmDocument(film_id=film.id, document=json.dumps({
+            "id": film.id,
+            "name": film.name,
+            "description": film.description,
+            "publication_date": film.publication_date.strftime("%Y-%m-%d"),
+            "note": film.note,
+            "categories": categories[film.id],
+        }, cls=DjangoJSONEncoder)))
+    FilmDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0008_category_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmDocument',
+            fields=[
+                ('film', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='films.film')),
+                ('document', models.TextField(help_text='JSON representation of the film, as serialize_film() returns it')),
+            ],
+        ),
+        migrations.RunPython(populate_documents, reverse_code=migrations.RunPython.noop),
+    ]
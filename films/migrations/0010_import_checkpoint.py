@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0009_film_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Absolute path of the imported file', max_length=1024, unique=True)),
+                ('fingerprint', models.CharField(help_text='Size and modification time of the imported file', max_length=64)),
+                ('position', models.BigIntegerField(default=0, help_text='Number of records of the file already imported')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:53
+
+from uuid import uuid4
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def create_version(apps, schema_editor):
+    Film = apps.get_model('films', 'Film')
+    FilmListVersion = apps.get_model('films', 'FilmListVersion')
+    updated_at = Film.objects.aggregate(updated_at=Max('updated_at'))['updated_at'] or timezone.now()
+    FilmListVersion.objects.create(token=uuid4().hex, updated_at=updated_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0010_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmListVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(help_text='Random token replaced on every change of the films', max_length=32)),
+                ('updated_at', models.DateTimeField(help_text='Date of the last change of the films')),
+            ],
+        ),
+        migrations.RunPython(create_version, reverse_code=migrations.RunPython.noop),
+    ]
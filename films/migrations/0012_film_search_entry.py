@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0011_film_list_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmSearchEntry',
+            fields=[
+                ('film', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='films.film')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('rank', models.FloatField(help_text='bm25 relevance of the film for the MATCH of the query, lower being better')),
+            ],
+            options={
+                'db_table': 'films_film_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import models
+from films.models.Category import Category
+
+
+class CategoryStats(models.Model):
+    """
+    Summary of the films of a category, maintained by films.stats.
+    """
+
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    film_count = models.PositiveIntegerField(default=0, help_text="Number of films of the category")
+    note_count = models.PositiveIntegerField(default=0, help_text="Number of films of the category with a note")
+    note_sum = models.BigIntegerField(default=0, help_text="Sum of the notes of the films of the category")
+
+    def __str__(self):
+        return f"{self.category_id}: {self.film_count} films"
@@ -0,0 +1,10 @@
+from django.db import models
+
+
+class CategoryVersion(models.Model):
+    """
+    Single row holding the version of the categories, replaced whenever one of them changes, so that
+    every worker can tell whether its copy of the categories (films.categories) is up to date.
+    """
+
+    token = models.CharField(max_length=32, help_text="Random token replaced on every change of the categories")
@@ -12,6 +12,17 @@ class Film(models.Model):
     publication_date = models.DateField(help_text="Enter the publication date of the film in ISO 8601 format")
     note = models.IntegerField(default=0, blank=True, null=True, help_text="Enter the note of the film (optional)")
     categories = models.ManyToManyField(Category)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Date and time of the last modification of the film")
+
+    class Meta:
+        # Deterministic order for the pages of the film list, covered by the primary key
+        ordering = ['id']
+        indexes = [
+            # Listing by publication date, with the id as tie-breaker of the cursor pagination
+            models.Index(fields=['publication_date', 'id'], name='films_pub_date_id_idx'),
+            models.Index(fields=['note'], name='films_note_idx'),
+            models.Index(fields=['name'], name='films_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
\ No newline at end of file
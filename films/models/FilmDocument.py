@@ -0,0 +1,14 @@
+from django.db import models
+from films.models.Film import Film
+
+
+class FilmDocument(models.Model):
+    """
+    The JSON representation of a film, without its hypermedia links, maintained by films.documents.
+    """
+
+    film = models.OneToOneField(Film, on_delete=models.CASCADE, primary_key=True, related_name='document')
+    document = models.TextField(help_text="JSON representation of the film, as serialize_film() returns it")
+
+    def __str__(self):
+        return f"Document of film {self.film_id}"
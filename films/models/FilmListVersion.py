@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class FilmListVersion(models.Model):
+    """
+    Single row holding the version of the film lists, replaced whenever a film is created, changed,
+    recategorized or deleted, so that the validators of the lists cost a primary key lookup.
+    """
+
+    token = models.CharField(max_length=32, help_text="Random token replaced on every change of the films")
+    updated_at = models.DateTimeField(help_text="Date of the last change of the films")
@@ -0,0 +1,22 @@
+from django.db import models
+from films.models.Film import Film
+
+
+class FilmSearchEntry(models.Model):
+    """
+    The entry of a film in the FTS5 full-text index (films.search), so that searches join it to the
+    films: the table is a virtual table created and maintained by films.search, not by migrations.
+    """
+
+    film = models.OneToOneField(Film, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                db_constraint=False, related_name='search_entry')
+    name = models.TextField()
+    description = models.TextField()
+    rank = models.FloatField(help_text="bm25 relevance of the film for the MATCH of the query, lower being better")
+
+    class Meta:
+        managed = False
+        db_table = 'films_film_fts'
+
+    def __str__(self):
+        return f"Search entry of film {self.film_id}"
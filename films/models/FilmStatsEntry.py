@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class FilmStatsEntry(models.Model):
+    """
+    What a film currently counts for in the summary tables (CategoryStats and YearStats).
+
+    Comparing it with the film tells films.stats what to add and subtract when the film changes, is
+    recategorized or is deleted, whatever the way it was written. It is not a foreign key, so that it
+    outlives a deleted film until its counts are subtracted.
+    """
+
+    film_id = models.BigIntegerField(primary_key=True)
+    year = models.PositiveIntegerField()
+    note = models.IntegerField(null=True)
+    category_ids = models.CharField(max_length=1024, blank=True, help_text="Comma-separated ids of the categories")
@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class ImportCheckpoint(models.Model):
+    """
+    How far the import of a file went, committed with each chunk of its films, so that an interrupted
+    import resumes after the last committed chunk (see films.transfer).
+    """
+
+    source = models.CharField(max_length=1024, unique=True, help_text="Absolute path of the imported file")
+    fingerprint = models.CharField(max_length=64, help_text="Size and modification time of the imported file")
+    position = models.BigIntegerField(default=0, help_text="Number of records of the file already imported")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.position} records"
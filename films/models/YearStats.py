@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class YearStats(models.Model):
+    """
+    Summary of the films published in a year, maintained by films.stats.
+    """
+
+    year = models.PositiveIntegerField(primary_key=True)
+    film_count = models.PositiveIntegerField(default=0, help_text="Number of films published in the year")
+    note_count = models.PositiveIntegerField(default=0, help_text="Number of films published in the year with a note")
+    note_sum = models.BigIntegerField(default=0, help_text="Sum of the notes of the films published in the year")
+
+    def __str__(self):
+        return f"{self.year}: {self.film_count} films"
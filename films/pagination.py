@@ -0,0 +1,298 @@
+"""
+Keyset (cursor) pagination for film lists.
+"""
+import base64
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from films.links import query_link
+
+DEFAULT_PAGE_SIZE = 10
+
+# Largest number of films in a page, whatever the page_size asked for, unless overridden by the
+# FILMS_MAX_PAGE_SIZE setting
+DEFAULT_MAX_PAGE_SIZE = 1000
+
+# Orderings of the film lists (ordering parameter), mapped to the fields of their keyset, each covered
+# by an index. The id always comes last so that the keyset identifies a single film.
+FILM_ORDERINGS = {
+    'id': ('id',),
+    '-id': ('-id',),
+    'publication_date': ('publication_date', 'id'),
+    '-publication_date': ('-publication_date', '-id'),
+    'note': ('note', 'id'),
+    '-note': ('-note', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+}
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when the cursor, ordering or page size of a cursor paginated request is invalid.
+    """
+
+
+def encode_cursor(ordering, direction, values):
+    """
+    Encode the keyset values of a film into an opaque cursor.
+    """
+    payload = json.dumps([ordering, direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor into its ordering, direction ('next' or 'prev') and keyset values.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        ordering, direction, values = json.loads(payload)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if (ordering not in FILM_ORDERINGS or direction not in ('next', 'prev')
+            or not isinstance(values, list) or len(values) != len(FILM_ORDERINGS[ordering])):
+        raise InvalidCursor("Invalid cursor")
+    return ordering, direction, values
+
+
+def max_page_size():
+    return getattr(settings, 'FILMS_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+
+
+def page_size_param(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Return the page size asked for by the page_size query parameter of a page numbered request,
+    clamped between 1 and max_page_size(), or the default one if the parameter is missing or invalid.
+    """
+    try:
+        page_size = int(value) if value is not None else default
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, max_page_size()))
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Parse the page_size query parameter of a cursor paginated request, clamped to max_page_size().
+    """
+    if value is None:
+        return default
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise InvalidCursor("Invalid page_size")
+    if page_size < 1:
+        raise InvalidCursor("Invalid page_size")
+    return min(page_size, max_page_size())
+
+
+def _reverse_fields(fields):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in fields)
+
+
+def order_expressions(model, fields):
+    """
+    Return the order_by() arguments of keyset fields of a model.
+
+    NULLs (e.g. of the note) sort as the smallest values whatever the database, which is also the
+    native order of SQLite, so that its indexes still provide the order.
+    """
+    expressions = []
+    for field in fields:
+        name = field.lstrip('-')
+        if not model._meta.get_field(name).null:
+            expressions.append(field)
+        elif field.startswith('-'):
+            expressions.append(F(name).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_first=True))
+    return expressions
+
+
+def _after(field, value):
+    # NULL sorts before any value
+    if value is None:
+        return Q(**{f"{field}__isnull": False})
+    return Q(**{f"{field}__gt": value})
+
+
+def _before(field, value):
+    if value is None:
+        return Q(pk__in=[])
+    return Q(**{f"{field}__lt": value}) | Q(**{f"{field}__isnull": True})
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{f"{field}__isnull": True})
+    return Q(**{field: value})
+
+
+def _keyset_filter(fields, values, forward):
+    """
+    Build the condition selecting the rows after (or before, when not forward) the given keyset values.
+    """
+    condition = Q()
+    for index, field in enumerate(fields):
+        ascending = not field.startswith('-')
+        compare = _after if ascending == forward else _before
+        clause = compare(field.lstrip('-'), values[index])
+        for previous_field, previous_value in zip(fields[:index], values[:index]):
+            clause &= _equal(previous_field.lstrip('-'), previous_value)
+        condition |= clause
+    return condition
+
+
+def page_pagination(page, page_link):
+    """
+    Build the pagination block of a page of a django.core.paginator.Paginator.
+
+    page_link is called with a page number and returns the link to that page.
+    """
+    return {
+        "page": page.number,
+        "total_pages": page.paginator.num_pages,
+        "total_results": page.paginator.count,
+        "next_page": page_link(page.next_page_number()) if page.has_next() else None,
+        "prev_page": page_link(page.previous_page_number()) if page.has_previous() else None,
+        "current_page": page_link(page.number),
+    }
+
+
+class CursorPage:
+    """
+    A page of films located by a keyset instead of an offset.
+
+    The cursors hold the keyset values of the first or last film of the page, so a deep page costs the
+    same as the first one. The total number of results is only counted when the client asks for it
+    with the count parameter.
+    """
+
+    def __init__(self, request, queryset):
+        self._prepare(request, queryset)
+        self._load(list(self.page_queryset))
+
+    @classmethod
+    async def acreate(cls, request, queryset):
+        """
+        Async counterpart of the constructor, fetching the films with the async ORM API.
+        """
+        page = cls.__new__(cls)
+        page._prepare(request, queryset)
+        page._load([film async for film in page.page_queryset])
+        return page
+
+    def _prepare(self, request, queryset):
+        """
+        Build the queryset of the films of the page from the parameters of the request.
+        """
+        token = request.GET.get('cursor', '')
+        self.ordering = request.GET.get('ordering', 'id')
+        self.page_size = parse_page_size(request.GET.get('page_size'))
+
+        if token:
+            # The cursor carries the ordering of the pages it was built from
+            self.ordering, direction, self._cursor_values = decode_cursor(token)
+        else:
+            direction, self._cursor_values = 'next', None
+
+        if self.ordering not in FILM_ORDERINGS:
+            raise InvalidCursor(f"Unsupported ordering for cursor pagination: {self.ordering}")
+
+        self.fields = FILM_ORDERINGS[self.ordering]
+        self._forward = direction == 'next'
+        films = queryset
+        if self._cursor_values is not None:
+            try:
+                films = films.filter(_keyset_filter(self.fields, self._cursor_values, self._forward))
+            except (ValueError, TypeError, ValidationError):
+                raise InvalidCursor("Invalid cursor")
+
+        # Sparse fieldsets load only some fields of the films: load the keyset too
+        loaded_fields, deferred = films.query.deferred_loading
+        if loaded_fields and not deferred:
+            films = films.only(*loaded_fields, *(field.lstrip('-') for field in self.fields))
+
+        # Fetch one extra film to know whether there is a page after this one
+        films = films.order_by(*order_expressions(films.model, self.fields if self._forward else _reverse_fields(self.fields)))
+        self.page_queryset = films[:self.page_size + 1]
+        self.queryset = queryset
+
+    def _load(self, object_list):
+        """
+        Set the films of the page from the result of its queryset.
+        """
+        has_more = len(object_list) > self.page_size
+        object_list = object_list[:self.page_size]
+        if not self._forward:
+            object_list.reverse()
+
+        self.object_list = object_list
+        if self._forward:
+            self.has_next = has_more
+            self.has_previous = self._cursor_values is not None and bool(object_list)
+        else:
+            self.has_next = bool(object_list)
+            self.has_previous = has_more
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def _keyset_values(self, film):
+        return [getattr(film, field.lstrip('-')) for field in self.fields]
+
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self.ordering, 'next', self._keyset_values(self.object_list[-1]))
+
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        return encode_cursor(self.ordering, 'prev', self._keyset_values(self.object_list[0]))
+
+    def wants_count(self, request):
+        return request.GET.get('count') in ('1', 'true')
+
+    def pagination(self, request, total_results=None):
+        """
+        Build the pagination block of the response, with the links to the neighbouring pages.
+
+        The total number of results is counted if the client asked for it, unless given.
+        """
+        def page_link(cursor):
+            if cursor is None:
+                return None
+            return query_link(request.path, request.GET, cursor=cursor)
+
+        pagination = {
+            "page_size": self.page_size,
+            "next_page": page_link(self.next_cursor()),
+            "prev_page": page_link(self.previous_cursor()),
+            "current_page": request.get_full_path(),
+        }
+
+        if self.wants_count(request):
+            pagination["total_results"] = self.queryset.count() if total_results is None else total_results
+        return pagination
+
+    async def apagination(self, request):
+        """
+        Async counterpart of pagination().
+        """
+        total_results = await self.queryset.acount() if self.wants_count(request) else None
+        return self.pagination(request, total_results)
+
+
+async def aget_page(paginator, number):
+    """
+    Async counterpart of Paginator.get_page(), counting and fetching the objects with the async ORM API.
+    """
+    paginator.count = await paginator.object_list.acount()
+    page = paginator.get_page(number)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
@@ -0,0 +1,278 @@
+"""
+Response formats of the API, chosen from the Accept header of the requests.
+
+Every renderer of the registry encodes the JSON-like representation of a response (dicts, lists,
+strings, numbers) to one media type. The views build that representation once and render_response()
+encodes it in the format the client prefers: JSON (the default), XML, MessagePack or CBOR, the last two
+being much cheaper to decode than JSON for the services consuming large pages.
+
+Other formats can be added with register_renderer().
+
+Parts of the representation may be given already encoded to JSON, as RawJSON values: the JSON renderer
+splices them as they are, and the other ones decode them first.
+"""
+import json
+import re
+from uuid import uuid4
+from io import StringIO
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.xmlutils import SimplerXMLGenerator
+from films import binary
+from films.instrumentation import timed_serialization
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def parse_accept(header):
+    """
+    Parse an Accept header into a list of (media range, quality) pairs, e.g. 'application/json;q=0.5'
+    into [('application/json', 0.5)]. Invalid media ranges are ignored.
+    """
+    media_ranges = []
+    for part in header.split(','):
+        media_range, *params = [item.strip() for item in part.split(';')]
+        media_range = media_range.lower()
+        if media_range.count('/') != 1:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        media_ranges.append((media_range, quality))
+    return media_ranges
+
+
+def _precedence(media_range, media_type):
+    """
+    Return how specifically a media range matches a media type (3 for an exact match, 2 for type/*,
+    1 for */*), or 0 if it does not match it.
+    """
+    if media_range == media_type:
+        return 3
+    if media_range == '*/*':
+        return 1
+    main_type, sub_type = media_range.split('/')
+    return 2 if sub_type == '*' and media_type.startswith(main_type + '/') else 0
+
+
+def quality(media_ranges, media_type):
+    """
+    Return the quality of a media type for the parsed Accept header media_ranges, given by the most
+    specific range matching it, with the position of that range in the header.
+    """
+    best = (0, 0.0, 0)
+    for position, (media_range, range_quality) in enumerate(media_ranges):
+        precedence = _precedence(media_range, media_type)
+        if precedence > best[0]:
+            best = (precedence, range_quality, position)
+    return best[1], best[2]
+
+
+def best_match(header, media_types, default=None):
+    """
+    Return the media type of media_types the Accept header prefers: the one with the highest quality,
+    then the one matched by the earliest media range of the header, then the first of media_types.
+    default is returned when none is acceptable, and the first one when there is no Accept header.
+    """
+    if not header.strip():
+        return media_types[0]
+    media_ranges = parse_accept(header)
+
+    best, best_key = default, None
+    for media_type in media_types:
+        media_type_quality, position = quality(media_ranges, media_type)
+        if media_type_quality > 0 and (best_key is None or (-media_type_quality, position) < best_key):
+            best, best_key = media_type, (-media_type_quality, position)
+    return best
+
+
+def explicitly_accepts(header, media_type):
+    """
+    Return whether the Accept header names a media type with a non-zero quality, rather than through a
+    wildcard.
+    """
+    return any(media_range == media_type and range_quality > 0 for media_range, range_quality in parse_accept(header))
+
+
+class RawJSON:
+    """
+    A value of a representation already encoded to JSON (e.g. a stored document).
+    """
+    __slots__ = ('encoded',)
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+
+    def decode(self):
+        return json.loads(self.encoded)
+
+
+def _default(value):
+    # Dates, decimals, UUIDs... as JSON represents them
+    if isinstance(value, RawJSON):
+        return value.decode()
+    return DjangoJSONEncoder().default(value)
+
+
+class Renderer:
+    """
+    Encodes the representation of a response to a media type.
+    """
+    media_type = None
+    charset = None
+
+    @property
+    def content_type(self):
+        return f"{self.media_type}; charset={self.charset}" if self.charset else self.media_type
+
+    def render(self, data, xml=None):
+        """
+        Return the bytes of data in the format of the renderer.
+
+        xml is an optional function returning the XML of the response, for the formats reusing it.
+        """
+        raise NotImplementedError
+
+
+class _SplicingEncoder(DjangoJSONEncoder):
+    """
+    Encodes the RawJSON values as placeholder strings, replaced by their JSON once the whole
+    representation is encoded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nonce = uuid4().hex
+        self.raw = []
+
+    def default(self, value):
+        if isinstance(value, RawJSON):
+            self.raw.append(value.encoded)
+            return f"{self.nonce}:{len(self.raw) - 1}"
+        return super().default(value)
+
+    def splice(self, encoded):
+        if not self.raw:
+            return encoded
+        # A single pass, so that the spliced JSON is not searched for placeholders
+        return re.sub(f'"{self.nonce}:(\\d+)"', lambda match: self.raw[int(match[1])], encoded)
+
+
+class JSONRenderer(Renderer):
+    media_type = 'application/json'
+
+    def render(self, data, xml=None):
+        encoder = _SplicingEncoder()
+        return encoder.splice(encoder.encode(data)).encode()
+
+
+class XMLRenderer(Renderer):
+    """
+    Renders the XML given by the view, Django's serialization of the models shown, when there is one,
+    and a generic XML document of the data otherwise.
+    """
+    media_type = 'application/xml'
+
+    def render(self, data, xml=None):
+        if xml is not None:
+            return xml().encode()
+
+        stream = StringIO()
+        generator = SimplerXMLGenerator(stream, 'utf-8')
+        generator.startDocument()
+        self.write_element(generator, 'response', data)
+        generator.endDocument()
+        return stream.getvalue().encode()
+
+    def write_element(self, generator, name, value):
+        if isinstance(value, RawJSON):
+            value = value.decode()
+        generator.startElement(name, {})
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self.write_element(generator, str(key), item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self.write_element(generator, 'item', item)
+        elif value is not None:
+            generator.characters(value if isinstance(value, str) else json.dumps(value, cls=DjangoJSONEncoder))
+        generator.endElement(name)
+
+
+class MessagePackRenderer(Renderer):
+    """
+    MessagePack, with the msgpack package if it is installed, and a pure-Python encoder otherwise.
+    """
+    media_type = 'application/msgpack'
+
+    def render(self, data, xml=None):
+        if msgpack is not None:
+            return msgpack.packb(data, default=_default)
+        return binary.packb(data, default=_default)
+
+
+class CBORRenderer(Renderer):
+    """
+    CBOR, with the cbor2 package if it is installed, and a pure-Python encoder otherwise.
+    """
+    media_type = 'application/cbor'
+
+    def render(self, data, xml=None):
+        if cbor2 is not None:
+            return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(_default(value)))
+        return binary.cbor_dumps(data, default=_default)
+
+
+# Renderers by media type, the first one being the default
+RENDERERS = {}
+
+
+def register_renderer(renderer, aliases=()):
+    """
+    Add a renderer to the registry, for its media type and the given alias media types.
+    """
+    for media_type in (renderer.media_type, *aliases):
+        RENDERERS[media_type] = renderer
+
+
+register_renderer(JSONRenderer())
+register_renderer(XMLRenderer(), aliases=('text/xml',))
+register_renderer(MessagePackRenderer(), aliases=('application/x-msgpack', 'application/vnd.msgpack'))
+register_renderer(CBORRenderer())
+
+
+def select_renderer(request):
+    """
+    Return the renderer of the format the Accept header of a request prefers, JSON if it accepts none.
+    """
+    media_types = list(RENDERERS)
+    return RENDERERS[best_match(request.headers.get('Accept', ''), media_types, default=media_types[0])]
+
+
+def render_response(request, data, xml=None, status=200):
+    """
+    Return a response with data rendered in the format the request asks for.
+
+    xml is an optional function returning the XML of the response (e.g. the serialization of the models
+    it shows), only called when XML is asked for.
+    """
+    renderer = select_renderer(request)
+    with timed_serialization():
+        content = renderer.render(data, xml)
+    response = HttpResponse(content, content_type=renderer.content_type, status=status)
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -0,0 +1,152 @@
+"""
+Full-text search over the titles and descriptions of the films.
+
+On SQLite, the films are indexed in an FTS5 virtual table kept in sync with the Film table by the
+signal handlers of films.signals, and searches are ranked with bm25. Other databases fall back to
+substring matching.
+"""
+import re
+from django.db import connection
+from django.db.models import F, Lookup, Q
+from films.models.FilmSearchEntry import FilmSearchEntry
+
+SEARCH_TABLE = FilmSearchEntry._meta.db_table
+
+# Fields of the films held by the full-text index
+INDEXED_FIELDS = ('name', 'description')
+
+
+def is_available(using=None):
+    """
+    Return whether the full-text index can be used on the given connection.
+    """
+    return (using or connection).vendor == 'sqlite'
+
+
+def create_index(using=None):
+    """
+    Create the full-text index table and fill it with the existing films.
+    """
+    with (using or connection).cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}(rowid, name, description) SELECT id, name, description FROM films_film")
+
+
+def drop_index(using=None):
+    """
+    Drop the full-text index table.
+    """
+    with (using or connection).cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_index():
+    """
+    Rebuild the full-text index from the Film table.
+    """
+    if is_available():
+        create_index()
+
+
+def index_films(films):
+    """
+    Add the given films to the full-text index, replacing their previous entry if any.
+    """
+    if not is_available():
+        return
+    rows = [(film.id, film.name, film.description) for film in films]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {SEARCH_TABLE}(rowid, name, description) VALUES (%s, %s, %s)", rows)
+
+
+def index_film_range(first_id, last_id):
+    """
+    Add the films whose id is between first_id and last_id, which must not be indexed yet, to the
+    full-text index.
+    """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, name, description) "
+            f"SELECT id, name, description FROM films_film WHERE id BETWEEN %s AND %s",
+            [first_id, last_id],
+        )
+
+
+def unindex_films(film_ids):
+    """
+    Remove the films with the given ids from the full-text index.
+    """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(film_id,) for film_id in film_ids])
+
+
+class Match(Lookup):
+    """
+    The FTS5 MATCH of the full-text index table joined to a query, on its rank column (rank__match):
+    the matching rows are read from the index once, with their rank.
+    """
+    lookup_name = 'match'
+    # The right-hand side is a MATCH expression, not a rank
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        rhs, params = self.process_rhs(compiler, connection)
+        return f"{compiler.quote_name_unless_alias(self.lhs.alias)} MATCH {rhs}", params
+
+
+FilmSearchEntry._meta.get_field('rank').register_lookup(Match)
+
+
+def _match_terms(query, column=None):
+    """
+    Turn a user query into FTS5 prefix terms, optionally restricted to a column.
+    """
+    prefix = f"{column} : " if column else ""
+    return [f'{prefix}"{term}"*' for term in re.findall(r'\w+', query)]
+
+
+def match_expression(q=None, title=None, description=None):
+    """
+    Build the FTS5 MATCH expression of a search, or None when the queries hold no searchable word.
+    """
+    terms = []
+    if q:
+        terms += _match_terms(q)
+    if title:
+        terms += _match_terms(title, 'name')
+    if description:
+        terms += _match_terms(description, 'description')
+    return " AND ".join(terms) or None
+
+
+def search_films(films, q=None, title=None, description=None):
+    """
+    Filter a films queryset on a free text query and/or on its title and description.
+
+    With the full-text index, the films are ordered by relevance (then by id); the relevance is available
+    as the search_rank attribute of each film, lower being better.
+    """
+    expression = match_expression(q, title, description) if is_available() else None
+
+    if expression is None:
+        # Substring matching, when the full-text index is unavailable or the queries hold no word
+        if q:
+            films = films.filter(Q(name__icontains=q) | Q(description__icontains=q))
+        if title:
+            films = films.filter(name__icontains=title)
+        if description:
+            films = films.filter(description__icontains=description)
+        return films
+
+    # The matching films, joined to their entry in the index and ordered by its bm25 rank
+    return (films.filter(search_entry__rank__match=expression)
+            .annotate(search_rank=F('search_entry__rank')).order_by('search_rank', 'id'))
@@ -0,0 +1,115 @@
+"""
+Generation of fake films, for development, staging and benchmark catalogues.
+
+Faker and the ORM are too slow to be used for each of a million films: the names and descriptions are
+drawn from pools generated once by Faker, the rest of the values from a seeded random generator (so
+that the same seed always produces the same catalogue), and the rows are inserted in batches with
+executemany. The derived data (full-text index, response cache) is refreshed once by the films_seeded
+signal instead of per film.
+"""
+import datetime
+import random
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from films.models.Category import Category
+from films.models.Film import Film
+from films.signals import films_seeded
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Number of distinct names and descriptions generated by Faker
+POOL_SIZE = 2000
+
+# Last publication date of the fake films: fixed, so that a seed produces the same catalogue any day
+REFERENCE_DATE = datetime.date(2024, 1, 1)
+
+
+class FilmFactory:
+    """
+    Generator of the rows of fake films, as generated by the 0002_auto_populate_data migration.
+    """
+
+    def __init__(self, seed=None, pool_size=POOL_SIZE):
+        self.random = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.names = [fake.name() for _ in range(pool_size)]
+        self.descriptions = [fake.text(max_nb_chars=200) for _ in range(pool_size)]
+        # Publication dates within the 30 years before the reference date, ready to be inserted
+        last_day = REFERENCE_DATE.toordinal()
+        self.dates = [
+            connection.ops.adapt_datefield_value(datetime.date.fromordinal(day))
+            for day in range(last_day - 30 * 365, last_day + 1)
+        ]
+
+    def film_rows(self, film_ids, updated_at):
+        """
+        Return the rows of fake films with the given ids: id, name, description, publication_date, note
+        and updated_at.
+        """
+        count = len(film_ids)
+        return zip(
+            film_ids,
+            self.random.choices(self.names, k=count),
+            self.random.choices(self.descriptions, k=count),
+            self.random.choices(self.dates, k=count),
+            self.random.choices(range(6), k=count),
+            [updated_at] * count,
+        )
+
+    def category_links(self, film_ids, category_ids):
+        """
+        Return the (film id, category id) pairs linking each film to 1 to 4 random categories.
+        """
+        sizes = self.random.choices(range(1, min(4, len(category_ids)) + 1), k=len(film_ids))
+        return [
+            (film_id, category_id)
+            for film_id, size in zip(film_ids, sizes) for category_id in self.random.sample(category_ids, size)
+        ]
+
+
+def insert_sql(model, fields):
+    columns = [model._meta.get_field(field).column for field in fields]
+    return "INSERT INTO %s (%s) VALUES (%s)" % (
+        connection.ops.quote_name(model._meta.db_table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+
+
+def seed_films(count, batch_size=DEFAULT_BATCH_SIZE, seed=None, progress=None):
+    """
+    Create count fake films with 1 to 4 random categories each, as the data migrations do, and return
+    the number of films created.
+
+    The films and their category links are inserted by batches of batch_size films, in a single
+    transaction. progress, if given, is called with the number of films created after each batch.
+    """
+    factory = FilmFactory(seed)
+    category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+    Through = Film.categories.through
+    film_sql = insert_sql(Film, ['id', 'name', 'description', 'publication_date', 'note', 'updated_at'])
+    link_sql = insert_sql(Through, ['film', 'category'])
+    updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # The ids are assigned here, so that the category links need not read them back
+        first_id = (Film.objects.aggregate(last_id=Max('id'))['last_id'] or 0) + 1
+        created = 0
+        while created < count:
+            film_ids = range(first_id + created, first_id + min(count, created + batch_size))
+            cursor.executemany(film_sql, factory.film_rows(film_ids, updated_at))
+            if category_ids:
+                cursor.executemany(link_sql, factory.category_links(film_ids, category_ids))
+            created += len(film_ids)
+            if progress:
+                progress(created)
+
+        if created:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Film]):
+                cursor.execute(sql)
+            films_seeded.send(sender=Film, first_id=first_id, last_id=first_id + created - 1)
+    return created
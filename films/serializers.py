@@ -0,0 +1,126 @@
+"""
+Shared serialization helpers for film resources.
+"""
+from django.db.models import Prefetch
+from films.links import url_template
+from films.models.Category import Category
+
+
+def with_categories(films):
+    """
+    Prefetch the categories of the given films queryset.
+
+    The categories of every film evaluated from the returned queryset are loaded with a single
+    extra query, whatever the number of films.
+    """
+    return films.prefetch_related(Prefetch('categories', queryset=Category.objects.order_by('id')))
+
+
+def serialize_categories(categories):
+    """
+    Serialize categories to a list of dicts.
+    """
+    return [{"id": category.id, "name": category.name} for category in categories]
+
+
+# Fields of a film, and resources embedded in its representation, that the fields and include query
+# parameters can select
+FILM_LIST_FIELDS = ('id', 'name', 'description', 'publication_date', 'note')
+FILM_LIST_INCLUDES = ('categories', 'links')
+
+
+class InvalidFieldset(ValueError):
+    """
+    Raised when the fields or include query parameter of a request names an unknown field.
+    """
+
+
+def _parse_names(value, allowed, parameter):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise InvalidFieldset(f"Unknown {parameter}: {', '.join(unknown)} (expected: {', '.join(allowed)})")
+    # Keep the canonical order, without duplicates
+    return tuple(name for name in allowed if name in names)
+
+
+class FilmFieldset:
+    """
+    The fields and embedded resources of the films of a list response.
+
+    Only the selected fields are read from the database, and the categories are only prefetched, and
+    the hypermedia links only built, when they are included.
+    """
+
+    def __init__(self, fields=FILM_LIST_FIELDS, include=FILM_LIST_INCLUDES):
+        self.fields = fields
+        self.include = include
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Build the fieldset asked for by the fields (default: all) and include (default: categories and
+        links, none if empty) query parameters of a request.
+        """
+        fields = _parse_names(request.GET.get('fields', ''), FILM_LIST_FIELDS, "field") or FILM_LIST_FIELDS
+        include = request.GET.get('include')
+        include = FILM_LIST_INCLUDES if include is None else _parse_names(include, FILM_LIST_INCLUDES, "include")
+        return cls(fields, include)
+
+    def queryset(self, films):
+        """
+        Narrow a films queryset to the fields and embedded resources of the fieldset.
+        """
+        if self.fields != FILM_LIST_FIELDS:
+            films = films.only(*self.fields)
+        if 'categories' in self.include:
+            films = with_categories(films)
+        return films
+
+    def xml_fields(self):
+        """
+        Return the fields option of the XML serializer, None for all the fields.
+        """
+        if self.fields == FILM_LIST_FIELDS and 'categories' in self.include:
+            return None
+        fields = [field for field in self.fields if field != 'id']
+        return fields + ['categories'] if 'categories' in self.include else fields
+
+
+DEFAULT_FIELDSET = FilmFieldset()
+
+
+def serialize_film(film, fieldset=DEFAULT_FIELDSET):
+    """
+    Serialize a film to a dict, without hypermedia links.
+    """
+    film_data = {}
+    for field in fieldset.fields:
+        if field == 'publication_date':
+            film_data[field] = film.publication_date.strftime("%Y-%m-%d")
+        else:
+            film_data[field] = getattr(film, field)
+    if 'categories' in fieldset.include:
+        film_data["categories"] = serialize_categories(film.categories.all())
+    return film_data
+
+
+def serialize_film_list(films, fieldset=DEFAULT_FIELDSET):
+    """
+    Serialize a list of films (e.g. a page) to a list of dicts with their hypermedia links.
+    """
+    film_link = url_template('get_film', 'film_id')
+    categories_link = url_template('get_categories_of_film', 'film_id')
+
+    films_data = []
+    for film in films:
+        film_data = serialize_film(film, fieldset)
+
+        # Construct hypermedia links
+        if 'links' in fieldset.include:
+            film_data["links"] = {
+                "film_link": {"href": film_link.format(film_id=film.id)},
+                "categories_link": {"href": categories_link.format(film_id=film.id)}
+            }
+        films_data.append(film_data)
+    return films_data
@@ -0,0 +1,299 @@
+"""
+Signal handlers keeping the derived data of the films in sync with the Film and Category tables.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from films import cache, categories, conditional, documents, search, stats
+from films.models.Category import Category
+from films.models.Film import Film
+from films.serializers import FILM_LIST_FIELDS
+
+# Sent by the bulk endpoints, which bypass the post_save signal, with the list of the films they
+# created or updated (argument: films)
+films_bulk_saved = Signal()
+
+# Sent by the bulk delete endpoint, which bypasses the post_delete signal, with the ids of the films it
+# deleted (argument: film_ids)
+films_bulk_deleted = Signal()
+
+# Sent by films.seeding, which inserts films with raw SQL, with the range of the ids of the films it
+# created (arguments: first_id, last_id)
+films_seeded = Signal()
+
+
+def saves_any(update_fields, fields):
+    """
+    Return whether a save with the given update_fields (None when all the fields are saved) writes
+    one of fields.
+    """
+    return update_fields is None or not update_fields.isdisjoint(fields)
+
+
+@receiver(post_save, sender=Film)
+def index_saved_film(sender, instance, update_fields, **kwargs):
+    """
+    Update the full-text index entry of a saved film.
+    """
+    if saves_any(update_fields, search.INDEXED_FIELDS):
+        search.index_films([instance])
+
+
+@receiver(films_bulk_saved, sender=Film)
+def index_bulk_saved_films(sender, films, **kwargs):
+    """
+    Update the full-text index entries of films saved in bulk.
+    """
+    search.index_films(films)
+
+
+@receiver(films_seeded, sender=Film)
+def index_seeded_films(sender, first_id, last_id, **kwargs):
+    """
+    Add seeded films to the full-text index.
+    """
+    search.index_film_range(first_id, last_id)
+
+
+@receiver(post_delete, sender=Film)
+def unindex_deleted_film(sender, instance, **kwargs):
+    """
+    Remove a deleted film from the full-text index.
+    """
+    search.unindex_films([instance.id])
+
+
+@receiver(films_bulk_deleted, sender=Film)
+def unindex_bulk_deleted_films(sender, film_ids, **kwargs):
+    """
+    Remove films deleted in bulk from the full-text index.
+    """
+    search.unindex_films(film_ids)
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def invalidate_film_responses(sender, instance, **kwargs):
+    """
+    Invalidate the cached responses showing a saved or deleted film.
+    """
+    cache.invalidate(cache.film_version(instance.id), cache.FILM_LIST_VERSION)
+
+
+@receiver(films_bulk_saved, sender=Film)
+def invalidate_bulk_saved_film_responses(sender, films, **kwargs):
+    """
+    Invalidate the cached responses showing films saved in bulk.
+    """
+    cache.invalidate(*[cache.film_version(film.id) for film in films], cache.FILM_LIST_VERSION)
+
+
+@receiver(films_bulk_deleted, sender=Film)
+def invalidate_bulk_deleted_film_responses(sender, film_ids, **kwargs):
+    """
+    Invalidate the cached responses showing films deleted in bulk.
+    """
+    cache.invalidate(*[cache.film_version(film_id) for film_id in film_ids], cache.FILM_LIST_VERSION)
+
+
+@receiver(films_seeded, sender=Film)
+def invalidate_seeded_film_responses(sender, **kwargs):
+    """
+    Invalidate the cached responses of the film lists, which seeded films join.
+    """
+    cache.invalidate(cache.FILM_LIST_VERSION)
+
+
+def recategorized_film_ids(instance, action, reverse, pk_set):
+    """
+    Return the ids of the films whose categories changed, given the arguments of an m2m_changed signal
+    of Film.categories sent after the change.
+    """
+    if not reverse:
+        return [instance.id]
+    if action == 'post_clear':
+        return instance.__dict__.get('_cleared_film_ids', [])
+    return pk_set or []
+
+
+@receiver(m2m_changed, sender=Film.categories.through)
+def touch_recategorized_films(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the modification date of the films whose categories changed.
+    """
+    if action == 'pre_clear' and reverse:
+        # Remember the films of the category, which are unknown once it is cleared
+        instance._cleared_film_ids = list(instance.film_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear') or (action != 'post_clear' and not pk_set):
+        return
+
+    now = timezone.now()
+    if not reverse:
+        instance.updated_at = now
+    Film.objects.filter(id__in=recategorized_film_ids(instance, action, reverse, pk_set)).update(updated_at=now)
+
+
+@receiver(m2m_changed, sender=Film.categories.through)
+def invalidate_film_categories_responses(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidate the cached responses showing films whose categories changed.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        cache.invalidate(cache.film_version(instance.id), cache.FILM_LIST_VERSION)
+    elif pk_set:
+        cache.invalidate(*[cache.film_version(film_id) for film_id in pk_set], cache.FILM_LIST_VERSION)
+    else:
+        # The films of a category were cleared: every film may be affected
+        cache.invalidate(cache.CATEGORIES_VERSION, cache.FILM_LIST_VERSION)
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+@receiver(films_bulk_saved, sender=Film)
+@receiver(films_bulk_deleted, sender=Film)
+@receiver(films_seeded, sender=Film)
+def bump_film_list_version(sender, **kwargs):
+    """
+    Change the validators of the film lists when films are saved, deleted or seeded.
+    """
+    conditional.bump_film_list_version()
+
+
+@receiver(m2m_changed, sender=Film.categories.through)
+def bump_film_list_version_of_recategorized_films(sender, action, **kwargs):
+    """
+    Change the validators of the film lists when the categories of films change.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        conditional.bump_film_list_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    """
+    Invalidate the cached responses showing categories.
+    """
+    cache.invalidate(cache.CATEGORIES_VERSION)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, instance, **kwargs):
+    """
+    Make the category registries of all the workers load the categories again.
+    """
+    categories.bump_version()
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def count_saved_film(sender, instance, update_fields=None, **kwargs):
+    """
+    Update the statistics with a saved or deleted film.
+    """
+    if saves_any(update_fields, stats.COUNTED_FIELDS):
+        stats.refresh_films([instance.id])
+
+
+@receiver(films_bulk_saved, sender=Film)
+def count_bulk_saved_films(sender, films, **kwargs):
+    """
+    Update the statistics with films saved in bulk.
+    """
+    stats.refresh_films([film.id for film in films])
+
+
+@receiver(films_bulk_deleted, sender=Film)
+def count_bulk_deleted_films(sender, film_ids, **kwargs):
+    """
+    Subtract films deleted in bulk from the statistics.
+    """
+    stats.refresh_films(film_ids)
+
+
+@receiver(films_seeded, sender=Film)
+def count_seeded_films(sender, first_id, last_id, **kwargs):
+    """
+    Add seeded films to the statistics.
+    """
+    stats.refresh_film_range(first_id, last_id)
+
+
+@receiver(m2m_changed, sender=Film.categories.through)
+def count_recategorized_films(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the statistics with the films whose categories changed.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        stats.refresh_films(recategorized_film_ids(instance, action, reverse, pk_set))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_films_of_deleted_category(sender, instance, **kwargs):
+    # Its links to the films are deleted with it, without m2m_changed signal
+    instance._deleted_film_ids = list(instance.film_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def count_films_of_deleted_category(sender, instance, **kwargs):
+    """
+    Update the statistics with the films of a deleted category.
+    """
+    stats.refresh_films(instance.__dict__.get('_deleted_film_ids', []))
+
+
+# The documents embed the names of the categories, read from the category registry: their handlers
+# are connected after bump_category_version, which refreshes it
+
+@receiver(post_save, sender=Film)
+def render_saved_film(sender, instance, update_fields, **kwargs):
+    """
+    Render the document of a saved film.
+    """
+    if saves_any(update_fields, FILM_LIST_FIELDS):
+        documents.refresh_films([instance.id])
+
+
+@receiver(films_bulk_saved, sender=Film)
+def render_bulk_saved_films(sender, films, **kwargs):
+    """
+    Render the documents of films saved in bulk.
+    """
+    documents.refresh_films([film.id for film in films])
+
+
+@receiver(films_seeded, sender=Film)
+def render_seeded_films(sender, first_id, last_id, **kwargs):
+    """
+    Render the documents of seeded films.
+    """
+    documents.refresh_film_range(first_id, last_id)
+
+
+@receiver(m2m_changed, sender=Film.categories.through)
+def render_recategorized_films(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Render the documents of the films whose categories changed.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        documents.refresh_films(recategorized_film_ids(instance, action, reverse, pk_set))
+
+
+@receiver(post_save, sender=Category)
+def render_films_of_saved_category(sender, instance, created, **kwargs):
+    """
+    Render the documents of the films of a renamed category.
+    """
+    if not created:
+        documents.refresh_films(instance.film_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def render_films_of_deleted_category(sender, instance, **kwargs):
+    """
+    Render the documents of the films of a deleted category.
+    """
+    documents.refresh_films(instance.__dict__.get('_deleted_film_ids', []))
@@ -0,0 +1,226 @@
+"""
+Catalogue statistics: number of films and average note, per category and per year of publication.
+
+They are read from the CategoryStats and YearStats summary tables, so that they cost O(categories +
+years) rows whatever the size of the catalogue. The signal handlers of films.signals keep the tables
+up to date incrementally: refresh_films() compares the films that changed with their FilmStatsEntry,
+the record of what they were counted as, and applies the difference to the counters.
+"""
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear
+from django.http import QueryDict
+from films.links import link, query_link
+from films.models.Category import Category
+from films.models.CategoryStats import CategoryStats
+from films.models.Film import Film
+from films.models.FilmStatsEntry import FilmStatsEntry
+from films.models.YearStats import YearStats
+
+# Fields of the films the statistics depend on, besides their categories
+COUNTED_FIELDS = ('publication_date', 'note')
+
+# Number of films refreshed at a time
+REFRESH_CHUNK_SIZE = 2000
+
+
+def film_entries(film_ids):
+    """
+    Return the FilmStatsEntry of the existing films among film_ids, as they should be, by film id.
+    """
+    categories = defaultdict(list)
+    links = Film.categories.through.objects.filter(film_id__in=film_ids).order_by('film_id', 'category_id')
+    for film_id, category_id in links.values_list('film_id', 'category_id'):
+        categories[film_id].append(str(category_id))
+
+    return {
+        film_id: FilmStatsEntry(film_id=film_id, year=publication_date.year, note=note,
+                                category_ids=",".join(categories[film_id]))
+        for film_id, publication_date, note in
+        Film.objects.filter(id__in=film_ids).values_list('id', 'publication_date', 'note')
+    }
+
+
+def _same(entry, other):
+    if entry is None or other is None:
+        return entry is other
+    return (entry.year, entry.note, entry.category_ids) == (other.year, other.note, other.category_ids)
+
+
+def _count(deltas, entry, sign):
+    """
+    Add (or subtract, with sign -1) what a film counts for to the deltas of the summary rows.
+    """
+    keys = [(YearStats, entry.year)]
+    keys += [(CategoryStats, int(category_id)) for category_id in entry.category_ids.split(',') if category_id]
+    for key in keys:
+        counts = deltas[key]
+        counts[0] += sign
+        if entry.note is not None:
+            counts[1] += sign
+            counts[2] += sign * entry.note
+
+
+def _apply(deltas):
+    """
+    Apply deltas of film count, note count and note sum to the summary rows, creating the missing ones.
+    """
+    deltas = {key: counts for key, counts in deltas.items() if any(counts)}
+    for model in (CategoryStats, YearStats):
+        # Rows only appear with films, and are created empty before being updated like the others
+        model.objects.bulk_create([model(pk=pk) for (row_model, pk), counts in deltas.items()
+                                   if row_model is model and counts[0] > 0], ignore_conflicts=True)
+
+    for (model, pk), (film_count, note_count, note_sum) in deltas.items():
+        model.objects.filter(pk=pk).update(
+            film_count=F('film_count') + film_count,
+            note_count=F('note_count') + note_count,
+            note_sum=F('note_sum') + note_sum,
+        )
+
+
+def _refresh_chunk(film_ids):
+    previous = FilmStatsEntry.objects.in_bulk(film_ids)
+    current = film_entries(film_ids)
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    changed = []
+    for film_id in film_ids:
+        if _same(previous.get(film_id), current.get(film_id)):
+            continue
+        if film_id in previous:
+            _count(deltas, previous[film_id], -1)
+        if film_id in current:
+            _count(deltas, current[film_id], 1)
+        changed.append(film_id)
+
+    if changed:
+        with transaction.atomic():
+            FilmStatsEntry.objects.filter(film_id__in=changed).delete()
+            FilmStatsEntry.objects.bulk_create([current[film_id] for film_id in changed if film_id in current])
+            _apply(deltas)
+
+
+def refresh_films(film_ids):
+    """
+    Bring the statistics up to date with the given films, whether they were created, changed,
+    recategorized or deleted.
+    """
+    film_ids = sorted(set(film_ids))
+    for start in range(0, len(film_ids), REFRESH_CHUNK_SIZE):
+        _refresh_chunk(film_ids[start:start + REFRESH_CHUNK_SIZE])
+
+
+def _add_range_entries_sql():
+    # The FilmStatsEntry of a range of films, as film_entries() builds them, computed by SQLite
+    entry, film, links = FilmStatsEntry._meta.db_table, Film._meta.db_table, Film.categories.through._meta.db_table
+    return (
+        f"INSERT INTO {entry} (film_id, year, note, category_ids) "
+        f"SELECT film.id, CAST(strftime('%%Y', film.publication_date) AS INTEGER), film.note, "
+        f"COALESCE((SELECT group_concat(category_id, ',') FROM ("
+        f"SELECT category_id FROM {links} WHERE film_id = film.id ORDER BY category_id)), '') "
+        f"FROM {film} film WHERE film.id BETWEEN %s AND %s"
+    )
+
+
+def refresh_film_range(first_id, last_id):
+    """
+    Add the films whose id is between first_id and last_id, which are not counted yet (e.g. seeded
+    films), to the statistics.
+
+    The counts are added per year and per category with grouped queries, and on SQLite the
+    FilmStatsEntry are inserted with a single INSERT ... SELECT, rather than film by film.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(_add_range_entries_sql(), [first_id, last_id])
+        else:
+            for start in range(first_id, last_id + 1, REFRESH_CHUNK_SIZE):
+                entries = film_entries(range(start, min(start + REFRESH_CHUNK_SIZE, last_id + 1)))
+                FilmStatsEntry.objects.bulk_create(entries.values())
+
+        deltas = {}
+        films = Film.objects.filter(id__range=(first_id, last_id)).order_by()
+        for row in films.values(year=ExtractYear('publication_date')).annotate(
+                film_count=Count('id'), note_count=Count('note'), note_sum=Sum('note')):
+            deltas[YearStats, row['year']] = [row['film_count'], row['note_count'], row['note_sum'] or 0]
+        links = Film.categories.through.objects.filter(film_id__gte=first_id, film_id__lte=last_id).order_by()
+        for row in links.values('category_id').annotate(
+                film_count=Count('film_id'), note_count=Count('film__note'), note_sum=Sum('film__note')):
+            deltas[CategoryStats, row['category_id']] = [row['film_count'], row['note_count'], row['note_sum'] or 0]
+        _apply(deltas)
+
+
+def rebuild_stats():
+    """
+    Recompute the statistics of all the films from scratch, and return the number of films.
+    """
+    with transaction.atomic():
+        FilmStatsEntry.objects.all().delete()
+        CategoryStats.objects.all().delete()
+        YearStats.objects.all().delete()
+
+        count, last_id = 0, 0
+        while True:
+            film_ids = list(Film.objects.filter(id__gt=last_id).values_list('id', flat=True)[:REFRESH_CHUNK_SIZE])
+            if not film_ids:
+                return count
+            refresh_films(film_ids)
+            count += len(film_ids)
+            last_id = film_ids[-1]
+
+
+def _summary(row):
+    """
+    Return the number of films and the average note of a summary row.
+    """
+    return {
+        "film_count": row.film_count if row else 0,
+        "average_note": round(row.note_sum / row.note_count, 2) if row and row.note_count else None,
+    }
+
+
+def category_stats():
+    """
+    Return the statistics of every category.
+    """
+    return [
+        {"id": category.id, "name": category.name, **_summary(getattr(category, 'stats', None)),
+         "links": {"films": {"href": link('category-films', category_id=category.id)}}}
+        for category in Category.objects.select_related('stats').order_by('id')
+    ]
+
+
+def year_rows():
+    return list(YearStats.objects.filter(film_count__gt=0).order_by('year'))
+
+
+def year_stats(rows):
+    """
+    Return the statistics of the years of the given YearStats rows.
+    """
+    return [
+        {"year": row.year, **_summary(row),
+         "links": {"films": {"href": query_link(link('film-list'), QueryDict(),
+                                                published_after=f"{row.year:04d}-01-01",
+                                                published_before=f"{row.year:04d}-12-31")}}}
+        for row in rows
+    ]
+
+
+def catalogue_stats():
+    """
+    Return the statistics of the whole catalogue, and per category and per year.
+    """
+    rows = year_rows()
+    # Every film is published in a single year: the totals are the sums of the years
+    total = YearStats(film_count=sum(row.film_count for row in rows),
+                      note_count=sum(row.note_count for row in rows),
+                      note_sum=sum(row.note_sum for row in rows))
+    return {
+        "films": _summary(total),
+        "categories": category_stats(),
+        "years": year_stats(rows),
+    }
@@ -0,0 +1,195 @@
+"""
+Streaming serialization of large lists, for exports of whole categories or of the full catalogue.
+
+The rows are read from the database in chunks with queryset.iterator(), and each chunk is serialized
+and sent before the next one is read, so memory use stays constant and the first bytes are sent
+right away.
+"""
+import json
+from django.conf import settings
+from django.core.serializers import serialize
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.xml_serializer import Serializer as XMLSerializer
+from django.http import StreamingHttpResponse
+from django.utils.xmlutils import SimplerXMLGenerator
+from films.renderers import best_match, explicitly_accepts
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Number of rows read from the database (and serialized) at a time, unless overridden by the
+# FILMS_STREAM_CHUNK_SIZE setting
+DEFAULT_STREAM_CHUNK_SIZE = 500
+
+
+class XMLFragmentSerializer(XMLSerializer):
+    """
+    XML serializer writing the objects only, without the XML declaration and the django-objects root element.
+    """
+
+    def start_serialization(self):
+        self.xml = SimplerXMLGenerator(self.stream, self.options.get("encoding", settings.DEFAULT_CHARSET))
+
+    def end_serialization(self):
+        pass
+
+
+def wants_stream(request):
+    """
+    Return whether the client asked for the whole list to be streamed, with the stream parameter
+    or by accepting NDJSON.
+    """
+    return (explicitly_accepts(request.headers.get('Accept', ''), NDJSON_CONTENT_TYPE)
+            or request.GET.get('stream') in ('1', 'true'))
+
+
+def iterate_chunks(queryset, chunk_size=None):
+    """
+    Iterate over the objects of a queryset by lists of at most chunk_size objects.
+    """
+    chunk_size = chunk_size or getattr(settings, 'FILMS_STREAM_CHUNK_SIZE', DEFAULT_STREAM_CHUNK_SIZE)
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def aiterate_chunks(queryset, chunk_size=None):
+    """
+    Async counterpart of iterate_chunks(), reading the objects with queryset.aiterator().
+    """
+    chunk_size = chunk_size or getattr(settings, 'FILMS_STREAM_CHUNK_SIZE', DEFAULT_STREAM_CHUNK_SIZE)
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+
+    chunk = []
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class StreamFormat:
+    """
+    How a stream is written: its content type, the text opening and closing it, and how each chunk of
+    objects is encoded and separated from the previous one.
+    """
+
+    def __init__(self, content_type, encode_chunk, opening="", closing="", separator=""):
+        self.content_type = content_type
+        self.encode_chunk = encode_chunk
+        self.opening = opening
+        self.closing = closing
+        self.separator = separator
+
+    def content(self, queryset, chunk_size=None):
+        yield self.opening
+        separator = ""
+        for chunk in iterate_chunks(queryset, chunk_size):
+            yield separator + self.encode_chunk(chunk)
+            separator = self.separator
+        yield self.closing
+
+    async def acontent(self, queryset, chunk_size=None):
+        yield self.opening
+        separator = ""
+        async for chunk in aiterate_chunks(queryset, chunk_size):
+            yield separator + self.encode_chunk(chunk)
+            separator = self.separator
+        yield self.closing
+
+
+def xml_format(fields=None):
+    """
+    Format of serialize('xml', queryset, fields=fields).
+    """
+    # Reuse the XML declaration and root element of the regular serializer
+    opening, closing = serialize('xml', []).split('</django-objects>')
+    return StreamFormat('application/xml', lambda chunk: XMLFragmentSerializer().serialize(chunk, fields=fields),
+                        opening=opening, closing='</django-objects>' + closing)
+
+
+def ndjson_format(serialize_chunk):
+    """
+    Newline delimited JSON, one object per line.
+
+    serialize_chunk turns a list of objects into a list of JSON serializable dicts.
+    """
+    def encode_chunk(chunk):
+        return "".join(json.dumps(data, cls=DjangoJSONEncoder) + "\n" for data in serialize_chunk(chunk))
+
+    return StreamFormat(NDJSON_CONTENT_TYPE, encode_chunk)
+
+
+def json_format(serialize_chunk):
+    """
+    JSON document of the form {"results": [...]}.
+
+    serialize_chunk turns a list of objects into a list of JSON serializable dicts.
+    """
+    def encode_chunk(chunk):
+        return ", ".join(json.dumps(data, cls=DjangoJSONEncoder) for data in serialize_chunk(chunk))
+
+    return StreamFormat('application/json', encode_chunk, opening='{"results": [', closing=']}', separator=", ")
+
+
+def negotiate_format(request, serialize_chunk, xml_fields=None):
+    """
+    Return the stream format asked for by the Accept header of the request: XML (of the xml_fields
+    fields, all by default), NDJSON or JSON.
+    """
+    media_type = best_match(request.headers.get('Accept', ''),
+                            ['application/json', NDJSON_CONTENT_TYPE, 'application/xml'], default='application/json')
+
+    if media_type == 'application/xml':
+        return xml_format(xml_fields)
+    elif media_type == NDJSON_CONTENT_TYPE:
+        return ndjson_format(serialize_chunk)
+    else:
+        return json_format(serialize_chunk)
+
+
+def stream_xml(queryset, chunk_size=None, fields=None):
+    """
+    Stream a queryset in the format of serialize('xml', queryset, fields=fields).
+    """
+    stream_format = xml_format(fields)
+    return StreamingHttpResponse(stream_format.content(queryset, chunk_size),
+                                 content_type=stream_format.content_type, status=200)
+
+
+def astream_xml(queryset, chunk_size=None, fields=None):
+    """
+    Async counterpart of stream_xml(), for async views.
+    """
+    stream_format = xml_format(fields)
+    return StreamingHttpResponse(stream_format.acontent(queryset, chunk_size),
+                                 content_type=stream_format.content_type, status=200)
+
+
+def stream_response(request, queryset, serialize_chunk, chunk_size=None, xml_fields=None):
+    """
+    Stream a queryset in the format asked for by the Accept header of the request.
+    """
+    stream_format = negotiate_format(request, serialize_chunk, xml_fields)
+    return StreamingHttpResponse(stream_format.content(queryset, chunk_size),
+                                 content_type=stream_format.content_type, status=200)
+
+
+def astream_response(request, queryset, serialize_chunk, chunk_size=None, xml_fields=None):
+    """
+    Async counterpart of stream_response(), for async views: the response is streamed from an
+    asynchronous iterator, without a thread per chunk.
+    """
+    stream_format = negotiate_format(request, serialize_chunk, xml_fields)
+    return StreamingHttpResponse(stream_format.acontent(queryset, chunk_size),
+                                 content_type=stream_format.content_type, status=200)
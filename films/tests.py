@@ -1,3 +1,1870 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import random
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.core.serializers import serialize
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import OperationalError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from film_api_project import settings_production
+from films.benchmark import build_scenarios, missing_routes, run_benchmark
+from films import binary, links, search, stats, transfer
+from films.cache import get_cache
+from films.categories import get_registry, reset_registry
+from films.compression import GzipEncoding, negotiate_encoding
+from films.database import ReadReplicaMiddleware, ReadReplicaRouter, read_only_queries
+from films.instrumentation import REGISTRY, InstrumentationMiddleware
+from films.models.Category import Category
+from films.models.CategoryVersion import CategoryVersion
+from films.models.Film import Film
+from films.models.FilmDocument import FilmDocument
+from films.models.FilmStatsEntry import FilmStatsEntry
+from films.models.ImportCheckpoint import ImportCheckpoint
+from films.renderers import best_match, parse_accept
+from films.search import search_films
+from films.seeding import seed_films
+from films.serializers import serialize_film, with_categories
+from films.stats import rebuild_stats
+from films.throttling import (SWEEP_INTERVAL, MemoryStore, SQLiteStore, ThrottlingMiddleware, client_key, get_store,
+                              route_class)
 
-# Create your tests here.
+
+
+@override_settings(FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL=3600, FILMS_RATE_LIMITS=None,
+                   FILMS_MAX_EXPENSIVE_REQUESTS=None)
+class FilmsTestCase(TestCase):
+    """
+    Test case starting each test with an empty response cache and a freshly loaded category registry.
+
+    The registry is only checked against the database once an hour, so that the number of queries of
+    a request does not depend on the time the tests take. The requests are not throttled, except by
+    the tests of ThrottlingTest.
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        reset_registry()
+        get_registry()
+
+
+class FilmListQueriesTest(FilmsTestCase):
+    """
+    The list endpoints must cost the same number of queries whatever the page size.
+    """
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_film_list_queries_do_not_depend_on_page_size(self):
+        url = reverse('film-list')
+        self.assertEqual(self.count_queries(url, page_size=1), self.count_queries(url, page_size=50))
+
+    def test_category_film_list_queries_do_not_depend_on_page_size(self):
+        category = Category.objects.first()
+        url = reverse('category-films', args=[category.id])
+        self.assertEqual(self.count_queries(url, page_size=1), self.count_queries(url, page_size=50))
+
+    def test_film_detail_includes_categories(self):
+        film = Film.objects.filter(categories__isnull=False).first()
+        response = self.client.get(reverse('get_film', kwargs={'film_id': film.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [category["id"] for category in response.json()["categories"]],
+            sorted(film.categories.values_list('id', flat=True))
+        )
+
+
+class SparseFieldsetTest(FilmsTestCase):
+    """
+    The fields and include parameters narrow the film lists, and the queries behind them.
+    """
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query["sql"] for query in context.captured_queries]
+
+    def test_fields_narrow_the_query(self):
+        response, queries = self.get(reverse('film-list'), fields='id,name', include='')
+        self.assertEqual(set(response.json()["results"][0]), {"id", "name"})
+        # The page is read without the descriptions, and the categories are not prefetched
+        self.assertNotIn("description", queries[-1])
+        self.assertFalse([query for query in queries if "films_film_categories" in query])
+
+    def test_include_categories_without_links(self):
+        response, queries = self.get(reverse('film-list'), fields='name', include='categories')
+        film = response.json()["results"][0]
+        self.assertEqual(set(film), {"name", "categories"})
+        self.assertIn("films_film_categories", queries[-1])
+
+    def test_default_representation_is_unchanged(self):
+        response = self.client.get(reverse('film-list'))
+        self.assertEqual(set(response.json()["results"][0]),
+                         {"id", "name", "description", "publication_date", "note", "categories", "links"})
+
+    def test_cursor_pages_with_fields(self):
+        url = reverse('film-list')
+        response, queries = self.get(url, cursor='', ordering='-publication_date', fields='name', include='')
+        # The keyset of the last film is loaded with the page, not queried afterwards
+        self.assertIn("publication_date", queries[-1])
+        self.assertNotIn("description", queries[-1])
+        self.assertEqual(len(queries), len(self.get(url, cursor='', ordering='-publication_date', include='')[1]))
+        response = self.client.get(response.json()["pagination"]["next_page"])
+        self.assertEqual(set(response.json()["results"][0]), {"name"})
+
+    def test_category_films_and_xml(self):
+        category = Category.objects.first()
+        response, queries = self.get(reverse('category-films', args=[category.id]), fields='id,note', include='links')
+        self.assertEqual(set(response.json()["results"][0]), {"id", "note", "links"})
+
+        response = self.client.get(reverse('film-list'), {'fields': 'name', 'include': ''},
+                                   headers={'accept': 'application/xml'})
+        self.assertIn(b'<field name="name"', response.content)
+        self.assertNotIn(b'<field name="description"', response.content)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('film-list'), {'fields': 'id,budget'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("budget", response.json()["error"])
+
+
+class LinksTest(FilmsTestCase):
+    """
+    Hypermedia links are formatted into cached URL templates, with URL-encoded query parameters.
+    """
+
+    def test_links_match_reverse(self):
+        film = Film.objects.first()
+        self.assertEqual(links.link('get_film', film_id=film.id), reverse('get_film', kwargs={'film_id': film.id}))
+        self.assertEqual(links.link('category-films', category_id=3), reverse('category-films', args=[3]))
+        self.assertEqual(links.link('film-list'), reverse('film-list'))
+
+    def test_routes_are_reversed_once(self):
+        links._url_template.cache_clear()
+        with mock.patch('films.links.reverse', wraps=reverse) as spy:
+            self.client.get(reverse('film-list'), {'page_size': 50})
+            # The list itself, and the detail and categories of its films
+            self.assertEqual(spy.call_count, 3)
+            self.client.get(reverse('film-list'), {'page_size': 50, 'page': 2})
+            self.assertEqual(spy.call_count, 3)
+
+    def test_page_links_encode_the_query(self):
+        Film.objects.create(name="Fast & Furious", description="", publication_date="2001-06-22")
+        Film.objects.create(name="Fast & Furious 2", description="", publication_date="2003-06-06")
+        response = self.client.get(reverse('film-list'), {'title': 'fast & furious', 'page_size': 1})
+        next_page = response.json()["pagination"]["next_page"]
+        self.assertIn("title=fast+%26+furious", next_page)
+        self.assertIn("page_size=1", next_page)
+
+        second = self.client.get(next_page).json()
+        self.assertEqual(second["pagination"]["page"], 2)
+        self.assertEqual(second["pagination"]["total_results"], 2)
+
+
+class FilmFilterTest(FilmsTestCase):
+    """
+    Range, category and ordering parameters of the film list.
+    """
+
+    def results(self, **params):
+        response = self.client.get(reverse('film-list'), {'page_size': 1000, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_note_and_publication_date_ranges(self):
+        films = self.results(note_min=2, note_max=3, published_after='2000-01-01', published_before='2009-12-31')
+        self.assertEqual(
+            [film["id"] for film in films],
+            list(Film.objects.filter(note__range=(2, 3), publication_date__year__range=(2000, 2009))
+                 .values_list('id', flat=True)),
+        )
+
+    def test_categories_any_and_all(self):
+        first, second = Category.objects.all()[:2]
+        both = Film.objects.create(name="Both", description="", publication_date="2024-01-01")
+        both.categories.set([first, second])
+        one = Film.objects.create(name="One", description="", publication_date="2024-01-01")
+        one.categories.set([first])
+
+        any_ids = [film["id"] for film in self.results(category=[first.id, second.id])]
+        self.assertEqual(len(any_ids), len(set(any_ids)))
+        self.assertEqual(set(any_ids), set(Film.objects.filter(categories__in=[first, second]).values_list('id', flat=True)))
+
+        all_ids = [film["id"] for film in self.results(category=[first.id, second.id], category_mode='all')]
+        self.assertIn(both.id, all_ids)
+        self.assertNotIn(one.id, all_ids)
+        self.assertEqual(set(all_ids), set(Film.objects.filter(categories=first).filter(categories=second).values_list('id', flat=True)))
+
+    def test_ordering_puts_missing_notes_first(self):
+        unrated = Film.objects.create(name="Unrated", description="", publication_date="2024-01-01", note=None)
+        films = self.results(ordering='note')
+        self.assertEqual(films[0]["id"], unrated.id)
+        notes = [film["note"] for film in films[1:]]
+        self.assertEqual(notes, sorted(notes))
+        self.assertEqual(self.results(ordering='-note')[-1]["id"], unrated.id)
+
+    def test_cursor_pages_follow_the_ordering(self):
+        Film.objects.create(name="Unrated", description="", publication_date="2024-01-01", note=None)
+        ids = []
+        response = self.client.get(reverse('film-list'), {'cursor': '', 'ordering': '-note', 'page_size': 7, 'note_max': 4})
+        while True:
+            body = response.json()
+            ids += [film["id"] for film in body["results"]]
+            if body["pagination"]["next_page"] is None:
+                break
+            response = self.client.get(body["pagination"]["next_page"])
+        self.assertEqual(ids, [film["id"] for film in self.results(ordering='-note', note_max=4)])
+        self.assertEqual(len(ids), Film.objects.filter(note__lte=4).count())
+
+    def test_filters_cost_no_extra_query(self):
+        category = Category.objects.first()
+        with CaptureQueriesContext(connection) as unfiltered:
+            self.client.get(reverse('film-list'))
+        with CaptureQueriesContext(connection) as filtered:
+            self.client.get(reverse('film-list'), {'note_min': 1, 'category': category.id, 'ordering': '-publication_date'})
+        self.assertEqual(len(filtered.captured_queries), len(unfiltered.captured_queries))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'note_min': 'high'}, {'published_after': '2024-13-01'}, {'category': 'drama'},
+                       {'category_mode': 'some'}, {'ordering': 'description'}):
+            response = self.client.get(reverse('film-list'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+
+class CursorPaginationTest(FilmsTestCase):
+    """
+    Keyset pagination of the film lists, opt-in with the cursor parameter.
+    """
+
+    def walk(self, url, **params):
+        """
+        Follow the next_page links from the first page and return the ids of every film seen.
+        """
+        ids = []
+        response = self.client.get(url, {'cursor': '', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids += [film["id"] for film in body["results"]]
+            if body["pagination"]["next_page"] is None:
+                return ids
+            response = self.client.get(body["pagination"]["next_page"])
+
+    def test_walks_all_films_in_id_order(self):
+        ids = self.walk(reverse('film-list'), page_size=7)
+        self.assertEqual(ids, list(Film.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_walks_all_films_in_publication_date_order(self):
+        ids = self.walk(reverse('film-list'), page_size=9, ordering='-publication_date')
+        self.assertEqual(ids, list(Film.objects.order_by('-publication_date', '-id').values_list('id', flat=True)))
+
+    def test_walks_films_of_category(self):
+        category = Category.objects.first()
+        ids = self.walk(reverse('category-films', args=[category.id]), page_size=3)
+        self.assertEqual(ids, list(category.film_set.order_by('id').values_list('id', flat=True)))
+
+    def test_previous_page_link(self):
+        first = self.client.get(reverse('film-list'), {'cursor': '', 'page_size': 5}).json()
+        self.assertIsNone(first["pagination"]["prev_page"])
+        second = self.client.get(first["pagination"]["next_page"]).json()
+        back = self.client.get(second["pagination"]["prev_page"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_total_results_only_on_request(self):
+        response = self.client.get(reverse('film-list'), {'cursor': ''})
+        self.assertNotIn("total_results", response.json()["pagination"])
+        response = self.client.get(reverse('film-list'), {'cursor': '', 'count': 'true'})
+        self.assertEqual(response.json()["pagination"]["total_results"], Film.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('film-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FilmSearchTest(FilmsTestCase):
+    """
+    Full-text search of the film list.
+    """
+
+    def search(self, **params):
+        response = self.client.get(reverse('film-list'), {'page_size': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        return [film["id"] for film in response.json()["results"]]
+
+    def create_film(self, name, description):
+        return Film.objects.create(name=name, description=description, publication_date='2020-01-01')
+
+    def test_search_by_title_and_description(self):
+        film = self.create_film("Zyxwvut Returns", "A quokkalike tale")
+        self.assertEqual(self.search(title="zyxwv"), [film.id])
+        self.assertEqual(self.search(description="quokkalike"), [film.id])
+        self.assertEqual(self.search(title="zyxwvut", description="tale"), [film.id])
+        self.assertEqual(self.search(title="quokkalike"), [])
+
+    def test_search_ranks_results(self):
+        weak = self.create_film("Plain", "A story with one qwertyzz and many other words around it")
+        strong = self.create_film("Qwertyzz", "Qwertyzz qwertyzz")
+        self.assertEqual(self.search(q="qwertyzz"), [strong.id, weak.id])
+
+    def test_index_follows_updates_and_deletions(self):
+        film = self.create_film("Abcdefgh", "Description")
+        film.name = "Hgfedcba"
+        film.save()
+        self.assertEqual(self.search(title="abcdefgh"), [])
+        self.assertEqual(self.search(title="hgfedcba"), [film.id])
+        film.delete()
+        self.assertEqual(self.search(title="hgfedcba"), [])
+
+    def test_rebuild_index(self):
+        film = self.create_film("Poiuytr", "Description")
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search(title="poiuytr"), [film.id])
+
+    def test_search_with_pagination(self):
+        films = [self.create_film(f"Mnbvcxz {index}", "Description") for index in range(3)]
+        response = self.client.get(reverse('film-list'), {'title': 'mnbvcxz', 'page_size': 2})
+        self.assertEqual(response.json()["pagination"]["total_results"], 3)
+        response = self.client.get(reverse('film-list'), {'title': 'mnbvcxz', 'cursor': '', 'page_size': 2})
+        self.assertEqual([film["id"] for film in response.json()["results"]], [films[0].id, films[1].id])
+
+
+    def search_duration(self, **params):
+        # Best of three, against the noise of the other processes
+        durations = []
+        for attempt in range(3):
+            start = time.perf_counter()
+            self.search(**params)
+            durations.append(time.perf_counter() - start)
+        return min(durations)
+
+    @skipUnless(connection.vendor == 'sqlite', "The full-text index is only available on SQLite")
+    def test_common_terms_cost_linear_time(self):
+        # A term of a large share of the films: 2000 matches, then 200 (under another term)
+        films = Film.objects.bulk_create([
+            Film(name=f"Common {index}", description=f"{'Ubiquitous' if index % 10 else 'Ubiquitous Scarcer'} film",
+                 publication_date='2020-01-01')
+            for index in range(2000)
+        ])
+        search.index_films(films)
+        many, few = self.search_duration(q="ubiquitous"), self.search_duration(q="scarcer")
+        # Ranking each match must not look the matches up again: 10 times the matches, not 100 times the time
+        self.assertLess(many, few * 10)
+
+        plan = search_films(Film.objects.all(), q="ubiquitous").explain()
+        self.assertEqual(plan.count(search.SEARCH_TABLE), 1, plan)
+        self.assertNotIn("CORRELATED", plan)
+
+
+class StreamingTest(FilmsTestCase):
+    """
+    Streaming of whole film and category lists.
+    """
+
+    def test_ndjson_streams_all_films(self):
+        response = self.client.get(reverse('film-list'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines],
+                         list(Film.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_json_stream_matches_paginated_results(self):
+        response = self.client.get(reverse('film-list'), {'stream': 'true'})
+        streamed = json.loads(b"".join(response.streaming_content))["results"]
+        paginated = self.client.get(reverse('film-list'), {'page_size': 1000}).json()["results"]
+        self.assertEqual(streamed, paginated)
+
+    def test_category_xml_stream_matches_serializer(self):
+        category = Category.objects.first()
+        with self.settings(FILMS_STREAM_CHUNK_SIZE=7):
+            response = self.client.get(reverse('category-films', args=[category.id]), HTTP_ACCEPT='application/xml')
+        self.assertTrue(response.streaming)
+        films = with_categories(category.film_set.order_by('pk'))
+        self.assertEqual(b"".join(response.streaming_content).decode(), serialize('xml', films))
+
+    def test_categories_ndjson(self):
+        response = self.client.get(reverse('category-list'), HTTP_ACCEPT='application/x-ndjson')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), Category.objects.count())
+
+
+class RendererTest(FilmsTestCase):
+    """
+    Content negotiation between the JSON, XML, MessagePack and CBOR formats.
+    """
+
+    def test_parse_accept(self):
+        self.assertEqual(parse_accept('application/json;q=0.5, Application/CBOR, text/*;q=x, invalid'),
+                         [('application/json', 0.5), ('application/cbor', 1.0), ('text/*', 0.0)])
+
+    def test_best_match(self):
+        media_types = ['application/json', 'application/xml', 'application/msgpack']
+        self.assertEqual(best_match('', media_types), 'application/json')
+        self.assertEqual(best_match('application/msgpack, application/json', media_types), 'application/msgpack')
+        self.assertEqual(best_match('application/json;q=0.5, application/msgpack', media_types), 'application/msgpack')
+        # The most specific range wins, whatever its quality
+        self.assertEqual(best_match('application/*, application/json;q=0', media_types), 'application/xml')
+        # Browsers prefer XML to the */* JSON matches
+        self.assertEqual(best_match('text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8', media_types),
+                         'application/xml')
+        self.assertIsNone(best_match('image/png', media_types))
+
+    def test_binary_encodings(self):
+        # Examples of the MessagePack specification and of RFC 8949, appendix A
+        for value, packed, cbor in [
+            (0, b'\x00', b'\x00'), (-1, b'\xff', b'\x20'), (1000, b'\xcd\x03\xe8', b'\x19\x03\xe8'),
+            (-1000, b'\xd1\xfc\x18', b'\x39\x03\xe7'), (None, b'\xc0', b'\xf6'), (True, b'\xc3', b'\xf5'),
+            ("a", b'\xa1a', b'\x61a'), ([1, [2]], b'\x92\x01\x91\x02', b'\x82\x01\x81\x02'),
+            ({"a": 1}, b'\x81\xa1a\x01', b'\xa1\x61a\x01'), (1.5, b'\xcb?\xf8' + bytes(6), b'\xfb?\xf8' + bytes(6)),
+        ]:
+            self.assertEqual(binary.packb(value), packed)
+            self.assertEqual(binary.cbor_dumps(value), cbor)
+
+        value = {"text": "é" * 300, "numbers": [2 ** 40, -2 ** 20, 255, 65536], "items": list(range(20)), "data": b'\x00' * 300}
+        self.assertEqual(binary.unpackb(binary.packb(value)), value)
+        self.assertEqual(binary.cbor_loads(binary.cbor_dumps(value)), value)
+
+    def test_film_list_formats(self):
+        url = reverse('film-list')
+        data = self.client.get(url, {'page_size': 50}).json()
+        for accept, decode in [('application/msgpack', binary.unpackb), ('application/cbor', binary.cbor_loads)]:
+            response = self.client.get(url, {'page_size': 50}, HTTP_ACCEPT=accept)
+            self.assertEqual(response['Content-Type'], accept)
+            self.assertIn('Accept', response['Vary'])
+            self.assertEqual(decode(response.content), data)
+            self.assertLess(len(response.content), len(json.dumps(data)))
+
+    def test_every_read_view_negotiates(self):
+        film = Film.objects.first()
+        for url in [reverse('get_film', args=[film.id]), reverse('category-list'),
+                    reverse('get_categories_of_film', args=[film.id]), reverse('stats')]:
+            data = self.client.get(url).json()
+            response = self.client.get(url, HTTP_ACCEPT='application/cbor, application/json;q=0.5')
+            self.assertEqual(binary.cbor_loads(response.content), data)
+
+        # XML is Django's serialization of the models, and a generic document for the other data
+        response = self.client.get(reverse('get_film', args=[film.id]), HTTP_ACCEPT='application/xml')
+        self.assertEqual(response.content.decode(), serialize('xml', [with_categories(Film.objects.all()).get(id=film.id)]))
+        response = self.client.get(reverse('stats'), HTTP_ACCEPT='application/xml')
+        self.assertContains(response, f"<film_count>{Film.objects.count()}</film_count>")
+
+    def test_write_views_negotiate(self):
+        response = self.client.delete(reverse('delete_film', args=[Film.objects.first().id]),
+                                      HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(binary.unpackb(response.content), {"message": "Film deleted"})
+
+
+class CompressionTest(FilmsTestCase):
+    """
+    Negotiated compression of the responses, and compressed cache entries.
+    """
+
+    def test_negotiate_encoding(self):
+        request = lambda header: mock.Mock(headers={'Accept-Encoding': header})
+        self.assertEqual(negotiate_encoding(request('gzip, deflate')).name, 'gzip')
+        self.assertEqual(negotiate_encoding(request('*')).name, 'gzip')
+        self.assertIsNone(negotiate_encoding(request('gzip;q=0, identity')))
+        self.assertIsNone(negotiate_encoding(request('')))
+
+    def test_large_responses_are_compressed(self):
+        url = reverse('film-list')
+        plain = self.client.get(url, {'page_size': 100})
+        response = self.client.get(url, {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        # The weak ETag still validates the cached representation
+        response = self.client.get(url, {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        for response in [self.client.get(reverse('film-list'), {'cursor': 'invalid'}, HTTP_ACCEPT_ENCODING='gzip'),
+                         self.client.get(reverse('film-list'), {'page_size': 1, 'include': '', 'fields': 'id'},
+                                         HTTP_ACCEPT_ENCODING='gzip')]:
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+        with self.settings(FILMS_COMPRESSION_POLICY={'application/xml': 0}):
+            response = self.client.get(reverse('film-list'), {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_are_compressed(self):
+        url = reverse('film-list')
+        plain = b"".join(self.client.get(url, HTTP_ACCEPT='application/x-ndjson').streaming_content)
+        with self.settings(FILMS_STREAM_CHUNK_SIZE=7):
+            response = self.client.get(url, HTTP_ACCEPT='application/x-ndjson', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), plain)
+
+    def test_cached_responses_are_stored_compressed(self):
+        url = reverse('film-list')
+        with mock.patch.object(GzipEncoding, 'compress', autospec=True,
+                               side_effect=lambda encoding, data: gzip.compress(data)) as compress:
+            first = self.client.get(url, {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(url, {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip')
+            plain = self.client.get(url, {'page_size': 100})
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        # Clients not accepting gzip have their own entry
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+
+
+class InstrumentationTest(FilmsTestCase):
+    """
+    Per request measures in the Server-Timing header and the Prometheus metrics.
+    """
+
+    def setUp(self):
+        super().setUp()
+        REGISTRY.clear()
+
+    def server_timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('film-list'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'app', 'db', 'serialize'})
+        self.assertIn(f'desc="{len(context.captured_queries)} queries"', timing['db'])
+
+    def test_repeated_queries_are_flagged(self):
+        def get_response(request):
+            # One query per film: an N+1 pattern
+            for film_id in Film.objects.values_list('id', flat=True)[:6]:
+                Film.objects.get(id=film_id)
+            return HttpResponse()
+
+        response = InstrumentationMiddleware(get_response)(RequestFactory().get('/'))
+        self.assertIn('repeated-queries', self.server_timing(response))
+        self.assertNotIn('repeated-queries', self.server_timing(self.client.get(reverse('film-list'))))
+
+    def test_prometheus_metrics(self):
+        self.client.get(reverse('film-list'))
+        self.client.get(reverse('film-list'), HTTP_ACCEPT='application/x-ndjson').getvalue()
+        self.client.get(reverse('get_film', args=[999999]))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        self.assertEqual(samples['films_requests_total{view="film-list",method="GET",status="200"}'], 2)
+        self.assertEqual(samples['films_requests_total{view="get_film",method="GET",status="404"}'], 1)
+        self.assertEqual(samples['films_request_duration_seconds_count{view="film-list"}'], 2)
+        self.assertEqual(samples['films_request_duration_seconds_bucket{view="film-list",le="+Inf"}'], 2)
+        self.assertGreater(samples['films_db_queries_total{view="film-list"}'], 0)
+        self.assertGreater(samples['films_serialization_seconds_total{view="film-list"}'], 0)
+        # Including the streamed export, counted as it is sent
+        stream = self.client.get(reverse('film-list'), HTTP_ACCEPT='application/x-ndjson').getvalue()
+        page = self.client.get(reverse('film-list')).content
+        response = self.client.get(reverse('metrics'))
+        self.assertIn(f'films_response_bytes_total{{view="film-list"}} {2 * (len(stream) + len(page))}',
+                      response.content.decode())
+
+    def test_metrics_are_only_served_to_allowed_clients(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with self.settings(FILMS_METRICS_ALLOWED_ADDRESSES=['10.0.0.0/8']):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.2.3').status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 403)
+        with self.settings(FILMS_METRICS_ALLOWED_ADDRESSES=[]):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class UpdateFilmTest(FilmsTestCase):
+    """
+    Updates of a film write only what changes, and nothing when the request is invalid.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.categories = list(Category.objects.order_by('id')[:3])
+        self.film = Film.objects.create(name="Film", description="Description", publication_date="2024-04-23", note=3)
+        self.film.categories.set(self.categories[:2])
+
+    def send(self, method, data):
+        return getattr(self.client, method)(reverse('update_film', args=[self.film.id]), json.dumps(data),
+                                             content_type='application/json')
+
+    def category_links(self):
+        return dict(Film.categories.through.objects.filter(film=self.film).values_list('category_id', 'id'))
+
+    def test_patch_writes_changed_fields_only(self):
+        links = self.category_links()
+        with CaptureQueriesContext(connection) as context:
+            response = self.send('patch', {"name": "Renamed", "note": 3})
+        self.assertEqual(response.status_code, 200)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "films_film"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"name"', updates[0])
+        self.assertNotIn('"note"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.name, self.film.description, self.film.note), ("Renamed", "Description", 3))
+        self.assertEqual(self.category_links(), links)
+
+    def test_derived_data_of_unchanged_fields_is_not_refreshed(self):
+        for data, untouched in (({"note": 4}, search.SEARCH_TABLE), ({"name": "Renamed"}, 'films_filmstatsentry')):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.send('patch', data).status_code, 200)
+            queries = [query['sql'] for query in context.captured_queries]
+            self.assertFalse([query for query in queries if untouched in query], data)
+            self.assertTrue([query for query in queries if 'films_filmdocument' in query], data)
+        self.assertEqual(self.client.get(reverse('stats')).json()["films"]["film_count"], Film.objects.count())
+        self.assertTrue(search_films(Film.objects.filter(id=self.film.id), q="Renamed").exists())
+
+    def test_unchanged_update_writes_nothing(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.send('put', {"name": "Film", "publication_date": "2024-04-23",
+                                         "categories": [category.id for category in self.categories[:2]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context.captured_queries
+                          if query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))])
+
+    def test_categories_are_diffed(self):
+        links = self.category_links()
+        first, second, third = self.categories
+        response = self.send('patch', {"categories": [second.id, third.id]})
+        self.assertEqual(response.status_code, 200)
+        new_links = self.category_links()
+        self.assertEqual(set(new_links), {second.id, third.id})
+        # The link that stays is not rewritten
+        self.assertEqual(new_links[second.id], links[second.id])
+
+    def test_invalid_update_changes_nothing(self):
+        links = self.category_links()
+        response = self.send('put', {"name": "Renamed", "categories": [self.categories[2].id, 999999]})
+        self.assertEqual(response.status_code, 404)
+        response = self.send('patch', {"name": "Renamed", "publication_date": "not a date"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("publication_date", response.json()["errors"])
+
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.name, "Film")
+        self.assertEqual(self.category_links(), links)
+
+    def test_put_replaces_categories(self):
+        response = self.send('put', {"note": 5})
+        self.assertEqual(response.status_code, 200)
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.note, 5)
+        self.assertEqual(self.category_links(), {})
+
+    def test_null_categories_are_rejected(self):
+        links = self.category_links()
+        for method in ('patch', 'put'):
+            response = self.send(method, {"name": "Renamed", "categories": None})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"error": "Categories must be a list of category ids"})
+        self.assertEqual(self.category_links(), links)
+
+
+class BulkFilmsTest(FilmsTestCase):
+    """
+    Bulk creation, update and deletion of films.
+    """
+
+    def send(self, method, name, data):
+        return getattr(self.client, method)(reverse(name), json.dumps(data), content_type='application/json')
+
+    def film_data(self, name, categories):
+        return {"name": name, "description": "Description", "publication_date": "2024-04-23", "note": 3,
+                "categories": categories}
+
+    def test_bulk_create(self):
+        categories = list(Category.objects.values_list('id', flat=True)[:3])
+        items = [self.film_data(f"Bulk film {index}", categories[:index + 1]) for index in range(3)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.send('post', 'bulk_create_films', items)
+        self.assertEqual(response.status_code, 201)
+        created = response.json()["results"]
+        self.assertEqual([result["status"] for result in created], ["created"] * 3)
+        for index, result in enumerate(created):
+            film = Film.objects.get(id=result["id"])
+            self.assertEqual(film.name, f"Bulk film {index}")
+            self.assertEqual(sorted(film.categories.values_list('id', flat=True)), categories[:index + 1])
+
+        # The number of queries does not depend on the number of films
+        with CaptureQueriesContext(connection) as larger_context:
+            self.send('post', 'bulk_create_films', items * 5)
+        self.assertEqual(len(context.captured_queries), len(larger_context.captured_queries))
+
+    def test_bulk_create_is_all_or_nothing(self):
+        category = Category.objects.first()
+        count = Film.objects.count()
+        response = self.send('post', 'bulk_create_films', {"films": [
+            self.film_data("Valid", [category.id]),
+            self.film_data("Unknown category", [category.id, 999999]),
+            {"name": "Missing fields", "categories": [category.id]},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["valid", "invalid", "invalid"])
+        self.assertEqual(Film.objects.count(), count)
+
+    def test_malformed_items_are_reported(self):
+        film = Film.objects.first()
+        response = self.send('post', 'bulk_create_films', [self.film_data("Scalar categories", 5)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["results"][0]["errors"]["categories"],
+                         ["Categories must be a list of category ids"])
+
+        response = self.send('put', 'bulk_update_films', [
+            {"id": film.id, "categories": 5},
+            {"id": [film.id], "note": 1},
+            "film",
+        ])
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["invalid", "invalid", "invalid"])
+        self.assertEqual(results[1]["errors"], {"id": ["Expected an integer film id"]})
+
+    def test_bulk_update(self):
+        films = list(Film.objects.order_by('id')[:2])
+        category = Category.objects.last()
+        response = self.send('put', 'bulk_update_films', [
+            {"id": films[0].id, "name": "Renamed"},
+            {"id": films[1].id, "note": 1, "categories": [category.id]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        films[0].refresh_from_db()
+        films[1].refresh_from_db()
+        self.assertEqual(films[0].name, "Renamed")
+        self.assertEqual(films[1].note, 1)
+        self.assertEqual(list(films[1].categories.values_list('id', flat=True)), [category.id])
+
+        response = self.send('put', 'bulk_update_films', [{"id": 999999, "name": "Missing"}])
+        self.assertEqual(response.json()["results"][0]["status"], "not_found")
+
+        # An empty list clears the categories, as on the single-film endpoints
+        response = self.send('put', 'bulk_update_films', [{"id": films[1].id, "categories": []}])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(films[1].categories.exists())
+
+    def test_category_ids_are_parsed_as_on_the_single_film_endpoints(self):
+        category = Category.objects.first()
+        response = self.send('post', 'bulk_create_films', [self.film_data("String id", [str(category.id)])])
+        self.assertEqual(response.status_code, 201)
+        film = Film.objects.get(id=response.json()["results"][0]["id"])
+        self.assertEqual(list(film.categories.values_list('id', flat=True)), [category.id])
+
+        # A boolean is not category 1
+        for categories in ([True], None):
+            response = self.send('post', 'bulk_create_films', [self.film_data("Boolean id", categories)])
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["results"][0]["errors"]["categories"],
+                             ["Categories must be a list of category ids"])
+            response = self.send('put', 'bulk_update_films', [{"id": film.id, "categories": categories}])
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(film.categories.values_list('id', flat=True)), [category.id])
+
+    def test_bulk_delete(self):
+        film_ids = list(Film.objects.order_by('id').values_list('id', flat=True)[:2])
+        response = self.send('delete', 'bulk_delete_films', {"ids": film_ids + [999999]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["deleted", "deleted", "not_found"])
+        self.assertFalse(Film.objects.filter(id__in=film_ids).exists())
+        self.assertFalse(FilmDocument.objects.filter(film_id__in=film_ids).exists())
+        self.assertFalse(Film.categories.through.objects.filter(film_id__in=film_ids).exists())
+
+    def test_bulk_delete_refreshes_derived_data_once(self):
+        films = list(Film.objects.order_by('id')[:50])
+        with CaptureQueriesContext(connection) as context:
+            self.send('delete', 'bulk_delete_films', [film.id for film in films])
+        # Not one search, statistics and cache refresh per film: besides the update of each summary row
+        # of the statistics, a handful of queries
+        queries = [query['sql'] for query in context.captured_queries
+                   if not query['sql'].startswith(('UPDATE "films_yearstats"', 'UPDATE "films_categorystats"'))]
+        self.assertLess(len(queries), 15)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM films_film_fts WHERE rowid = %s", [films[0].id])
+                self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(self.client.get(reverse('stats')).json()["films"]["film_count"], Film.objects.count())
+
+
+class StatsTest(FilmsTestCase):
+    """
+    The statistics endpoints stay in line with the films, whatever the way they are written.
+    """
+
+    def expected_stats(self):
+        """
+        Return the statistics as computed directly from the films, by category id and by year.
+        """
+        categories, years = {}, {}
+        for film in Film.objects.prefetch_related('categories'):
+            keys = [(years, film.publication_date.year)] + [(categories, category.id) for category in film.categories.all()]
+            for counts, key in keys:
+                notes = counts.setdefault(key, [])
+                notes.append(film.note)
+        return ({key: self.summary(notes) for key, notes in categories.items()},
+                {key: self.summary(notes) for key, notes in years.items()})
+
+    @staticmethod
+    def summary(notes):
+        known_notes = [note for note in notes if note is not None]
+        average_note = round(sum(known_notes) / len(known_notes), 2) if known_notes else None
+        return len(notes), average_note
+
+    def assertStatsUpToDate(self):
+        get_cache().clear()
+        data = self.client.get(reverse('stats')).json()
+        categories, years = self.expected_stats()
+        self.assertEqual({row["id"]: (row["film_count"], row["average_note"]) for row in data["categories"]
+                          if row["film_count"]}, categories)
+        self.assertEqual({row["year"]: (row["film_count"], row["average_note"]) for row in data["years"]}, years)
+        self.assertEqual(data["films"]["film_count"], Film.objects.count())
+
+    def test_stats_follow_writes(self):
+        self.assertStatsUpToDate()
+        first, second = Category.objects.order_by('id')[:2]
+
+        film = Film.objects.create(name="Stats", description="", publication_date="1901-05-01", note=4)
+        film.categories.add(first, second)
+        self.assertStatsUpToDate()
+
+        film.note = None
+        film.publication_date = "1902-01-01"
+        film.save()
+        film.categories.remove(second)
+        self.assertStatsUpToDate()
+
+        first.film_set.clear()
+        self.assertStatsUpToDate()
+        second.film_set.add(*Film.objects.order_by('id')[:5])
+        self.assertStatsUpToDate()
+
+        film.delete()
+        second.delete()
+        self.assertStatsUpToDate()
+
+    def test_stats_follow_bulk_writes_and_seeding(self):
+        category = Category.objects.first()
+        film_data = {"name": "Bulk", "description": "Description", "publication_date": "1950-01-01", "note": 2,
+                     "categories": [category.id]}
+        created = self.client.post(reverse('bulk_create_films'), json.dumps([film_data] * 3),
+                                   content_type='application/json').json()["results"]
+        self.client.put(reverse('bulk_update_films'), json.dumps([{"id": created[0]["id"], "note": 5}]),
+                        content_type='application/json')
+        self.client.delete(reverse('bulk_delete_films'), json.dumps([created[1]["id"]]), content_type='application/json')
+        self.assertStatsUpToDate()
+
+        seed_films(50, batch_size=20, seed=3)
+        self.assertStatsUpToDate()
+
+        # The seeded films are recorded as the signal handlers count them
+        seeded = list(Film.objects.order_by('-id').values_list('id', flat=True)[:50])
+        entries = {film_id: (entry.year, entry.note, entry.category_ids)
+                   for film_id, entry in FilmStatsEntry.objects.in_bulk(seeded).items()}
+        self.assertEqual(entries, {film_id: (entry.year, entry.note, entry.category_ids)
+                                   for film_id, entry in stats.film_entries(seeded).items()})
+
+    def test_seeding_refreshes_the_derived_data_in_bulk(self):
+        # Enough films to cover every year and category, so that only the film count differs
+        query_counts = []
+        for count in (1000, 3000):
+            with CaptureQueriesContext(connection) as context:
+                seed_films(count, seed=5)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertStatsUpToDate()
+
+    def test_reads_do_not_depend_on_the_number_of_films(self):
+        url = reverse('stats')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        seed_films(200, seed=4)
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as larger_context:
+            self.client.get(url)
+        self.assertEqual(len(context.captured_queries), len(larger_context.captured_queries))
+        self.assertFalse(any('"films_film"' in query['sql'] for query in larger_context.captured_queries))
+
+    def test_rebuild(self):
+        expected = self.client.get(reverse('stats')).json()
+        Film.objects.update(note=1)  # Not seen by the signals
+        self.assertEqual(rebuild_stats(), Film.objects.count())
+        self.assertStatsUpToDate()
+
+        Film.objects.update(note=None)
+        call_command('rebuild_stats', stdout=StringIO())
+        get_cache().clear()
+        data = self.client.get(reverse('stats')).json()
+        self.assertIsNone(data["films"]["average_note"])
+        self.assertEqual(data["films"]["film_count"], expected["films"]["film_count"])
+
+
+class FilmDocumentTest(FilmsTestCase):
+    """
+    The film responses spliced from the stored documents are the ones serialized from the models, and
+    the documents follow the writes.
+    """
+
+    def expected_documents(self):
+        films = with_categories(Film.objects.order_by('id'))
+        return {film.id: json.loads(json.dumps(serialize_film(film), cls=DjangoJSONEncoder)) for film in films}
+
+    def assertDocumentsUpToDate(self):
+        documents = {film_id: json.loads(document)
+                     for film_id, document in FilmDocument.objects.values_list('film_id', 'document')}
+        self.assertEqual(documents, self.expected_documents())
+
+    def test_responses_match_the_serialized_models(self):
+        film = Film.objects.first()
+        category = film.categories.first()
+        for url in [reverse('film-list'), reverse('film-list') + '?page=2&page_size=7',
+                    reverse('film-list') + '?cursor=&ordering=-publication_date', reverse('film-list') + '?include=categories',
+                    reverse('get_film', args=[film.id]), reverse('category-films', args=[category.id])]:
+            spliced = self.client.get(url)
+            get_cache().clear()
+            with mock.patch('films.views.film_views.uses_documents', return_value=False):
+                serialized = self.client.get(url)
+            get_cache().clear()
+            self.assertEqual(spliced.content, serialized.content, url)
+
+        # The other formats decode the documents
+        response = self.client.get(reverse('film-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(binary.unpackb(response.content), self.client.get(reverse('film-list')).json())
+
+    def test_pages_read_documents_with_the_films(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('film-list'), {'page_size': 50})
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertFalse([query for query in queries if 'films_film_categories' in query])
+        self.assertEqual(len([query for query in queries if 'films_filmdocument' in query]), 1)
+
+    def test_writes_render_the_document_once(self):
+        first, second = Category.objects.order_by('id')[:2]
+        writes = [
+            ('post', reverse('create_film'), {"name": "Document", "description": "Description",
+                                              "publication_date": "1901-05-01", "categories": [first.id]}),
+            ('put', None, {"name": "Renamed", "publication_date": "1901-05-01", "categories": [second.id]}),
+        ]
+        for method, url, data in writes:
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(self.client, method)(url or reverse('update_film', args=[film_id]),
+                                                        json.dumps(data), content_type='application/json')
+            self.assertIn(response.status_code, (200, 201))
+            film_id = Film.objects.order_by('-id').values_list('id', flat=True).first()
+            renders = [query for query in context.captured_queries
+                       if query['sql'].startswith('INSERT INTO "films_filmdocument"')]
+            self.assertEqual(len(renders), 1, method)
+        self.assertDocumentsUpToDate()
+
+    def test_missing_documents_are_rendered_on_the_spot(self):
+        film = Film.objects.order_by('id').first()
+        expected = self.client.get(reverse('film-list')).content
+        FilmDocument.objects.filter(film=film).delete()
+        get_cache().clear()
+        self.assertEqual(self.client.get(reverse('film-list')).content, expected)
+        self.assertEqual(self.client.get(reverse('get_film', args=[film.id])).json()["id"], film.id)
+
+    def test_documents_follow_writes(self):
+        self.assertDocumentsUpToDate()
+        first, second = Category.objects.order_by('id')[:2]
+
+        film = Film.objects.create(name="Document", description="Description", publication_date="1901-05-01")
+        film.categories.add(first, second)
+        self.client.patch(reverse('update_film', args=[film.id]), json.dumps({"name": "Renamed", "note": 4}),
+                          content_type='application/json')
+        self.assertDocumentsUpToDate()
+
+        first.name = "Renamed category"
+        first.save()
+        first.film_set.clear()
+        second.film_set.add(*Film.objects.order_by('id')[:5])
+        self.assertDocumentsUpToDate()
+
+        second.delete()
+        film.delete()
+        self.assertDocumentsUpToDate()
+
+    def test_documents_follow_bulk_writes_and_seeding(self):
+        category = Category.objects.first()
+        film_data = {"name": "Bulk", "description": "Description", "publication_date": "1950-01-01", "note": 2,
+                     "categories": [category.id]}
+        created = self.client.post(reverse('bulk_create_films'), json.dumps([film_data] * 3),
+                                   content_type='application/json').json()["results"]
+        self.client.put(reverse('bulk_update_films'), json.dumps([{"id": created[0]["id"], "note": 5}]),
+                        content_type='application/json')
+        self.client.delete(reverse('bulk_delete_films'), json.dumps([created[1]["id"]]), content_type='application/json')
+        self.assertDocumentsUpToDate()
+
+        seed_films(50, batch_size=20, seed=3)
+        self.assertDocumentsUpToDate()
+
+    def test_rebuild(self):
+        Film.objects.update(note=1)  # Not seen by the signals
+        call_command('rebuild_documents', stdout=StringIO())
+        self.assertDocumentsUpToDate()
+
+
+class ResponseCacheTest(FilmsTestCase):
+    """
+    Caching of the read endpoints and its invalidation on writes.
+    """
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_responses_are_cached_per_accept_header(self):
+        url = reverse('film-list')
+        self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(self.get(url, HTTP_ACCEPT='application/xml')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.get(url)
+
+    def test_film_update_only_invalidates_its_own_detail(self):
+        film, other_film = Film.objects.order_by('id')[:2]
+        film_url = reverse('get_film', kwargs={'film_id': film.id})
+        other_url = reverse('get_film', kwargs={'film_id': other_film.id})
+        self.get(film_url)
+        self.get(other_url)
+        self.get(reverse('film-list'))
+
+        film.name = "Cached film renamed"
+        film.save()
+        response = self.get(film_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()["name"], "Cached film renamed")
+        self.assertEqual(self.get(other_url)['X-Cache'], 'HIT')
+        self.assertEqual(self.get(reverse('film-list'))['X-Cache'], 'MISS')
+
+    def test_category_changes_invalidate_responses(self):
+        film = Film.objects.filter(categories__isnull=False).first()
+        url = reverse('get_categories_of_film', kwargs={'film_id': film.id})
+        self.get(url)
+
+        film.categories.clear()
+        self.assertEqual(self.get(url).json()["categories"], [])
+
+        category = Category.objects.first()
+        film.categories.add(category)
+        self.get(url)
+        category.name = "Renamed category"
+        category.save()
+        self.assertEqual(self.get(url).json()["categories"], [{"id": category.id, "name": "Renamed category"}])
+
+    def test_not_found_is_not_cached(self):
+        url = reverse('get_film', kwargs={'film_id': 999999})
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+
+class CategoryRegistryTest(FilmsTestCase):
+    """
+    The views read the categories from the in-process registry, invalidated by the version token.
+    """
+
+    def category_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            if data is None:
+                response = getattr(self.client, method)(url)
+            else:
+                response = getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+        return response, [query['sql'] for query in context.captured_queries
+                          if 'FROM "films_category"' in query['sql']]
+
+    def test_views_do_not_query_the_category_table(self):
+        film = Film.objects.first()
+        category = Category.objects.first()
+        # The films of a category are listed without their categories: the category itself is only
+        # checked in the registry
+        for url in [reverse('category-list'), reverse('get_categories_of_film', args=[film.id]),
+                    reverse('category-films', args=[category.id]) + '?include=links']:
+            response, queries = self.category_queries('get', url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, [])
+
+        response, queries = self.category_queries('post', reverse('create_film'), {
+            "name": "Film", "description": "Description", "publication_date": "2024-04-23",
+            "categories": [category.id],
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(queries, [])
+
+    def test_film_categories(self):
+        film = Film.objects.first()
+        response = self.client.get(reverse('get_categories_of_film', args=[film.id]))
+        self.assertEqual(response.json()["categories"],
+                         [{"id": category.id, "name": category.name} for category in film.categories.order_by('id')])
+        self.assertEqual(self.client.get(reverse('get_categories_of_film', args=[999999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('category-films', args=[999999])).status_code, 404)
+
+    def test_unknown_categories_are_rejected_before_creating_the_film(self):
+        count = Film.objects.count()
+        response = self.client.post(reverse('create_film'), json.dumps({
+            "name": "Film", "description": "Description", "publication_date": "2024-04-23",
+            "categories": [Category.objects.first().id, 999999],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Film.objects.count(), count)
+
+    def test_category_ids_may_be_strings_of_digits(self):
+        first, second = Category.objects.order_by('id')[:2]
+        response = self.client.post(reverse('create_film'), json.dumps({
+            "name": "Film", "description": "Description", "publication_date": "2024-04-23",
+            "categories": [str(first.id), second.id],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        film = Film.objects.order_by('-id').first()
+        self.assertEqual(set(film.categories.all()), {first, second})
+
+        response = self.client.patch(reverse('update_film', args=[film.id]), json.dumps({"categories": [str(second.id)]}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(film.categories.all()), [second])
+
+    def test_malformed_category_ids_are_rejected(self):
+        count = Film.objects.count()
+        for categories in (5, "1", [1.5], ["one"], [True], [None]):
+            response = self.client.post(reverse('create_film'), json.dumps({
+                "name": "Film", "description": "Description", "publication_date": "2024-04-23",
+                "categories": categories,
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 400, categories)
+            self.assertEqual(response.json(), {"error": "Categories must be a list of category ids"})
+        self.assertEqual(Film.objects.count(), count)
+
+    def test_changes_reload_the_registry(self):
+        category = Category.objects.first()
+        category.name = "Renamed"
+        category.save()
+        self.assertEqual(get_registry().names[category.id], "Renamed")
+        self.assertIn({"id": category.id, "name": "Renamed"},
+                      self.client.get(reverse('category-list')).json()["results"])
+
+        category_id = category.id
+        category.delete()
+        self.assertNotIn(category_id, get_registry())
+        self.assertEqual(self.client.get(reverse('category-films', args=[category_id])).status_code, 404)
+
+    def test_other_workers_changes_are_seen_at_the_next_check(self):
+        category = Category.objects.first()
+        registry = get_registry()
+
+        # Another worker renames the category: only the database changes here
+        Category.objects.filter(id=category.id).update(name="Renamed")
+        CategoryVersion.objects.update(token="other")
+        self.assertIs(get_registry(), registry)
+
+        with override_settings(FILMS_CATEGORY_REGISTRY_CHECK_INTERVAL=0):
+            self.assertEqual(get_registry().names[category.id], "Renamed")
+            self.assertEqual(get_registry().version, "other")
+
+            # An unchanged token keeps the registry
+            reloaded = get_registry()
+            self.assertIs(get_registry(), reloaded)
+
+    def test_documents_store_the_names_renamed_by_other_workers(self):
+        film = Film.objects.filter(categories__isnull=False).first()
+        category = film.categories.first()
+        get_registry()
+
+        # Another worker renames the category, and this one writes the film before its next check
+        Category.objects.filter(id=category.id).update(name="Renamed")
+        CategoryVersion.objects.update(token="other")
+        self.client.patch(reverse('update_film', args=[film.id]), json.dumps({"name": "Another name"}),
+                          content_type='application/json')
+        document = json.loads(FilmDocument.objects.get(film=film).document)
+        self.assertIn({"id": category.id, "name": "Renamed"}, document["categories"])
+
+
+class ConditionalGetTest(FilmsTestCase):
+    """
+    ETag and Last-Modified validators of the read endpoints.
+    """
+
+    def test_not_modified_until_the_film_changes(self):
+        film = Film.objects.first()
+        url = reverse('get_film', kwargs={'film_id': film.id})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+        # Answered from the validators, whether the response is cached or not
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        get_cache().clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        film.categories.add(Category.objects.exclude(film=film).first())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_on_deletion_and_category_rename(self):
+        url = reverse('film-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'page': 2})['ETag'], etag)
+
+        Film.objects.order_by('id').last().delete()
+        etag_after_deletion = self.client.get(url)['ETag']
+        self.assertNotEqual(etag_after_deletion, etag)
+
+        category = Category.objects.first()
+        category.name = "Renamed"
+        category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag_after_deletion).status_code, 200)
+
+    def test_list_validation_does_not_read_the_films(self):
+        url = reverse('film-list')
+        for params in ({}, {'cursor': ''}, {'stream': '1', 'note_min': 2}):
+            etag = self.client.get(url, params)['ETag']
+            get_cache().clear()
+            # A single lookup of the version of the films, whatever the size of the list
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_category_films_etag(self):
+        category = Category.objects.first()
+        url = reverse('category-films', args=[category.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Film.objects.create(name="New", description="New", publication_date='2020-01-01').categories.add(category)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(reverse('category-films', args=[999999])).status_code, 404)
+
+    def test_invalid_fields_get_no_validators(self):
+        category = Category.objects.first()
+        for url in (reverse('film-list'), reverse('category-films', args=[category.id])):
+            etag = self.client.get(url)['ETag']
+            for params in ({'fields': 'name,unknown'}, {'include': 'unknown'}):
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_bulk_update_changes_etag(self):
+        film = Film.objects.first()
+        url = reverse('get_film', kwargs={'film_id': film.id})
+        etag = self.client.get(url)['ETag']
+        self.client.put(reverse('bulk_update_films'), json.dumps([{"id": film.id, "note": 5}]),
+                        content_type='application/json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncViewsTest(FilmsTestCase):
+    """
+    The async read views of the ASGI deployment profile answer as their sync counterparts.
+    """
+
+    async def compare(self, url, data=None, **headers):
+        expected = await sync_to_async(self.client.get)(url, data, headers=headers)
+        get_cache().clear()
+        with self.settings(ROOT_URLCONF='film_api_project.urls_async'):
+            self.assertTrue(iscoroutinefunction(resolve(url).func))
+            response = await self.async_client.get(url, data, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['X-Cache'] if response.status_code == 200 else 'MISS', 'MISS')
+        if response.streaming:
+            content = b"".join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(content, await sync_to_async(b"".join)(expected.streaming_content))
+        else:
+            self.assertEqual(response.content, expected.content)
+        return response
+
+    async def test_film_list(self):
+        await self.compare(reverse('film-list'), {'page': 2, 'page_size': 7})
+        await self.compare(reverse('film-list'), {'cursor': '', 'count': 'true'})
+        await self.compare(reverse('film-list'), {'page_size': 5}, accept='application/xml')
+        await self.compare(reverse('film-list'), {'stream': 'true'})
+        await self.compare(reverse('film-list'), {'ids': '3,1,999999,2'})
+        response = await self.compare(reverse('film-list'), {'stream': 'true'}, accept_encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    async def test_film_detail(self):
+        film = await Film.objects.afirst()
+        await self.compare(reverse('get_film', kwargs={'film_id': film.id}))
+        await self.compare(reverse('get_categories_of_film', kwargs={'film_id': film.id}))
+        await self.compare(reverse('get_film', kwargs={'film_id': 999999}))
+
+    async def test_categories(self):
+        category = await Category.objects.afirst()
+        await self.compare(reverse('category-list'))
+        await self.compare(reverse('category-films', args=[category.id]))
+        await self.compare(reverse('category-films', args=[category.id]), accept='application/xml')
+        await self.compare(reverse('category-films', args=[category.id]), accept='application/x-ndjson')
+        await self.compare(reverse('category-films', args=[category.id]), {'cursor': '', 'fields': 'name'})
+        await self.compare(reverse('category-films', args=[category.id]), {'cursor': 'invalid'})
+        await self.compare(reverse('film-list'), {'fields': 'unknown'})
+
+
+class BenchmarkTest(FilmsTestCase):
+    """
+    The benchmark covers every route and reports its statistics.
+    """
+
+    def test_benchmark_covers_every_route(self):
+        self.assertEqual(missing_routes(build_scenarios(random.Random(0))), [])
+
+    def test_benchmark_report(self):
+        self.assertEqual(seed_films(20), 20)
+        report = run_benchmark(requests=3, only=['film-list', 'bulk_delete_films'])
+        self.assertEqual(report["films"], Film.objects.count())
+        scenario = report["scenarios"][0]
+        self.assertEqual(scenario["status_codes"], {"200": 3})
+        self.assertLessEqual(scenario["latency_ms"]["p50"], scenario["latency_ms"]["p99"])
+        self.assertGreater(scenario["queries"]["min"], 0)
+
+
+class SeedFilmsTest(FilmsTestCase):
+    """
+    The seed_films command creates reproducible films with categories, searchable at once.
+    """
+
+    def seeded_films(self, seed):
+        before = Film.objects.order_by('-id').values_list('id', flat=True).first()
+        call_command('seed_films', 30, seed=seed, batch_size=7, stdout=StringIO())
+        return list(Film.objects.filter(id__gt=before).order_by('id')
+                    .values_list('name', 'description', 'publication_date', 'note'))
+
+    def test_seed_is_deterministic(self):
+        films = self.seeded_films(seed=42)
+        self.assertEqual(len(films), 30)
+        self.assertEqual(self.seeded_films(seed=42), films)
+        self.assertNotEqual(self.seeded_films(seed=43), films)
+
+        # Nor does the catalogue depend on the day of the seeding
+        class NextYear(datetime.date):
+            @classmethod
+            def today(cls):
+                return super().today() + datetime.timedelta(days=365)
+
+        with mock.patch('films.seeding.datetime.date', NextYear):
+            self.assertEqual(self.seeded_films(seed=42), films)
+
+    def test_seeded_films_have_categories_and_are_indexed(self):
+        self.seeded_films(seed=1)
+        seeded = Film.objects.order_by('-id')[:30]
+        for film in seeded:
+            self.assertTrue(1 <= film.categories.count() <= 4)
+        self.assertIn(seeded[0], search_films(Film.objects.all(), q=seeded[0].name.split()[0]))
+
+        # The ids assigned by the seeding are not reused
+        film = Film.objects.create(name="After seeding", description="", publication_date="2024-04-23")
+        self.assertGreater(film.id, seeded[0].id)
+
+
+class TransferTest(FilmsTestCase):
+    """
+    The export_films and import_films commands round-trip the catalogue, and an interrupted import
+    resumes after its last committed chunk.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, name):
+        path = f"{self.directory}/{name}"
+        call_command('export_films', path, chunk_size=30, stdout=StringIO())
+        return path
+
+    def import_file(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_films', path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def catalogue(self):
+        return {(film.name, film.publication_date): (film.description, film.note,
+                                                     sorted(category.name for category in film.categories.all()))
+                for film in Film.objects.prefetch_related('categories')}
+
+    def test_export_writes_the_documents(self):
+        path = self.export('films.jsonl')
+        with open(path, encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        film = with_categories(Film.objects.all()).get(id=lines[0]["id"])
+        self.assertEqual(len(lines), Film.objects.count())
+        self.assertEqual(lines[0], json.loads(json.dumps(serialize_film(film), cls=DjangoJSONEncoder)))
+
+    def test_round_trip(self):
+        for name in ['films.jsonl', 'films.csv']:
+            expected = self.catalogue()
+            path = self.export(name)
+            deleted = Film.objects.order_by('id')[:3]
+            Film.objects.filter(id__in=[film.id for film in deleted]).delete()
+            changed = Film.objects.order_by('id').first()
+            changed.note = None if changed.note else 5
+            changed.save()
+            changed.categories.clear()
+
+            stdout, stderr = self.import_file(path, chunk_size=40)
+            self.assertIn("3 created, 1 updated", stdout)
+            self.assertEqual(stderr, "")
+            self.assertEqual(self.catalogue(), expected)
+
+            # A second import changes nothing
+            stdout, stderr = self.import_file(path)
+            self.assertIn(f"0 created, 0 updated, {len(expected)} unchanged", stdout)
+
+    def test_invalid_records_and_new_categories(self):
+        path = f"{self.directory}/films.jsonl"
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({"name": "Imported", "description": "Description", "publication_date": "2001-02-03",
+                                   "note": 4, "categories": ["New category", {"name": Category.objects.first().name}]}))
+            file.write("\n{not json\n\n")
+            file.write(json.dumps({"name": "Undated", "description": "Description", "categories": []}) + "\n")
+
+        stdout, stderr = self.import_file(path)
+        self.assertIn("1 created, 0 updated, 0 unchanged, 2 invalid", stdout)
+        self.assertIn("Line 2: record: Invalid JSON", stderr)
+        self.assertIn("Line 4: publication_date:", stderr)
+        film = Film.objects.get(name="Imported")
+        self.assertEqual(sorted(film.categories.values_list('name', flat=True)),
+                         sorted(["New category", Category.objects.first().name]))
+        self.assertIn("New category", get_registry().ids)
+
+    def test_interrupted_import_resumes_after_the_last_committed_chunk(self):
+        expected = self.catalogue()
+        path = self.export('films.jsonl')
+        Film.objects.all().delete()
+
+        import_chunk = transfer.import_chunk
+        calls = []
+
+        def crash_on_third_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError("Crash")
+            return import_chunk(*args, **kwargs)
+
+        with mock.patch('films.transfer.import_chunk', side_effect=crash_on_third_chunk):
+            with self.assertRaises(RuntimeError):
+                self.import_file(path, chunk_size=25)
+        self.assertEqual(Film.objects.count(), 50)
+        self.assertEqual(ImportCheckpoint.objects.get().position, 50)
+
+        stdout, stderr = self.import_file(path, chunk_size=25)
+        self.assertIn(f"{len(expected) - 50} created, 0 updated, 0 unchanged, 0 invalid, 50 skipped", stdout)
+        self.assertEqual(self.catalogue(), expected)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+
+class MultiGetTest(FilmsTestCase):
+    """
+    The ids parameter of the film list returns the films asked for in a single query, in the order given.
+    """
+
+    def multi_get(self, ids, headers=None, **params):
+        return self.client.get(reverse('film-list'), {'ids': ','.join(map(str, ids)), **params}, headers=headers)
+
+    def test_films_in_request_order(self):
+        first, second, third = Film.objects.order_by('id')[:3]
+        response = self.multi_get([third.id, first.id, 999999, second.id, first.id])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        listed = self.client.get(reverse('film-list'), {'page_size': 3}).json()["results"]
+        self.assertEqual(results[0], listed[2])
+        self.assertEqual([film["id"] for film in results], [third.id, first.id, 999999, second.id])
+        self.assertEqual(results[2], {"id": 999999, "error": "Film not found"})
+        self.assertEqual([category["id"] for category in results[1]["categories"]],
+                         sorted(first.categories.values_list('id', flat=True)))
+        self.assertNotIn("pagination", response.json())
+
+    def test_same_queries_whatever_the_number_of_ids(self):
+        ids = list(Film.objects.values_list('id', flat=True))
+        for params in [{}, {'fields': 'name'}]:
+            with CaptureQueriesContext(connection) as few:
+                self.multi_get(ids[:2], **params)
+            with CaptureQueriesContext(connection) as many:
+                self.multi_get(ids[:50], **params)
+            self.assertEqual(len(few), len(many))
+
+    def test_sparse_fields_and_xml(self):
+        first, second = Film.objects.order_by('id')[:2]
+        results = self.multi_get([second.id, first.id], fields='name', include='').json()["results"]
+        self.assertEqual(results, [{"name": second.name}, {"name": first.name}])
+
+        response = self.multi_get([second.id, first.id], headers={'accept': 'application/xml'})
+        content = response.content.decode()
+        self.assertLess(content.index(f'pk="{second.id}"'), content.index(f'pk="{first.id}"'))
+
+    @override_settings(FILMS_MAX_PAGE_SIZE=2)
+    def test_invalid_ids(self):
+        self.assertEqual(self.multi_get(['1', 'x']).status_code, 400)
+        response = self.multi_get([1, 2, 3])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Too many ids (at most 2)"})
+
+
+class BatchTest(FilmsTestCase):
+    """
+    Read requests of a batch are answered as they would be on their own, in a single round trip.
+    """
+
+    def batch(self, requests, **extra):
+        return self.client.post(reverse('batch'), json.dumps(requests), content_type='application/json', **extra)
+
+    def test_sub_requests(self):
+        film = Film.objects.first()
+        paths = [
+            reverse('get_film', kwargs={'film_id': film.id}),
+            reverse('get_categories_of_film', kwargs={'film_id': film.id}),
+            reverse('film-list') + f'?ids={film.id},999999',
+            reverse('get_film', kwargs={'film_id': 999999}),
+        ]
+        response = self.batch({"requests": [{"path": path} for path in paths]})
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()["responses"]
+        for path, sub_response in zip(paths, responses):
+            expected = self.client.get(path)
+            self.assertEqual(sub_response["status"], expected.status_code)
+            self.assertEqual(sub_response["body"], expected.json())
+        self.assertEqual(responses[0]["headers"]["ETag"], self.client.get(paths[0], HTTP_ACCEPT='application/json')["ETag"])
+
+    def test_invalid_sub_requests(self):
+        film = Film.objects.first()
+        responses = self.batch([
+            {"path": reverse('delete_film', kwargs={'film_id': film.id}), "method": "DELETE"},
+            {"path": "/nowhere/"},
+            {"path": reverse('batch')},
+            {"path": reverse('film-list') + '?stream=true'},
+            "films",
+        ]).json()["responses"]
+        self.assertEqual([sub_response["status"] for sub_response in responses], [405, 404, 400, 400, 400])
+
+    def test_only_read_routes_are_batched(self):
+        film = Film.objects.first()
+        responses = self.batch([
+            {"path": reverse('admin:index')},
+            {"path": reverse('admin:password_change')},
+            {"path": reverse('delete_film', kwargs={'film_id': film.id})},
+            {"path": reverse('bulk_delete_films')},
+            {"path": reverse('metrics')},
+            {"path": reverse('year-stats')},
+        ]).json()["responses"]
+        self.assertEqual([sub_response["status"] for sub_response in responses], [400, 400, 400, 400, 400, 200])
+        self.assertEqual(responses[0]["body"], {"error": "Only the read requests of the API can be batched"})
+        self.assertTrue(Film.objects.filter(id=film.id).exists())
+        self.assertTrue(Film.objects.filter(id=film.id).exists())
+
+    @override_settings(FILMS_MAX_BATCH_REQUESTS=2)
+    def test_invalid_batches(self):
+        self.assertEqual(self.client.get(reverse('batch')).status_code, 400)
+        self.assertEqual(self.batch({"paths": []}).status_code, 400)
+        self.assertEqual(self.batch([{"path": reverse('category-list')}] * 3).status_code, 400)
+
+    @override_settings(FILMS_READ_DATABASE='default')
+    def test_sub_requests_read_from_the_read_database(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Film))
+        with read_only_queries():
+            self.assertEqual(router.db_for_read(Film), 'default')
+
+
+@override_settings(FILMS_RATE_LIMITS={'read': (0.001, 2), 'expensive': (0.001, 3), 'write': (0.001, 1)},
+                   FILMS_MAX_EXPENSIVE_REQUESTS=None)
+class ThrottlingTest(FilmsTestCase):
+    """
+    Per client rate limits, cap on the expensive requests in flight and largest page size.
+    """
+
+    def setUp(self):
+        super().setUp()
+        get_store().clear()
+
+    def test_route_classes(self):
+        factory = RequestFactory()
+        self.assertEqual(route_class(factory.get(reverse('film-list'))), 'expensive')
+        self.assertEqual(route_class(factory.get(reverse('category-films', args=[1]))), 'expensive')
+        self.assertEqual(route_class(factory.get(reverse('get_film', args=[1]))), 'read')
+        self.assertEqual(route_class(factory.get('/nowhere/')), 'read')
+        self.assertEqual(route_class(factory.post(reverse('create_film'))), 'write')
+        self.assertEqual(route_class(factory.post(reverse('batch'))), 'expensive')
+
+    def test_rate_limit_per_client_and_route_class(self):
+        url = reverse('get_film', args=[Film.objects.first().id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(response.json(), {"error": "Too many requests"})
+
+        # The other route classes and the other clients have their own buckets
+        self.assertEqual(self.client.get(reverse('film-list')).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_client_key_behind_proxies(self):
+        factory = RequestFactory()
+        request = factory.get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2, 3.3.3.3')
+        self.assertEqual(client_key(request), '10.0.0.1')
+        with self.settings(FILMS_TRUSTED_PROXIES=1):
+            self.assertEqual(client_key(request), '3.3.3.3')
+            # Requests that did not go through the proxy
+            self.assertEqual(client_key(factory.get('/', REMOTE_ADDR='10.0.0.1')), '10.0.0.1')
+        with self.settings(FILMS_TRUSTED_PROXIES=2, FILMS_CLIENT_ADDRESS_HEADER='HTTP_X_REAL_IP'):
+            self.assertEqual(client_key(factory.get('/', HTTP_X_REAL_IP='1.1.1.1,2.2.2.2')), '1.1.1.1')
+
+    @override_settings(FILMS_TRUSTED_PROXIES=1)
+    def test_clients_behind_a_proxy_have_their_own_buckets(self):
+        url = reverse('get_film', args=[Film.objects.first().id])
+        for index in range(2):
+            self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='1.1.1.1').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='1.1.1.1').status_code, 429)
+        # A client cannot escape its limits by prepending addresses
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='9.9.9.9, 1.1.1.1').status_code, 429)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='2.2.2.2').status_code, 200)
+
+    @override_settings(FILMS_RATE_LIMITS=None, FILMS_MAX_EXPENSIVE_REQUESTS=1)
+    def test_expensive_requests_in_flight(self):
+        stream = self.client.get(reverse('film-list'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(stream.status_code, 200)
+
+        # The place of the streamed response is only released once it is sent
+        response = self.client.get(reverse('film-list'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.client.get(reverse('get_film', args=[Film.objects.first().id])).status_code, 200)
+
+        stream.getvalue()
+        self.assertEqual(self.client.get(reverse('film-list')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('film-list')).status_code, 200)
+
+    @override_settings(FILMS_RATE_LIMITS=None, FILMS_MAX_EXPENSIVE_REQUESTS=1)
+    def test_async_expensive_requests_in_flight(self):
+        middleware = ThrottlingMiddleware(sync_to_async(lambda request: HttpResponse()))
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get(reverse('film-list'))
+        self.assertEqual(async_to_sync(middleware)(request).status_code, 200)
+        self.assertEqual(async_to_sync(middleware)(request).status_code, 200)
+
+    @override_settings(FILMS_MAX_PAGE_SIZE=5)
+    def test_page_size_is_clamped(self):
+        response = self.client.get(reverse('film-list'), {'page_size': 100000})
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertEqual(response.json()["pagination"]["total_pages"], -(-Film.objects.count() // 5))
+
+        response = self.client.get(reverse('film-list'), {'page_size': 100000, 'cursor': ''})
+        self.assertEqual(response.json()["pagination"]["page_size"], 5)
+        self.assertEqual(len(response.json()["results"]), 5)
+
+        response = self.client.get(reverse('film-list'), {'page_size': 'many'})
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_sqlite_store_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/throttling.sqlite3"
+            first, second = SQLiteStore(path), SQLiteStore(path)
+
+            self.assertEqual(first.take('client', 1.0, 2, now=100.0), 0)
+            self.assertEqual(second.take('client', 1.0, 2, now=100.0), 0)
+            self.assertAlmostEqual(first.take('client', 1.0, 2, now=100.5), 0.5)
+            self.assertEqual(second.take('client', 1.0, 2, now=101.0), 0)
+
+            lease = first.acquire('in-flight', 1, now=100.0)
+            self.assertIsNotNone(lease)
+            self.assertIsNone(second.acquire('in-flight', 1, now=100.0))
+            second.release('in-flight', lease)
+            self.assertIsNotNone(second.acquire('in-flight', 1, now=100.0))
+
+    def test_full_buckets_are_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stores = [MemoryStore(), SQLiteStore(f"{directory}/throttling.sqlite3")]
+            for store in stores:
+                self.assertEqual(store.take('gone', 1.0, 2, now=100.0), 0)
+                self.assertEqual(store.take('still limited', 0.01, 2, now=100.0), 0)
+                self.assertEqual(store.take('still limited', 0.01, 2, now=100.0), 0)
+
+                # By then the first bucket is full again, the second is not
+                self.assertEqual(store.take('other', 1.0, 2, now=100.0 + SWEEP_INTERVAL), 0)
+                if isinstance(store, MemoryStore):
+                    keys = set(store.buckets)
+                else:
+                    with store.connection() as connection:
+                        keys = {key for (key,) in connection.execute("SELECT key FROM buckets")}
+                self.assertEqual(keys, {'still limited', 'other'})
+
+    def test_forgotten_leases_expire(self):
+        store = MemoryStore()
+        self.assertIsNotNone(store.acquire('in-flight', 1, now=0.0))
+        self.assertIsNone(store.acquire('in-flight', 1, now=1.0))
+        self.assertIsNotNone(store.acquire('in-flight', 1, now=10000.0))
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is specific to SQLite")
+class QueryPlanTest(FilmsTestCase):
+    """
+    The queries of the film lists are answered from indexes rather than by scanning and sorting.
+    """
+
+    def test_film_list_page_needs_no_sort(self):
+        self.assertNotIn("TEMP B-TREE", Film.objects.all()[10:20].explain())
+
+    def test_publication_date_ordering_uses_index(self):
+        for ordering in (['publication_date', 'id'], ['-publication_date', '-id']):
+            plan = Film.objects.order_by(*ordering)[:10].explain()
+            self.assertIn("USING INDEX films_pub_date_id_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_note_and_name_lookups_use_indexes(self):
+        self.assertIn("SEARCH films_film USING INDEX films_note_idx", Film.objects.filter(note=4).explain())
+        self.assertIn("SEARCH films_film USING INDEX films_name_idx", Film.objects.filter(name="Jane Doe").explain())
+
+    def test_films_of_category_use_index(self):
+        category = Category.objects.first()
+        plan = category.film_set.all()[:10].explain()
+        self.assertIn("USING COVERING INDEX films_film_categories_category_film_idx (category_id=?)", plan)
+        self.assertNotIn("SCAN", plan)
+
+
+@skipUnless(connection.vendor == 'sqlite', "The production profile tunes SQLite")
+class ProductionDatabaseTest(FilmsTestCase):
+    """
+    The SQLite tuning and the read/write split of the production settings profile.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = {**settings_production.DATABASE_SETTINGS, 'NAME': f"{directory.name}/db.sqlite3"}
+
+        # Connections to a file database, one per thread, as in production
+        for alias in ('stress', 'stress_replica'):
+            connections.settings[alias] = connections.configure_settings({'default': database})['default']
+            self.addCleanup(connections.settings.pop, alias)
+            self.addCleanup(self.remove_connection, alias)
+
+        settings = self.settings(FILMS_SQLITE_PRAGMAS=settings_production.FILMS_SQLITE_PRAGMAS,
+                                 FILMS_READ_ONLY_DATABASES=('stress_replica',),
+                                 FILMS_SQLITE_IMMEDIATE_TRANSACTIONS=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        with connections['stress'].schema_editor() as editor:
+            editor.create_model(Category)
+            editor.create_model(Film)
+        self.categories = Category.objects.using('stress').bulk_create([Category(name=f"Category {index}")
+                                                                         for index in range(5)])
+
+    def remove_connection(self, alias):
+        connections[alias].close()
+        del connections[alias]
+
+    def test_pragmas(self):
+        with connections['stress'].cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        with self.assertRaisesMessage(OperationalError, "readonly"):
+            Category.objects.using('stress_replica').create(name="Write on the replica")
+        self.assertEqual(Category.objects.using('stress_replica').count(), 5)
+
+    def test_immediate_transactions(self):
+        for alias, begin in (('stress', "BEGIN IMMEDIATE"), ('stress_replica', "BEGIN")):
+            with CaptureQueriesContext(connections[alias]) as context, transaction.atomic(using=alias):
+                Category.objects.using(alias).count()
+            self.assertEqual(context.captured_queries[0]['sql'], begin)
+
+    def test_concurrent_reads_and_writes(self):
+        writers, readers, iterations = 4, 4, 25
+        errors = []
+
+        def write(index):
+            for iteration in range(iterations):
+                # Read then write in the same transaction, as update_film does
+                with transaction.atomic(using='stress'):
+                    Film.objects.using('stress').filter(note__gte=3).count()
+                    # Bulk creations, which send no signal the handlers of would write to the test database
+                    film, = Film.objects.using('stress').bulk_create([
+                        Film(name=f"Film {index}-{iteration}", description="", publication_date="2024-04-23", note=3)])
+                    Film.categories.through.objects.using('stress').bulk_create([
+                        Film.categories.through(film_id=film.id, category_id=self.categories[iteration % 5].id)])
+
+        def read(index):
+            for iteration in range(iterations * 2):
+                list(with_categories(Film.objects.using('stress_replica').order_by('-id'))[:20])
+
+        def run(target, index):
+            try:
+                target(index)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(write, index)) for index in range(writers)]
+        threads += [threading.Thread(target=run, args=(read, index)) for index in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Film.objects.using('stress').count(), writers * iterations)
+        self.assertEqual(Film.categories.through.objects.using('stress').count(), writers * iterations)
+
+    def test_router(self):
+        router = ReadReplicaRouter()
+        reads = {}
+
+        def view(request):
+            reads[request.method] = router.db_for_read(Film)
+            return None
+
+        middleware = ReadReplicaMiddleware(view)
+        with self.settings(FILMS_READ_DATABASE='stress_replica'):
+            middleware(RequestFactory().get('/'))
+            middleware(RequestFactory().post('/'))
+        self.assertEqual(reads, {'GET': 'stress_replica', 'POST': None})
+        self.assertEqual(router.db_for_write(Film), 'default')
+        self.assertIsNone(router.db_for_read(Film))
+
+    def test_requests_read_from_the_replica(self):
+        # A read-only connection to the test database, as the replica of the production profile
+        connections.settings['test_replica'] = {**connection.settings_dict}
+        self.addCleanup(connections.settings.pop, 'test_replica')
+        self.addCleanup(self.remove_connection, 'test_replica')
+        category = Category.objects.first()
+
+        with self.settings(MIDDLEWARE=settings_production.MIDDLEWARE,
+                           DATABASE_ROUTERS=settings_production.DATABASE_ROUTERS,
+                           FILMS_READ_DATABASE='test_replica', FILMS_READ_ONLY_DATABASES=('test_replica',)):
+            with CaptureQueriesContext(connections['test_replica']) as reads, \
+                    CaptureQueriesContext(connection) as default_reads:
+                self.assertEqual(self.client.get(reverse('film-list')).status_code, 200)
+                self.assertEqual(self.client.get(reverse('category-films', args=[category.id])).status_code, 200)
+            self.assertTrue(reads.captured_queries)
+            self.assertEqual(default_reads.captured_queries, [])
+
+            with CaptureQueriesContext(connections['test_replica']) as reads:
+                response = self.client.post(reverse('create_film'), json.dumps({
+                    "name": "Written", "description": "", "publication_date": "2024-04-23", "categories": [category.id],
+                }), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(reads.captured_queries, [])
+        self.assertTrue(Film.objects.filter(name="Written").exists())
@@ -0,0 +1,351 @@
+"""
+Admission control: per client rate limits and a cap on the expensive requests in flight, so that a
+single client, or a burst of exports, cannot starve the other requests.
+
+Every request falls in a route class: 'expensive' for the routes of FILMS_EXPENSIVE_ROUTES (the film
+lists and exports, and the batches of requests), 'write' for the other requests whose method is not GET
+or HEAD, 'read' for the others. Each client (its address) has a token bucket per class, refilled at the
+rate of FILMS_RATE_LIMITS: a request without a token is answered 429 Too Many Requests, with a
+Retry-After header telling when the next token comes. At most FILMS_MAX_EXPENSIVE_REQUESTS expensive
+requests are served at a time, whoever the clients are; the others are answered 503 Service
+Unavailable.
+
+The buckets and the requests in flight are kept in memory, per process, unless FILMS_THROTTLING_DATABASE
+names a SQLite file (e.g. on a RAM disk such as /dev/shm) shared by the worker processes, so that the
+limits hold across them.
+"""
+import math
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+# Refill rate (tokens per second) and capacity (burst) of the token buckets of the route classes,
+# unless overridden by the FILMS_RATE_LIMITS setting. A class missing from the setting is not limited.
+DEFAULT_RATE_LIMITS = {
+    'read': (20.0, 100),
+    'expensive': (2.0, 20),
+    'write': (5.0, 20),
+}
+
+# Route names of the requests of the 'expensive' class, unless overridden by the FILMS_EXPENSIVE_ROUTES
+# setting. A batch counts as a single request, however many sub-requests it runs.
+DEFAULT_EXPENSIVE_ROUTES = ('film-list', 'category-films', 'batch')
+
+# Number of expensive requests served at a time, unless overridden by the FILMS_MAX_EXPENSIVE_REQUESTS
+# setting (None for no limit)
+DEFAULT_MAX_EXPENSIVE_REQUESTS = 8
+
+# Number of reverse proxies in front of the application, each appending the address it received the
+# request from to the header of the FILMS_CLIENT_ADDRESS_HEADER setting, unless overridden by the
+# FILMS_TRUSTED_PROXIES setting. With none, the clients are identified by the address of the connection.
+DEFAULT_TRUSTED_PROXIES = 0
+DEFAULT_CLIENT_ADDRESS_HEADER = 'HTTP_X_FORWARDED_FOR'
+
+# Seconds after which a request in flight is forgotten, should its worker die without releasing it
+LEASE_DURATION = 300
+
+# Seconds between two removals of the buckets that have filled up again, which a client without a
+# bucket gets anyway, so that the stores do not grow with every client ever seen
+SWEEP_INTERVAL = 60
+
+
+def route_class(request):
+    """
+    Return the route class of a request: 'expensive', 'write' or 'read'.
+    """
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        url_name = None
+    if url_name in getattr(settings, 'FILMS_EXPENSIVE_ROUTES', DEFAULT_EXPENSIVE_ROUTES):
+        return 'expensive'
+    return 'write' if request.method not in ('GET', 'HEAD') else 'read'
+
+
+def client_key(request):
+    """
+    Return the identifier of the client of a request: its address.
+
+    Behind FILMS_TRUSTED_PROXIES reverse proxies, it is the address the outermost of them received the
+    request from, read from the header they append to: the addresses before it are given by the
+    client, which could change them at will.
+    """
+    proxies = getattr(settings, 'FILMS_TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES)
+    if proxies:
+        header = getattr(settings, 'FILMS_CLIENT_ADDRESS_HEADER', DEFAULT_CLIENT_ADDRESS_HEADER)
+        addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+class MemoryStore:
+    """
+    Token buckets and requests in flight of the current process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.leases = {}
+        self.swept = 0.0
+
+    def take(self, key, rate, capacity, now):
+        """
+        Take a token from the bucket of key, and return 0 if there was one, or the number of seconds
+        until there is one otherwise.
+        """
+        with self.lock:
+            if now - self.swept >= SWEEP_INTERVAL:
+                self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+                self.swept = now
+            tokens, updated, full = self.buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return wait
+
+    def acquire(self, key, limit, now):
+        """
+        Start a request of key unless limit of them are in flight, and return its lease, or None.
+        """
+        with self.lock:
+            leases = self.leases.setdefault(key, {})
+            for lease, expires in list(leases.items()):
+                if expires <= now:
+                    del leases[lease]
+            if len(leases) >= limit:
+                return None
+            lease = uuid4().hex
+            leases[lease] = now + LEASE_DURATION
+            return lease
+
+    def release(self, key, lease):
+        with self.lock:
+            self.leases.get(key, {}).pop(lease, None)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.leases.clear()
+
+
+class SQLiteStore:
+    """
+    Token buckets and requests in flight shared by the processes using the same SQLite file.
+
+    Each operation is a single short transaction on a connection of the calling thread. Each process
+    removes the full buckets every SWEEP_INTERVAL seconds.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.swept = 0.0
+        with self.connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets "
+                               "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS buckets_full ON buckets (full)")
+            connection.execute("CREATE TABLE IF NOT EXISTS leases "
+                               "(lease TEXT PRIMARY KEY, key TEXT NOT NULL, expires REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS leases_key ON leases (key, expires)")
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # Autocommit mode, the transactions being started explicitly
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            self.local.connection = connection
+        return _Transaction(connection)
+
+    def take(self, key, rate, capacity, now):
+        with self.connection() as connection:
+            if now - self.swept >= SWEEP_INTERVAL:
+                connection.execute("DELETE FROM buckets WHERE full <= ?", (now,))
+                self.swept = now
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+            connection.execute(
+                "INSERT INTO buckets (key, tokens, updated, full) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                "full = excluded.full",
+                (key, tokens, now, now + (capacity - tokens) / rate),
+            )
+            return wait
+
+    def acquire(self, key, limit, now):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM leases WHERE key = ? AND expires <= ?", (key, now))
+            (count,) = connection.execute("SELECT COUNT(*) FROM leases WHERE key = ?", (key,)).fetchone()
+            if count >= limit:
+                return None
+            lease = uuid4().hex
+            connection.execute("INSERT INTO leases (lease, key, expires) VALUES (?, ?, ?)",
+                               (lease, key, now + LEASE_DURATION))
+            return lease
+
+    def release(self, key, lease):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM leases WHERE lease = ?", (lease,))
+
+    def clear(self):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM buckets")
+            connection.execute("DELETE FROM leases")
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock at once, so that concurrent processes read and update a
+    # bucket one after the other
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the store of the buckets and requests in flight configured by FILMS_THROTTLING_DATABASE.
+    """
+    path = getattr(settings, 'FILMS_THROTTLING_DATABASE', None)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = MemoryStore() if path is None else SQLiteStore(path)
+        return _stores[path]
+
+
+def _retry_after(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+class Admission:
+    """
+    The admission of a request: the response refusing it, or the lease to release once it is served.
+    """
+
+    def __init__(self, response=None, lease=None):
+        self.response = response
+        self.lease = lease
+
+    def release(self):
+        if self.lease is not None:
+            get_store().release('in-flight:expensive', self.lease)
+            self.lease = None
+
+
+def admit(request):
+    """
+    Decide whether a request is served, taking a token from the bucket of its client and class and, for
+    an expensive request, a place among the requests in flight.
+    """
+    store = get_store()
+    kind = route_class(request)
+    now = time.time()
+
+    limits = getattr(settings, 'FILMS_RATE_LIMITS', DEFAULT_RATE_LIMITS) or {}
+    if kind in limits:
+        rate, capacity = limits[kind]
+        wait = store.take(f"bucket:{kind}:{client_key(request)}", rate, capacity, now)
+        if wait:
+            response = JsonResponse({"error": "Too many requests"}, status=429)
+            response['Retry-After'] = _retry_after(wait)
+            return Admission(response)
+
+    max_in_flight = getattr(settings, 'FILMS_MAX_EXPENSIVE_REQUESTS', DEFAULT_MAX_EXPENSIVE_REQUESTS)
+    if kind == 'expensive' and max_in_flight is not None:
+        lease = store.acquire('in-flight:expensive', max_in_flight, now)
+        if lease is None:
+            response = JsonResponse({"error": "Too many requests in progress, try again later"}, status=503)
+            response['Retry-After'] = _retry_after(1)
+            return Admission(response)
+        return Admission(lease=lease)
+    return Admission()
+
+
+def _release_after(admission, chunks):
+    try:
+        yield from chunks
+    finally:
+        admission.release()
+
+
+async def _arelease_after(admission, chunks):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await sync_to_async(admission.release)()
+
+
+class ThrottlingMiddleware:
+    """
+    Refuse the requests over the rate limits of their client, and the expensive requests over the
+    number allowed in flight, with admit().
+
+    The place of an expensive streamed response is released once it is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        admission = admit(request)
+        if admission.response is not None:
+            return admission.response
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            admission.release()
+            raise
+        return self.finish(admission, response)
+
+    async def __acall__(self, request):
+        admission = await sync_to_async(admit)(request)
+        if admission.response is not None:
+            return admission.response
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(admission.release)()
+            raise
+        if admission.lease is not None and not response.streaming:
+            await sync_to_async(admission.release)()
+        return self.finish(admission, response)
+
+    def finish(self, admission, response):
+        if admission.lease is None:
+            return response
+        if not response.streaming:
+            admission.release()
+        elif response.is_async:
+            response.streaming_content = _arelease_after(admission, response.streaming_content)
+        else:
+            response.streaming_content = _release_after(admission, response.streaming_content)
+        return response
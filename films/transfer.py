@@ -0,0 +1,279 @@
+"""
+Export and import of the film catalogue, as JSON Lines or CSV files (the export_films and import_films
+commands).
+
+A JSON Lines file holds a film per line, as the API represents it without its links (the stored
+documents of films.documents): id, name, description, publication_date, note and categories, a list of
+{"id", "name"} objects. A CSV file has the same columns, the names of the categories being separated by
+"|". The ids are those of the exporting database: the import identifies the films by their natural
+key, their name and publication date, and the categories by their name.
+
+Both run in chunks, so that their memory does not depend on the size of the catalogue. The export
+reads the documents through a server-side cursor. The import commits every chunk in its own
+transaction, along with its ImportCheckpoint: an interrupted import of the same file starts again
+after the last committed chunk.
+"""
+import csv
+import json
+import os
+from collections import Counter, defaultdict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from films.bulk import FILM_FIELDS, bulk_batch_size, link_categories
+from films.categories import get_registry
+from films.documents import film_documents, with_documents
+from films.models.Category import Category
+from films.models.Film import Film
+from films.models.ImportCheckpoint import ImportCheckpoint
+from films.signals import films_bulk_saved
+
+FORMATS = ('jsonl', 'csv')
+
+# Number of films read or written per chunk, unless overridden by the --chunk-size option of the commands
+DEFAULT_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = ('id',) + FILM_FIELDS + ('categories',)
+CATEGORY_SEPARATOR = '|'
+
+
+def detect_format(path):
+    """
+    Return the format of a file from its extension, JSON Lines unless it is .csv.
+    """
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def export_documents(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the JSON documents of all the films, by id, fetched chunk_size at a time.
+    """
+    films = with_documents(Film.objects.order_by('id')).only('id', 'document__document')
+    for film in films.iterator(chunk_size=chunk_size):
+        document = getattr(film, 'document', None)
+        yield document.document if document is not None else film_documents([film.id])[film.id]
+
+
+def export_films(out, format='jsonl', chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Write all the films to the text file out, and return their number.
+
+    progress, if given, is called with the number of films written after each chunk.
+    """
+    writer = None
+    if format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+
+    count = 0
+    for document in export_documents(chunk_size):
+        if writer is None:
+            out.write(document + '\n')
+        else:
+            data = json.loads(document)
+            writer.writerow([
+                data['id'], data['name'], data['description'], data['publication_date'],
+                '' if data['note'] is None else data['note'],
+                CATEGORY_SEPARATOR.join(category['name'] for category in data['categories']),
+            ])
+        count += 1
+        if progress and count % chunk_size == 0:
+            progress(count)
+    if progress and count % chunk_size:
+        progress(count)
+    return count
+
+
+class InvalidRecord(ValueError):
+    """
+    Raised for a record of an imported file that is not a valid film, with the errors of its fields.
+    """
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{field}: {' '.join(messages)}" for field, messages in errors.items()))
+        self.errors = errors
+
+
+def read_records(file, format='jsonl'):
+    """
+    Yield the (line number, record) pairs of an imported text file, a record being a dict of the
+    values of a film, or an InvalidRecord if it cannot be decoded.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            categories = row.get('categories') or ''
+            yield reader.line_num, {
+                **{field: row.get(field) for field in FILM_FIELDS},
+                'note': row.get('note') or None,
+                'categories': [name for name in categories.split(CATEGORY_SEPARATOR) if name],
+            }
+        return
+
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            yield number, InvalidRecord({"record": [f"Invalid JSON: {error}"]})
+
+
+def category_names(value):
+    """
+    Return the names of the categories of a record, given as names or as {"name": ...} objects.
+    """
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise InvalidRecord({"categories": ["Expected a list of categories"]})
+    names = []
+    for category in value:
+        name = category.get('name') if isinstance(category, dict) else category
+        if not isinstance(name, str) or not name.strip():
+            raise InvalidRecord({"categories": ["Expected category names"]})
+        names.append(name.strip())
+    return names
+
+
+def parse_record(record):
+    """
+    Return the unsaved film and the category names of a record, raising InvalidRecord if it is invalid.
+    """
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord({"record": ["Expected a JSON object"]})
+
+    film = Film(**{field: record.get(field) for field in FILM_FIELDS})
+    try:
+        film.full_clean(exclude=['categories'])
+    except ValidationError as error:
+        raise InvalidRecord(error.message_dict)
+    return film, category_names(record.get('categories'))
+
+
+def resolve_categories(names):
+    """
+    Return the ids of the categories of the given names, by name, creating the missing ones.
+    """
+    ids = dict(get_registry().ids)
+    for name in sorted(set(names) - ids.keys()):
+        ids[name] = Category.objects.create(name=name).id
+    return ids
+
+
+def import_chunk(records, checkpoint=None, on_error=None):
+    """
+    Create or update the films of a chunk of (line number, record) pairs, identified by their name and
+    publication date, and return the counts of created, updated, unchanged and invalid records.
+
+    The films and their categories are written in a single transaction, in which checkpoint, if given,
+    is called. on_error, if given, is called with the line number and the InvalidRecord of every
+    invalid record, which is skipped.
+    """
+    counts = Counter()
+    films = {}
+    for number, record in records:
+        try:
+            film, names = parse_record(record)
+        except InvalidRecord as error:
+            counts['invalid'] += 1
+            if on_error:
+                on_error(number, error)
+            continue
+        # The last record of a film in the chunk wins
+        films[film.name, film.publication_date] = (film, names)
+
+    category_ids = resolve_categories([name for film, names in films.values() for name in names])
+
+    # The existing films with the same natural keys, the first one of any duplicates, and their categories
+    existing = {}
+    for film in Film.objects.filter(name__in={name for name, date in films}).only(*FILM_FIELDS).order_by('id'):
+        existing.setdefault((film.name, film.publication_date), film)
+    existing_categories = defaultdict(set)
+    links = Film.categories.through.objects.filter(film_id__in=[film.id for film in existing.values()])
+    for film_id, category_id in links.values_list('film_id', 'category_id'):
+        existing_categories[film_id].add(category_id)
+
+    created, updated, categorized = [], [], []
+    now = timezone.now()
+    for key, (film, names) in films.items():
+        ids = {category_ids[name] for name in names}
+        current = existing.get(key)
+        if current is None:
+            created.append(film)
+            categorized.append((film, ids))
+        elif (any(getattr(current, field) != getattr(film, field) for field in FILM_FIELDS)
+              or existing_categories[current.id] != ids):
+            for field in FILM_FIELDS:
+                setattr(current, field, getattr(film, field))
+            current.updated_at = now
+            updated.append(current)
+            categorized.append((current, ids))
+        else:
+            counts['unchanged'] += 1
+
+    with transaction.atomic():
+        Film.objects.bulk_create(created, batch_size=bulk_batch_size())
+        Film.objects.bulk_update(updated, FILM_FIELDS + ('updated_at',), batch_size=bulk_batch_size())
+        Film.categories.through.objects.filter(film_id__in=[film.id for film in updated]).delete()
+        link_categories([(film.id, category_id) for film, ids in categorized for category_id in sorted(ids)])
+        if created or updated:
+            films_bulk_saved.send(sender=Film, films=created + updated)
+        if checkpoint:
+            checkpoint()
+
+    counts['created'] += len(created)
+    counts['updated'] += len(updated)
+    return counts
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def import_films(path, format=None, chunk_size=DEFAULT_CHUNK_SIZE, resume=True, progress=None, on_error=None):
+    """
+    Import the films of a file, chunk_size records at a time, and return the counts of created,
+    updated, unchanged, invalid and skipped records.
+
+    Unless resume is false, the records committed by a previous import of the same unchanged file are
+    skipped. progress, if given, is called with the number of records read and the counts so far after
+    each chunk; on_error is passed to import_chunk().
+    """
+    path = os.path.abspath(path)
+    format = format or detect_format(path)
+    file_fingerprint = fingerprint(path)
+    checkpoint = ImportCheckpoint.objects.filter(source=path, fingerprint=file_fingerprint).first()
+    skip = checkpoint.position if resume and checkpoint else 0
+
+    counts = Counter(skipped=0)
+    position, chunk = 0, []
+
+    def save_checkpoint():
+        ImportCheckpoint.objects.update_or_create(
+            source=path, defaults={'fingerprint': file_fingerprint, 'position': position})
+
+    def flush():
+        counts.update(import_chunk(chunk, checkpoint=save_checkpoint, on_error=on_error))
+        chunk.clear()
+        if progress:
+            progress(position, counts)
+
+    with open(path, encoding='utf-8', newline='') as file:
+        for record in read_records(file, format):
+            position += 1
+            if position <= skip:
+                counts['skipped'] += 1
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+
+    # Imported in full: a new import of the file starts from the beginning
+    ImportCheckpoint.objects.filter(source=path).delete()
+    return counts
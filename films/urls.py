@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import film_views, category_views
+from .views import film_views, category_views, batch_views, bulk_views, metrics_views, stats_views
 
 urlpatterns = [
     path('films/', film_views.get_films, name='film-list'),
@@ -7,7 +7,15 @@ urlpatterns = [
     path('films/create/', film_views.create_film, name='create_film'),
     path('films/update/<int:film_id>/', film_views.update_film, name='update_film'),
     path('films/delete/<int:film_id>/', film_views.delete_film, name='delete_film'),
+    path('films/bulk/create/', bulk_views.bulk_create_films, name='bulk_create_films'),
+    path('films/bulk/update/', bulk_views.bulk_update_films, name='bulk_update_films'),
+    path('films/bulk/delete/', bulk_views.bulk_delete_films, name='bulk_delete_films'),
     path('categories/', category_views.get_categories, name='category-list'),
     path('films/<int:film_id>/categories/', category_views.get_categories_of_film, name='get_categories_of_film'),
     path('categories/<int:category_id>/films/', category_views.get_films_of_category, name='category-films'),
+    path('batch/', batch_views.batch, name='batch'),
+    path('stats/', stats_views.get_stats, name='stats'),
+    path('stats/categories/', stats_views.get_category_stats, name='category-stats'),
+    path('stats/years/', stats_views.get_year_stats, name='year-stats'),
+    path('_metrics', metrics_views.get_metrics, name='metrics'),
 ]
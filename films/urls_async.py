@@ -0,0 +1,19 @@
+"""
+URLconf of the ASGI deployment profile: the routes of films.urls, with the async versions of the read views.
+"""
+from django.urls import path
+from . import urls
+from .views import async_views
+
+async_views_by_name = {
+    'film-list': async_views.get_films,
+    'get_film': async_views.get_film,
+    'category-list': async_views.get_categories,
+    'get_categories_of_film': async_views.get_categories_of_film,
+    'category-films': async_views.get_films_of_category,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), async_views_by_name.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,144 @@
+"""
+Async versions of the read views, served by the ASGI deployment profile (film_api_project.settings_asgi).
+
+They answer exactly as their sync counterparts of film_views and category_views, with which they share
+the parsing of the requests and the building of the responses, but query the database with the async
+ORM API, so that under ASGI a slow client does not hold a thread.
+"""
+from django.core.serializers import serialize
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from films.cache import CATEGORIES_VERSION, FILM_LIST_VERSION, cache_response, film_version
+from films.categories import aget_registry
+from films.conditional import category_list_state, conditional, film_state
+from films.documents import afilm_detail_document, uses_documents
+from films.filters import InvalidFilter
+from films.models.Film import Film
+from films.models.Category import Category
+from films.pagination import InvalidCursor
+from films.renderers import render_response, select_renderer
+from films.streaming import astream_response, astream_xml, wants_stream
+from films.serializers import DEFAULT_FIELDSET, InvalidFieldset, with_categories, serialize_categories
+from films.views.category_views import (afilm_category_ids, category_film_list, category_films_state,
+                                        category_list_data, film_categories_data)
+from films.views.film_views import (FilmListRequest, film_detail_data, film_list_page_link, film_list_request_state,
+                                    filter_films)
+
+
+@csrf_exempt
+@cache_response(lambda: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+@conditional(film_list_request_state)
+async def get_films(request):
+    """
+    Retrieve paginated details of all films, with optional full-text search by title and/or description,
+    filters on the note, publication date and categories, and ordering, or the films of the ids
+    parameter.
+    """
+    # Parse the fields asked for and the search, filter and ordering query parameters
+    try:
+        film_list = FilmListRequest(request, filter_films(request), film_list_page_link(request), multi_get=True)
+    except (InvalidFieldset, InvalidFilter) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    # Stream the whole list instead of a page when asked for
+    if film_list.stream:
+        return film_list.astream_response()
+
+    # Multi-get: the films of the ids parameter, in a single query, in the order of the ids
+    if film_list.ids is not None:
+        films = await film_list.afetch_multi_get()
+        return film_list.multi_get_response(films, await film_list.aserialize(films))
+
+    try:
+        films, pagination = await film_list.afetch_page()
+    except InvalidCursor as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return film_list.page_response(films, await film_list.aserialize(films), pagination)
+
+
+@csrf_exempt
+@cache_response(lambda film_id: [film_version(film_id), CATEGORIES_VERSION])
+@conditional(film_state)
+async def get_film(request, film_id):
+    """
+    Retrieve details of a specific film.
+    """
+    # Splice the stored document of the film, unless XML is asked for
+    if uses_documents(request, DEFAULT_FIELDSET):
+        document = await afilm_detail_document(film_id)
+        if document is not None:
+            return render_response(request, document)
+
+    try:
+        film = await with_categories(Film.objects.all()).aget(id=film_id)
+
+        # Serialize film data in the format asked for by the Accept header
+        return render_response(request, film_detail_data(film), xml=lambda: serialize('xml', [film]))
+    except Film.DoesNotExist:
+        return JsonResponse({"error": "Film not found"}, status=404)
+
+
+@csrf_exempt
+@cache_response(lambda: [CATEGORIES_VERSION])
+@conditional(category_list_state)
+async def get_categories(request):
+    """
+    Retrieve paginated details of all categories.
+    """
+    # Stream the categories when asked for
+    if wants_stream(request):
+        return astream_response(request, Category.objects.all(), serialize_categories)
+
+    categories = (await aget_registry()).categories
+
+    # Serialize data in the format asked for by the Accept header
+    return render_response(request, category_list_data(categories), xml=lambda: serialize('xml', categories))
+
+
+@csrf_exempt
+@cache_response(lambda film_id: [film_version(film_id), CATEGORIES_VERSION])
+@conditional(film_state)
+async def get_categories_of_film(request, film_id):
+    """
+    Retrieve categories of a specific film.
+    """
+    category_ids = await afilm_category_ids(film_id)
+    if category_ids is None:
+        return JsonResponse({"error": "Film not found"}, status=404)
+    categories = (await aget_registry()).get(category_ids)
+
+    # Serialize data in the format asked for by the Accept header
+    return render_response(request, film_categories_data(film_id, categories),
+                           xml=lambda: serialize('xml', categories))
+
+
+@csrf_exempt
+@cache_response(lambda category_id: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+@conditional(category_films_state)
+async def get_films_of_category(request, category_id):
+    """
+    Retrieve films belonging to a specific category.
+    """
+    # Check the category exists
+    if category_id not in await aget_registry():
+        return JsonResponse({"error": "Category not found"}, status=404)
+
+    # Get the films associated with the category, with the fields asked for
+    try:
+        film_list = category_film_list(request, category_id)
+    except InvalidFieldset as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    # Stream the whole list instead of a page when asked for
+    if film_list.stream:
+        return film_list.astream_response()
+
+    if select_renderer(request).media_type == 'application/xml':
+        # Stream all the films of the category in XML
+        return astream_xml(film_list.streamed_films, fields=film_list.fieldset.xml_fields())
+
+    try:
+        films, pagination = await film_list.afetch_page()
+    except InvalidCursor as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return film_list.page_response(films, await film_list.aserialize(films), pagination)
@@ -0,0 +1,110 @@
+from urllib.parse import urlsplit
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBadRequest, JsonResponse, QueryDict
+from django.urls import Resolver404, resolve
+from django.views.decorators.csrf import csrf_exempt
+from films.database import read_only_queries
+from films.renderers import RawJSON, render_response
+from films.views.bulk_views import parse_items
+
+# Number of sub-requests of a batch, unless overridden by the FILMS_MAX_BATCH_REQUESTS setting
+DEFAULT_MAX_BATCH_REQUESTS = 20
+
+# Names of the routes of films.urls that can be batched, unless overridden by the FILMS_BATCH_ROUTES
+# setting: the read views, which the sub-requests are run with as plain GET requests
+DEFAULT_BATCH_ROUTES = ('film-list', 'get_film', 'category-list', 'get_categories_of_film', 'category-films',
+                        'stats', 'category-stats', 'year-stats')
+
+# Headers of the batch request not passed on to its sub-requests: their responses are embedded in the
+# JSON of the batch, uncompressed and in full
+SUB_REQUEST_EXCLUDED_HEADERS = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH',
+                                'HTTP_IF_MODIFIED_SINCE')
+
+# Headers of the responses of the sub-requests kept in the batch response
+SUB_RESPONSE_HEADERS = ('ETag', 'Last-Modified')
+
+
+def max_batch_requests():
+    return getattr(settings, 'FILMS_MAX_BATCH_REQUESTS', DEFAULT_MAX_BATCH_REQUESTS)
+
+
+def sub_request(request, path, query, resolver_match):
+    """
+    Build a GET request of path, with the query string query, from the headers of a batch request.
+    """
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {key: value for key, value in request.META.items() if key not in SUB_REQUEST_EXCLUDED_HEADERS}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query, HTTP_ACCEPT='application/json')
+    sub.GET = QueryDict(query)
+    sub.resolver_match = resolver_match
+    return sub
+
+
+def sub_response_data(status, body, response=None):
+    data = {"status": status, "body": body}
+    if response is not None:
+        data["headers"] = {name: response[name] for name in SUB_RESPONSE_HEADERS if response.has_header(name)}
+    return data
+
+
+def run_sub_request(request, item):
+    """
+    Run a sub-request of a batch with the view its path resolves to, and return its status, headers and body.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('path'), str) or not item['path'].startswith('/'):
+        return sub_response_data(400, {"error": "Expected an object with a path"})
+    if str(item.get('method', 'GET')).upper() != 'GET':
+        return sub_response_data(405, {"error": "Only GET requests can be batched"})
+
+    url = urlsplit(item['path'])
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return sub_response_data(404, {"error": "Not found"})
+    if match.url_name == 'batch':
+        return sub_response_data(400, {"error": "Batches cannot be nested"})
+    # The view name of the routes of other apps (e.g. the admin) holds their namespace
+    if match.view_name not in getattr(settings, 'FILMS_BATCH_ROUTES', DEFAULT_BATCH_ROUTES):
+        return sub_response_data(400, {"error": "Only the read requests of the API can be batched"})
+
+    sub = sub_request(request, url.path, url.query, match)
+    if iscoroutinefunction(match.func):
+        # The async views of the ASGI profile
+        response = async_to_sync(match.func)(sub, *match.args, **match.kwargs)
+    else:
+        response = match.func(sub, *match.args, **match.kwargs)
+
+    if response.streaming:
+        response.close()
+        return sub_response_data(400, {"error": "Streamed responses cannot be batched"})
+    content = response.content.decode(response.charset)
+    if response.get('Content-Type', '').startswith('application/json'):
+        # Spliced into the batch response as it is
+        return sub_response_data(response.status_code, RawJSON(content), response)
+    return sub_response_data(response.status_code, content, response)
+
+
+@csrf_exempt
+def batch(request):
+    """
+    Run several read requests of the API in a single round trip, one after the other on the same
+    database connection and response cache, and return their responses in order.
+    """
+    if request.method == 'POST':
+        try:
+            items = parse_items(request, 'requests')
+        except ValueError as error:
+            return HttpResponseBadRequest(f"Invalid JSON data: {error}", status=400)
+        if len(items) > max_batch_requests():
+            return JsonResponse({"error": f"Too many requests in the batch (at most {max_batch_requests()})"},
+                                status=400)
+
+        # The sub-requests only read, from the read-only connection of the production profile
+        with read_only_queries():
+            responses = [run_sub_request(request, item) for item in items]
+        return render_response(request, {"responses": responses})
+    else:
+        return HttpResponseBadRequest("Method not allowed", status=400)
@@ -0,0 +1,227 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+import json
+from films.bulk import FILM_FIELDS, bulk_batch_size, delete_films, link_categories
+from films.categories import get_registry
+from films.links import link
+from films.models.Film import Film
+from films.renderers import render_response
+from films.signals import films_bulk_saved
+from films.views.film_views import parse_category_ids
+
+def parse_items(request, key):
+    """
+    Extract the list of items of a bulk request, sent either as a JSON array or as {key: [...]}.
+    """
+    data = json.loads(request.body)
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array or an object with a '{key}' array")
+    return data
+
+
+def existing_category_ids(items):
+    """
+    Return the set of the category ids referenced by the items that exist, from the category registry.
+    """
+    registry = get_registry()
+    # Malformed categories are reported by validate_categories()
+    return {category_id for item in items if isinstance(item, dict)
+            for category_id in parse_category_ids(item.get('categories')) or [] if category_id in registry}
+
+
+def validate_categories(item, category_ids, errors, required):
+    """
+    Check the categories of an item against the existing category ids, adding any problem to errors.
+
+    Return the ids of the categories of the item, or None if it gives none or they are invalid.
+    """
+    if 'categories' not in item:
+        if required:
+            errors['categories'] = ["Categories are required"]
+        return None
+    categories = parse_category_ids(item['categories'])
+    if categories is None:
+        errors['categories'] = ["Categories must be a list of category ids"]
+        return None
+    if not categories and required:
+        errors['categories'] = ["Categories are required"]
+        return None
+    missing = sorted(set(categories) - category_ids)
+    if missing:
+        errors['categories'] = [f"Category not found: {category_id}" for category_id in missing]
+        return None
+    return categories
+
+
+def validate_film(film, errors):
+    """
+    Validate the fields of a film instance, adding any problem to errors.
+    """
+    try:
+        film.full_clean(exclude=['categories'])
+    except ValidationError as error:
+        errors.update(error.message_dict)
+
+
+def film_links(film_id):
+    return {"film": {"href": link('get_film', film_id=film_id)}}
+
+
+@csrf_exempt
+def bulk_create_films(request):
+    """
+    Create several films at once.
+
+    Every film is validated before anything is written: if any film is invalid, nothing is created and
+    the per-film report tells what is wrong. Otherwise all the films and their categories are created in
+    a single transaction.
+    """
+    if request.method == 'POST':
+        try:
+            items = parse_items(request, 'films')
+        except ValueError as error:
+            return HttpResponseBadRequest(f"Invalid JSON data: {error}", status=400)
+
+        # Validate all the films, with a single query for all the categories
+        category_ids = existing_category_ids(items)
+        films, report, valid = [], [], True
+        for index, item in enumerate(items):
+            errors = {}
+            if not isinstance(item, dict):
+                errors['film'] = ["Expected a JSON object"]
+                item = {}
+            film = Film(**{field: item.get(field) for field in FILM_FIELDS})
+            validate_film(film, errors)
+            categories = validate_categories(item, category_ids, errors, required=True)
+
+            films.append((film, categories))
+            if errors:
+                valid = False
+                report.append({"index": index, "status": "invalid", "errors": errors})
+            else:
+                report.append({"index": index, "status": "valid"})
+
+        if not valid:
+            return render_response(request, {"error": "Invalid films, nothing was created", "results": report}, status=400)
+
+        with transaction.atomic():
+            # bulk_create() sets the ids of the films it is given
+            Film.objects.bulk_create([film for film, categories in films], batch_size=bulk_batch_size())
+            link_categories([(film.id, category_id) for film, categories in films for category_id in categories])
+            films = [film for film, categories in films]
+            films_bulk_saved.send(sender=Film, films=films)
+
+        return render_response(request, {
+            "message": "Films created",
+            "results": [{"index": index, "status": "created", "id": film.id, "links": film_links(film.id)}
+                        for index, film in enumerate(films)]
+        }, status=201)
+    else:
+        return HttpResponseBadRequest("Method not allowed", status=400)
+
+
+@csrf_exempt
+def bulk_update_films(request):
+    """
+    Update several films at once.
+
+    Each film is identified by its id and only the given fields are updated; the categories of a film
+    are replaced when provided. As for the creation, nothing is updated if any film is invalid.
+    """
+    if request.method == 'PUT':
+        try:
+            items = parse_items(request, 'films')
+        except ValueError as error:
+            return HttpResponseBadRequest(f"Invalid JSON data: {error}", status=400)
+
+        # Retrieve all the films and validate them, with a single query for all the categories
+        requested_ids = [item.get('id') for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        existing_films = Film.objects.in_bulk(requested_ids)
+        category_ids = existing_category_ids(items)
+        films, report, valid = [], [], True
+        for index, item in enumerate(items):
+            errors = {}
+            if not isinstance(item, dict):
+                valid = False
+                report.append({"index": index, "status": "invalid", "errors": {"film": ["Expected a JSON object"]}})
+                continue
+            if not isinstance(item.get('id'), int):
+                valid = False
+                report.append({"index": index, "status": "invalid", "errors": {"id": ["Expected an integer film id"]}})
+                continue
+            film = existing_films.get(item['id'])
+            if film is None:
+                valid = False
+                report.append({"index": index, "status": "not_found", "errors": {"id": ["Film not found"]}})
+                continue
+
+            for field in FILM_FIELDS:
+                if field in item:
+                    setattr(film, field, item[field])
+            validate_film(film, errors)
+            categories = validate_categories(item, category_ids, errors, required=False)
+
+            films.append((film, categories))
+            if errors:
+                valid = False
+                report.append({"index": index, "status": "invalid", "errors": errors})
+            else:
+                report.append({"index": index, "status": "valid"})
+
+        if not valid:
+            return render_response(request, {"error": "Invalid films, nothing was updated", "results": report}, status=400)
+
+        with transaction.atomic():
+            # bulk_update() does not set the auto_now modification date
+            now = timezone.now()
+            for film, categories in films:
+                film.updated_at = now
+            Film.objects.bulk_update([film for film, categories in films], FILM_FIELDS + ('updated_at',),
+                                     batch_size=bulk_batch_size())
+
+            # Replace the categories of the films for which they were provided, an empty list clearing them
+            recategorized = [(film, categories) for film, categories in films if categories is not None]
+            Film.categories.through.objects.filter(film_id__in=[film.id for film, categories in recategorized]).delete()
+            link_categories([(film.id, category_id) for film, categories in recategorized for category_id in categories])
+            films_bulk_saved.send(sender=Film, films=[film for film, categories in films])
+
+        return render_response(request, {
+            "message": "Films updated",
+            "results": [{"index": index, "status": "updated", "id": film.id, "links": film_links(film.id)}
+                        for index, (film, categories) in enumerate(films)]
+        }, status=200)
+    else:
+        return HttpResponseBadRequest("Method not allowed", status=400)
+
+
+@csrf_exempt
+def bulk_delete_films(request):
+    """
+    Delete several films at once, given their ids.
+
+    The films that exist are deleted in a single transaction; the report tells which ids were not found.
+    """
+    if request.method == 'DELETE':
+        try:
+            film_ids = parse_items(request, 'ids')
+        except ValueError as error:
+            return HttpResponseBadRequest(f"Invalid JSON data: {error}", status=400)
+        if not all(isinstance(film_id, int) for film_id in film_ids):
+            return HttpResponseBadRequest("Invalid JSON data: film ids must be integers", status=400)
+
+        with transaction.atomic():
+            existing_ids = set(Film.objects.filter(id__in=film_ids).values_list('id', flat=True))
+            delete_films(sorted(existing_ids))
+
+        return render_response(request, {
+            "message": "Films deleted",
+            "results": [{"index": index, "id": film_id, "status": "deleted" if film_id in existing_ids else "not_found"}
+                        for index, film_id in enumerate(film_ids)]
+        }, status=200)
+    else:
+        return HttpResponseBadRequest("Method not allowed", status=400)
@@ -1,145 +1,170 @@
 from django.core.serializers import serialize
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from django.urls import reverse
 import json
+from films.cache import CATEGORIES_VERSION, FILM_LIST_VERSION, cache_response, film_version
+from films.categories import get_registry
+from films.conditional import category_list_state, conditional, film_list_state, film_state
+from films.links import link, query_link
 from films.models.Film import Film
 from films.models.Category import Category
+from films.pagination import InvalidCursor
+from films.renderers import render_response, select_renderer
+from films.streaming import stream_response, stream_xml, wants_stream
+from films.serializers import FilmFieldset, InvalidFieldset, serialize_categories
+from films.views.film_views import FilmListRequest
+
+
+def category_list_data(categories):
+    """
+    Serialize the list of the categories with its hypermedia links.
+    """
+    # Construct hypermedia links
+    self_link = link('category-list')
+
+    return {
+        "results": serialize_categories(categories),
+        "pagination": {
+            "current_page": self_link,
+        }
+    }
 
 
 @csrf_exempt
+@cache_response(lambda: [CATEGORIES_VERSION])
+@conditional(category_list_state)
 def get_categories(request):
     """
     Retrieve paginated details of all categories.
     """
-    categories = Category.objects.all()
+    # Stream the categories when asked for
+    if wants_stream(request):
+        return stream_response(request, Category.objects.all(), serialize_categories)
+
+    categories = get_registry().categories
+
+    # Serialize data in the format asked for by the Accept header
+    return render_response(request, category_list_data(categories), xml=lambda: serialize('xml', categories))
+
+
+def film_category_ids(film_id):
+    """
+    Return the ids of the categories of a film, from the table linking them, or None if the film does
+    not exist.
+    """
+    category_ids = list(Film.categories.through.objects.filter(film_id=film_id)
+                        .order_by('category_id').values_list('category_id', flat=True))
+    if category_ids or Film.objects.filter(id=film_id).exists():
+        return category_ids
+    return None
 
-    # Check the Accept header to determine the response format
-    accept_header = request.headers.get('Accept', '')
 
-    if 'application/xml' in accept_header:
-        # Serialize data to XML
-        categories_xml = serialize('xml', categories)
-        return HttpResponse(categories_xml, content_type='application/xml', status=200)
-    else:
-        # Serialize data to JSON
-        category_data = [{"id": category.id, "name": category.name} for category in categories]
+async def afilm_category_ids(film_id):
+    """
+    Async counterpart of film_category_ids().
+    """
+    category_ids = [category_id async for category_id in Film.categories.through.objects.filter(film_id=film_id)
+                    .order_by('category_id').values_list('category_id', flat=True)]
+    if category_ids or await Film.objects.filter(id=film_id).aexists():
+        return category_ids
+    return None
 
-        # Construct hypermedia links
-        self_link = reverse('category-list')
 
-        return JsonResponse({
-            "results": category_data,
-            "pagination": {
-                "current_page": self_link,
-            }
-        }, safe=False, status=200)
+def film_categories_data(film_id, categories):
+    """
+    Serialize the categories of a film with their hypermedia links.
+    """
+    # Construct hypermedia links
+    self_link = link('get_categories_of_film', film_id=film_id)
+
+    # Construct HAL response
+    return {
+        "categories": serialize_categories(categories),
+        "links": {
+            "film": {"href": link('get_film', film_id=film_id)},
+        },
+        "pagination": {
+            "current_page": self_link,
+        }
+    }
 
 
 @csrf_exempt
+@cache_response(lambda film_id: [film_version(film_id), CATEGORIES_VERSION])
+@conditional(film_state)
 def get_categories_of_film(request, film_id):
     """
     Retrieve categories of a specific film.
     """
-    try:
-        film = Film.objects.get(id=film_id)
-        categories = film.categories.all()
-
-        # Construct hypermedia links
-        self_link = reverse('get_categories_of_film', kwargs={'film_id': film_id})
-
-        # Check the Accept header to determine the response format
-        accept_header = request.headers.get('Accept', '')
-
-        if 'application/xml' in accept_header:
-            # Serialize data to XML
-            categories_xml = serialize('xml', categories)
-            return HttpResponse(categories_xml, content_type='application/xml', status=200)
-        else:
-            categories_data = [{"id": category.id, "name": category.name}
-                               for category in categories]
-
-            # Construct HAL response
-            response_data = {
-                "categories": categories_data,
-                "links": {
-                    "film": {"href": reverse('get_film', kwargs={'film_id': film_id})},
-                },
-                "pagination": {
-                    "current_page": self_link,
-                }
-            }
-
-            return JsonResponse(response_data, safe=False, status=200)
-    except Film.DoesNotExist:
+    category_ids = film_category_ids(film_id)
+    if category_ids is None:
         return JsonResponse({"error": "Film not found"}, status=404)
+    categories = get_registry().get(category_ids)
+
+    # Serialize data in the format asked for by the Accept header
+    return render_response(request, film_categories_data(film_id, categories),
+                           xml=lambda: serialize('xml', categories))
+
+
+def category_films_page_link(request, category_id):
+    """
+    Return a function building the link to a page of the films of a category, keeping the query
+    parameters of the request.
+    """
+    # Construct hypermedia links
+    category_films_link = link('category-films', category_id=category_id)
+    return lambda page_number: query_link(category_films_link, request.GET, page=page_number)
+
+
+def category_films_state(request, category_id):
+    """
+    Return the ETag and last modification date of the films of a category, or None if it does not exist
+    or the fields asked for are invalid.
+    """
+    if category_id not in get_registry():
+        return None
+    try:
+        FilmFieldset.from_request(request)
+    except InvalidFieldset:
+        return None
+    return film_list_state(request)
+
+
+def category_film_list(request, category_id):
+    """
+    Parse a request for the films of a category, raising InvalidFieldset if its fields are invalid.
+    """
+    return FilmListRequest(request, Film.objects.filter(categories__id=category_id),
+                           category_films_page_link(request, category_id))
 
 
 @csrf_exempt
+@cache_response(lambda category_id: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+@conditional(category_films_state)
 def get_films_of_category(request, category_id):
     """
     Retrieve films belonging to a specific category.
     """
+    # Check the category exists
+    if category_id not in get_registry():
+        return JsonResponse({"error": "Category not found"}, status=404)
+
+    # Get the films associated with the category, with the fields asked for
+    try:
+        film_list = category_film_list(request, category_id)
+    except InvalidFieldset as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    # Stream the whole list instead of a page when asked for
+    if film_list.stream:
+        return film_list.stream_response()
+
+    if select_renderer(request).media_type == 'application/xml':
+        # Stream all the films of the category in XML
+        return stream_xml(film_list.streamed_films, fields=film_list.fieldset.xml_fields())
+
     try:
-        # Retrieve the category object
-        category = Category.objects.get(id=category_id)
-
-        # Get the films associated with the category
-        films = category.film_set.all()
-
-        # Pagination
-        page_number = request.GET.get('page', 1)
-        page_size = request.GET.get('page_size', 10)
-
-        paginator = Paginator(films, page_size)
-        paginated_films = paginator.get_page(page_number)
-
-        # Check the Accept header to determine the response format
-        accept_header = request.headers.get('Accept', '')
-
-        if 'application/xml' in accept_header:
-            # Serialize films data to XML
-            films_xml = serialize('xml', films)
-            return HttpResponse(films_xml, content_type='application/xml', status=200)
-        else:
-            # Serialize data to JSON
-            films_data = []
-            for film in paginated_films:
-                # Construct hypermedia links
-                film_link = reverse('get_film', kwargs={'film_id': film.id})
-                categories_link = reverse('get_categories_of_film', kwargs={'film_id': film.id})
-
-                films_data.append({
-                    "id": film.id,
-                    "name": film.name,
-                    "description": film.description,
-                    "publication_date": film.publication_date.strftime("%Y-%m-%d"),
-                    "note": film.note,
-                    "categories": [{"id": category.id, "name": category.name} for category in film.categories.all()],
-                    "links": {
-                        "film_link": {"href": film_link},
-                        "categories_link": {"href": categories_link}
-                    }
-                })
-
-            # Construct hypermedia links
-            self_link = reverse('category-films', args=[category_id]) + f"?page={paginated_films.number}"
-
-            # Pagination links
-            next_page_url = reverse('category-films', args=[category_id]) + f"?page={paginated_films.next_page_number()}" if paginated_films.has_next() else None
-            prev_page_url = reverse('category-films', args=[category_id]) + f"?page={paginated_films.previous_page_number()}" if paginated_films.has_previous() else None
-
-            return JsonResponse({
-                "results": films_data,
-                "pagination": {
-                    "page": paginated_films.number,
-                    "total_pages": paginator.num_pages,
-                    "total_results": paginator.count,
-                    "next_page": next_page_url,
-                    "prev_page": prev_page_url,
-                    "current_page": self_link,
-                }
-            }, safe=False, status=200)
-    except Category.DoesNotExist:
-        return JsonResponse({"error": "Category not found"}, status=404)
\ No newline at end of file
+        films, pagination = film_list.fetch_page()
+    except InvalidCursor as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return film_list.page_response(films, film_list.serialize(films), pagination)
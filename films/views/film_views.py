@@ -1,135 +1,254 @@
 from django.core.serializers import serialize
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound
 from django.views.decorators.csrf import csrf_exempt
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.urls import reverse
+from django.db import transaction
 import json
+from films.bulk import FILM_FIELDS
+from films.cache import CATEGORIES_VERSION, FILM_LIST_VERSION, cache_response, film_version
+from films.categories import get_registry
+from films.conditional import conditional, film_list_state, film_state
+from films.documents import (afilm_list_documents, deferred_refresh, detail_links, film_detail_document,
+                             film_list_documents, uses_documents, with_documents)
+from films.filters import InvalidFilter, filter_film_list, order_film_list, parse_ids
+from films.links import link, query_link
 from films.models.Film import Film
-from films.models.Category import Category
+from films.pagination import CursorPage, InvalidCursor, aget_page, page_pagination, page_size_param
+from films.renderers import render_response
+from films.search import search_films
+from films.streaming import astream_response, stream_response, wants_stream
+from films.serializers import (DEFAULT_FIELDSET, FilmFieldset, InvalidFieldset, with_categories, serialize_film,
+                               serialize_film_list)
 
 
-@csrf_exempt
-def get_films(request):
+def filter_films(request):
     """
-    Retrieve paginated details of all films, with optional search by title or description.
+    Build the queryset of the films matching the search, filter and ordering query parameters of a
+    request, raising InvalidFilter if one is invalid.
     """
-    # Retrieve all films
-    films = Film.objects.all()
+    films = filter_film_list(Film.objects.all(), request.GET)
 
     # Handle search query parameters
+    search_query = request.GET.get('q')
     title_query = request.GET.get('title')
     description_query = request.GET.get('description')
 
-    if title_query:
-        films = films.filter(name__icontains=title_query)
+    if search_query or title_query or description_query:
+        # Full-text search, ranked by relevance
+        films = search_films(films, q=search_query, title=title_query, description=description_query)
+    return order_film_list(films, request.GET)
 
-    if description_query:
-        films = films.filter(description__icontains=description_query)
 
-    # Pagination
-    page_number = request.GET.get('page', 1)
-    page_size = request.GET.get('page_size', 10)
+def parse_category_ids(categories):
+    """
+    Return the ids of the categories given in the body of a write request, a list of integers or of
+    strings of digits, or None if it is not.
+    """
+    if not isinstance(categories, list):
+        return None
+    category_ids = []
+    for category_id in categories:
+        if isinstance(category_id, str) and category_id.strip().isdigit():
+            category_id = int(category_id)
+        if not isinstance(category_id, int) or isinstance(category_id, bool):
+            return None
+        category_ids.append(category_id)
+    return category_ids
+
+
+def film_list_request_state(request):
+    """
+    Return the ETag and last modification date of the film list asked for by a request, or None if
+    its parameters are invalid.
+    """
+    try:
+        filter_films(request)
+        FilmFieldset.from_request(request)
+    except (InvalidFilter, InvalidFieldset):
+        return None
+    return film_list_state(request)
+
 
-    paginator = Paginator(films, page_size)
-    paginated_films = paginator.get_page(page_number)
+def film_list_page_link(request):
+    """
+    Return a function building the link to a page of the film list, keeping the query parameters of the request.
+    """
+    # Construct hypermedia links, keeping the other query parameters (search, page size, fields)
+    film_list_link = link('film-list')
+    return lambda page_number: query_link(film_list_link, request.GET, page=page_number)
 
-    # Check the Accept header to determine the response format
-    accept_header = request.headers.get('Accept', '')
 
-    if 'application/xml' in accept_header:
-        # Serialize data to XML
-        films_xml = serialize('xml', paginated_films)
-        return HttpResponse(films_xml, content_type='application/xml', status=200)
-    else:
-        # Serialize data to JSON
-        films_data = []
-        for film in paginated_films:
-            # Construct hypermedia links
-            film_link = reverse('get_film', kwargs={'film_id': film.id})
-            categories_link = reverse('get_categories_of_film', kwargs={'film_id': film.id})
-
-            films_data.append({
-                "id": film.id,
-                "name": film.name,
-                "description": film.description,
-                "publication_date": film.publication_date.strftime("%Y-%m-%d"),
-                "note": film.note,
-                "categories":  [{"id": category.id, "name": category.name} for category in film.categories.all()],
-                "links": {
-                    "film_link": {"href": film_link},
-                    "categories_link": {"href": categories_link}
-                }
-            })
-
-        # Construct hypermedia links
-        film_list_link = reverse('film-list')
-
-        # Include title filter in self_link if present
-        if title_query:
-            film_list_link += f"?title={title_query}"
-
-        # Include description filter in self_link if present
-        if description_query:
-            # If title_query is present, add '&' else add '?'
-            separator = '&' if title_query else '?'
-            film_list_link += f"{separator}description={description_query}"
-
-        # Pagination links
-        separator = '&' if title_query or description_query else '?'
-        self_link = film_list_link + f"{separator}page={paginated_films.number}"
-        next_page_url = film_list_link + f"{separator}page={paginated_films.next_page_number()}" if paginated_films.has_next() else None
-        prev_page_url = film_list_link + f"{separator}page={paginated_films.previous_page_number()}" if paginated_films.has_previous() else None
-
-        return JsonResponse({
-            "results": films_data,
-            "pagination": {
-                "page": paginated_films.number,
-                "total_pages": paginator.num_pages,
-                "total_results": paginator.count,
-                "next_page": next_page_url,
-                "prev_page": prev_page_url,
-                "current_page": self_link
-            }
-        }, safe=False, status=200)
+def in_id_order(films, ids):
+    """
+    Return the films found for the ids of a multi-get, in the order of the ids.
+    """
+    positions = {film_id: position for position, film_id in enumerate(ids)}
+    return sorted(films, key=lambda film: positions[film.id])
+
+
+def multi_get_data(ids, films, films_data):
+    """
+    Build the response of a multi-get from the films found, in the order of the ids, and their
+    representations: a not found marker stands for every id of no film.
+    """
+    found = dict(zip((film.id for film in films), films_data))
+    return {"results": [found.get(film_id, {"id": film_id, "error": "Film not found"}) for film_id in ids]}
+
+
+class FilmListRequest:
+    """
+    A request for a list of films, parsed before anything is fetched.
+
+    The sync views and their async counterparts of async_views share it: only the fetch methods come
+    in both flavours, the a-prefixed ones querying the database with the async ORM API.
+    """
+
+    def __init__(self, request, films, page_link, multi_get=False):
+        """
+        Parse the fields, streaming, pagination and, with multi_get, ids parameters of the request for
+        the films of a queryset, raising InvalidFieldset or InvalidFilter if one is invalid.
+
+        page_link is called with a page number and returns the link to that page.
+        """
+        self.request = request
+        self.fieldset = FilmFieldset.from_request(request)
+        self.ids = parse_ids(request.GET) if multi_get else None
+        self.stream = wants_stream(request)
+
+        # Splice the stored documents of the films when they hold what is asked for
+        self.documents = uses_documents(request, self.fieldset)
+        self.streamed_films = self.fieldset.queryset(films)
+        self.films = with_documents(films) if self.documents else self.streamed_films
+
+        self.cursor = 'cursor' in request.GET
+        self.page_number = request.GET.get('page', 1)
+        self.page_size = page_size_param(request.GET.get('page_size'))
+        self.page_link = page_link
+
+    def serialize_chunk(self, films):
+        return serialize_film_list(films, self.fieldset)
+
+    def stream_response(self):
+        """
+        Stream the whole list instead of a page.
+        """
+        return stream_response(self.request, self.streamed_films, self.serialize_chunk,
+                               xml_fields=self.fieldset.xml_fields())
+
+    def astream_response(self):
+        return astream_response(self.request, self.streamed_films, self.serialize_chunk,
+                                xml_fields=self.fieldset.xml_fields())
+
+    def serialize(self, films):
+        """
+        Return the representations of the fetched films, from their documents if they are used.
+        """
+        return film_list_documents(films, self.fieldset) if self.documents else self.serialize_chunk(films)
+
+    async def aserialize(self, films):
+        return await afilm_list_documents(films, self.fieldset) if self.documents else self.serialize_chunk(films)
+
+    def fetch_multi_get(self):
+        """
+        Return the films of the ids parameter, fetched in a single query, in the order of the ids.
+        """
+        return in_id_order(self.films, self.ids)
+
+    async def afetch_multi_get(self):
+        return in_id_order([film async for film in self.films], self.ids)
+
+    def fetch_page(self):
+        """
+        Return the films of the page asked for and its pagination block, raising InvalidCursor if the
+        cursor parameters are invalid.
+        """
+        # Keyset pagination, opt-in with the cursor parameter
+        if self.cursor:
+            cursor_page = CursorPage(self.request, self.films)
+            return cursor_page.object_list, cursor_page.pagination(self.request)
+        page = Paginator(self.films, self.page_size).get_page(self.page_number)
+        return page, page_pagination(page, self.page_link)
+
+    async def afetch_page(self):
+        if self.cursor:
+            cursor_page = await CursorPage.acreate(self.request, self.films)
+            return cursor_page.object_list, await cursor_page.apagination(self.request)
+        page = await aget_page(Paginator(self.films, self.page_size), self.page_number)
+        return page, page_pagination(page, self.page_link)
+
+    def render(self, data, films):
+        """
+        Render a response in the format asked for by the Accept header, from data or, in XML, the films.
+        """
+        return render_response(self.request, data,
+                               xml=lambda: serialize('xml', films, fields=self.fieldset.xml_fields()))
+
+    def multi_get_response(self, films, films_data):
+        return self.render(multi_get_data(self.ids, films, films_data), films)
+
+    def page_response(self, films, films_data, pagination):
+        return self.render({"results": films_data, "pagination": pagination}, films)
+
+
+def film_detail_data(film):
+    """
+    Serialize a film with the hypermedia links of its detail page.
+    """
+    film_data = serialize_film(film)
+    film_data.update(detail_links(film.id))
+    return film_data
 
 
 @csrf_exempt
+@cache_response(lambda: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+@conditional(film_list_request_state)
+def get_films(request):
+    """
+    Retrieve paginated details of all films, with optional full-text search by title and/or description,
+    filters on the note, publication date and categories, and ordering, or the films of the ids
+    parameter.
+    """
+    # Parse the fields asked for and the search, filter and ordering query parameters
+    try:
+        film_list = FilmListRequest(request, filter_films(request), film_list_page_link(request), multi_get=True)
+    except (InvalidFieldset, InvalidFilter) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    # Stream the whole list instead of a page when asked for
+    if film_list.stream:
+        return film_list.stream_response()
+
+    # Multi-get: the films of the ids parameter, in a single query, in the order of the ids
+    if film_list.ids is not None:
+        films = film_list.fetch_multi_get()
+        return film_list.multi_get_response(films, film_list.serialize(films))
+
+    try:
+        films, pagination = film_list.fetch_page()
+    except InvalidCursor as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return film_list.page_response(films, film_list.serialize(films), pagination)
+
+
+@csrf_exempt
+@cache_response(lambda film_id: [film_version(film_id), CATEGORIES_VERSION])
+@conditional(film_state)
 def get_film(request, film_id):
     """
     Retrieve details of a specific film.
     """
+    # Splice the stored document of the film, unless XML is asked for
+    if uses_documents(request, DEFAULT_FIELDSET):
+        document = film_detail_document(film_id)
+        if document is not None:
+            return render_response(request, document)
+
     try:
-        film = Film.objects.get(id=film_id)
-
-        # Construct hypermedia links
-        self_link = reverse('get_film', kwargs={'film_id': film_id})
-        categories_link = reverse('get_categories_of_film', kwargs={'film_id': film_id})
-
-        # Check the Accept header to determine the response format
-        accept_header = request.headers.get('Accept', '')
-
-        if 'application/xml' in accept_header:
-            # Serialize data to XML
-            film_xml = serialize('xml', [film])
-            return HttpResponse(film_xml, content_type='application/xml', status=200)
-        else:
-            # Serialize film data to JSON
-            film_data = {
-                "id": film.id,
-                "name": film.name,
-                "description": film.description,
-                "publication_date": film.publication_date.strftime("%Y-%m-%d"),
-                "note": film.note,
-                "categories": [{"id": category.id, "name": category.name} for category in film.categories.all()],
-                "links": {
-                    "categories_link": {"href": categories_link}
-                },
-                "pagination": {
-                    "current_page": self_link,
-                }
-            }
+        film = with_categories(Film.objects.all()).get(id=film_id)
 
-            return JsonResponse(film_data, safe=False, status=200)
+        # Serialize film data in the format asked for by the Accept header
+        return render_response(request, film_detail_data(film), xml=lambda: serialize('xml', [film]))
     except Film.DoesNotExist:
         return JsonResponse({"error": "Film not found"}, status=404)
 
@@ -148,27 +267,30 @@ def create_film(request):
             if 'categories' not in data or not data['categories']:
                 return JsonResponse({"error": "Categories are required"}, status=400)
 
-            # Create a new film instance
-            film = Film.objects.create(
-                name=data['name'],
-                description=data['description'],
-                publication_date=data['publication_date'],
-                note=data.get('note', None)
-            )
-
-            # Add categories to the film
-            categories_ids = data.get('categories', [])
-            for category_id in categories_ids:
-                try:
-                    category = Category.objects.get(id=category_id)
-                    film.categories.add(category)
-                except Category.DoesNotExist:
-                    return JsonResponse({"error": "Category not found"}, status=404)
-
-            return JsonResponse({
+            # Check the categories exist before creating anything
+            categories_ids = parse_category_ids(data['categories'])
+            if categories_ids is None:
+                return JsonResponse({"error": "Categories must be a list of category ids"}, status=400)
+            if get_registry().missing(categories_ids):
+                return JsonResponse({"error": "Category not found"}, status=404)
+
+            # Render the document of the film once, with its categories
+            with transaction.atomic(), deferred_refresh():
+                # Create a new film instance
+                film = Film.objects.create(
+                    name=data['name'],
+                    description=data['description'],
+                    publication_date=data['publication_date'],
+                    note=data.get('note', None)
+                )
+
+                # Add categories to the film
+                film.categories.add(*categories_ids)
+
+            return render_response(request, {
                 "message": "Film created",
                 "links": {
-                    "film": {"href": reverse('get_film', kwargs={'film_id': film.id})}
+                    "film": {"href": link('get_film', film_id=film.id)}
                 }
             }, status=201)
         except json.JSONDecodeError:
@@ -180,56 +302,81 @@ def create_film(request):
 @csrf_exempt
 def update_film(request, film_id):
     """
-    Update the details of a specific film.
+    Update the details of a specific film: PUT replaces its categories (none if not given), PATCH only
+    changes the fields and categories given.
+
+    Everything is validated before anything is written, in a single transaction, and only the fields
+    and category links that change are written.
     """
-    if request.method == 'PUT':
+    if request.method in ('PUT', 'PATCH'):
         try:
             # Extract updated film data from request
             data = json.loads(request.body)
-
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON data", status=400)
+        if not isinstance(data, dict):
+            return HttpResponseBadRequest("Invalid JSON data: expected an object", status=400)
+
+        # Check the categories against the registry
+        category_ids = None
+        if 'categories' in data or request.method == 'PUT':
+            # A PUT without categories clears them, but null is no list of categories
+            category_ids = parse_category_ids(data.get('categories', []))
+            if category_ids is None:
+                return JsonResponse({"error": "Categories must be a list of category ids"}, status=400)
+            missing = get_registry().missing(category_ids)
+            if missing:
+                return JsonResponse({"error": f"Category not found: {', '.join(map(str, missing))}"},
+                                    status=404)
+
+        # Render the document of the film once, whether its fields, its categories or both change
+        with transaction.atomic(), deferred_refresh():
             # Retrieve the film to update
             try:
-                film = Film.objects.get(id=film_id)
+                film = Film.objects.select_for_update().get(id=film_id)
             except Film.DoesNotExist:
                 return HttpResponseNotFound("Film not found")
 
-            # Update film fields
-            film.name = data.get('name', film.name)
-            film.description = data.get('description', film.description)
-            film.publication_date = data.get('publication_date', film.publication_date)
-            film.note = data.get('note', film.note)
-
-            # Save the updated film
-            film.save()
-
-            # Update categories
-            categories_ids = data.get('categories', [])
-            film.categories.clear()
-            for category_id in categories_ids:
+            # Update the film fields given, validating the ones that change
+            changed_fields, errors = [], {}
+            for field in FILM_FIELDS:
+                if field not in data:
+                    continue
                 try:
-                    category = Category.objects.get(id=category_id)
-                    film.categories.add(category)
-                except Category.DoesNotExist:
-                    return JsonResponse({"error": "Category not found"}, status=404)
-
-            return JsonResponse({
-                "message": "Film updated",
-                "links": {
-                    "film": {"href": reverse('get_film', kwargs={'film_id': film.id})}
-                }
-            }, status=200)
-
-        except Film.DoesNotExist:
-            return HttpResponseNotFound("Film not found", status=404)
-
-        except json.JSONDecodeError:
-            return HttpResponseBadRequest("Invalid JSON data", status=400)
+                    value = Film._meta.get_field(field).to_python(data[field])
+                except ValidationError as error:
+                    errors[field] = error.messages
+                    continue
+                if value != getattr(film, field):
+                    setattr(film, field, value)
+                    changed_fields.append(field)
+            if not errors:
+                try:
+                    film.clean_fields(exclude=[field.name for field in Film._meta.fields if field.name not in changed_fields])
+                except ValidationError as error:
+                    errors.update(error.message_dict)
+            if errors:
+                return JsonResponse({"error": "Invalid film", "errors": errors}, status=400)
+
+            # Save the changed fields only
+            if changed_fields:
+                film.save(update_fields=changed_fields + ['updated_at'])
+
+            # Add and remove only the categories that change
+            if category_ids is not None:
+                film.categories.set(category_ids)
+
+        return render_response(request, {
+            "message": "Film updated",
+            "links": {
+                "film": {"href": link('get_film', film_id=film.id)}
+            }
+        }, status=200)
 
     else:
         return HttpResponseBadRequest("Method not allowed", status=400)
 
 
-
 @csrf_exempt
 def delete_film(request, film_id):
     """
@@ -243,7 +390,7 @@ def delete_film(request, film_id):
             # Delete the film
             film.delete()
 
-            return JsonResponse({"message": "Film deleted"}, status=200)
+            return render_response(request, {"message": "Film deleted"}, status=200)
 
         except Film.DoesNotExist:
             return HttpResponseNotFound("Film not found", status=404)
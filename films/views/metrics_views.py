@@ -0,0 +1,37 @@
+import ipaddress
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from films.instrumentation import REGISTRY
+from films.throttling import client_key
+
+# Addresses or networks of the clients allowed to read the metrics, unless overridden by the
+# FILMS_METRICS_ALLOWED_ADDRESSES setting: the metrics tell the load and the routes of the API, so
+# only the scrapers running on the server itself by default
+DEFAULT_METRICS_ALLOWED_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def metrics_allowed(request):
+    """
+    Tell whether the client of a request, identified as by the rate limits, may read the metrics.
+    """
+    try:
+        address = ipaddress.ip_address(client_key(request))
+    except ValueError:
+        return False
+    allowed = getattr(settings, 'FILMS_METRICS_ALLOWED_ADDRESSES', DEFAULT_METRICS_ALLOWED_ADDRESSES)
+    return any(address in ipaddress.ip_network(network, strict=False) for network in allowed)
+
+
+@csrf_exempt
+def get_metrics(request):
+    """
+    Retrieve the performance metrics of the requests, per view, in the Prometheus text format.
+    """
+    if request.method == 'GET':
+        if not metrics_allowed(request):
+            return JsonResponse({"error": "The metrics are not available to this client"}, status=403)
+        return HttpResponse(REGISTRY.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                            status=200)
+    else:
+        return HttpResponseBadRequest("Method not allowed", status=400)
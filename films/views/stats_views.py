@@ -0,0 +1,44 @@
+from django.core.serializers import serialize
+from django.views.decorators.csrf import csrf_exempt
+from films import stats
+from films.cache import CATEGORIES_VERSION, FILM_LIST_VERSION, cache_response
+from films.links import link
+from films.models.CategoryStats import CategoryStats
+from films.renderers import render_response
+
+
+@csrf_exempt
+@cache_response(lambda: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+def get_stats(request):
+    """
+    Retrieve the number of films and average note of the catalogue, per category and per year.
+    """
+    stats_data = stats.catalogue_stats()
+    stats_data["links"] = {
+        "categories": {"href": link('category-stats')},
+        "years": {"href": link('year-stats')},
+    }
+    return render_response(request, stats_data)
+
+
+@csrf_exempt
+@cache_response(lambda: [FILM_LIST_VERSION, CATEGORIES_VERSION])
+def get_category_stats(request):
+    """
+    Retrieve the number of films and average note of every category.
+    """
+    # Serialize data in the format asked for by the Accept header, the summary rows in XML
+    return render_response(request, {"results": stats.category_stats()},
+                           xml=lambda: serialize('xml', CategoryStats.objects.order_by('category_id')))
+
+
+@csrf_exempt
+@cache_response(lambda: [FILM_LIST_VERSION])
+def get_year_stats(request):
+    """
+    Retrieve the number of films and average note of every year of publication.
+    """
+    rows = stats.year_rows()
+
+    # Serialize data in the format asked for by the Accept header, the summary rows in XML
+    return render_response(request, {"results": stats.year_stats(rows)}, xml=lambda: serialize('xml', rows))